@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the alerting stage
+# Builds a month of daily comparisons (bench_analytics.py's history) and times
+# raise_alerts on the last day against a growing number of rules, each kind at
+# a spread of thresholds, with a fresh outbox per run. Evaluation is one boolean
+# matrix over rows x rules, so time should grow far slower than rules x SKUs.
+# Last it checks a day whose rows have no SKU (history imported from CSVs that
+# predate SKUs) is still queued, keyed by Dell product
+#
+# Usage: python3 bench_alerts.py [--products 5000 50000] [--rules 4 40 400]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import alerts  # noqa: E402
+from bench_analytics import synthetic_history  # noqa: E402
+from price_analytics import prepare  # noqa: E402
+from retailers import RETAILERS  # noqa: E402
+from schema import apply as apply_schema  # noqa: E402
+
+
+# Function to make `count` rules, cycling through the kinds with rising thresholds
+def synthetic_rules(count):
+    kinds = np.resize(alerts.KINDS, count)
+    step = np.arange(count) // len(alerts.KINDS)
+    thresholds = np.select([kinds == 'deviation', kinds == 'offender_days', kinds == 'price_drop'],
+                           [10 + step % 40, 2 + step % 28, 5 + step % 30], default=1)
+    retailers = np.where(step % 3 == 2, np.resize(list(RETAILERS), count), None)
+    return pd.DataFrame({'Name': [f'rule_{i}' for i in range(count)], 'Kind': kinds,
+                         'Threshold': thresholds.astype(float), 'Retailer': retailers,
+                         'Cooldown_hours': 24.0})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time alert evaluation against growing rule sets')
+    parser.add_argument('--products', type=int, nargs='*', default=[5000, 50000])
+    parser.add_argument('--rules', type=int, nargs='*', default=[4, 40, 400])
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f'{"products":>9}{"rows":>9}{"rules":>7}{"rule hits":>11}{"queued":>8}{"seconds":>9}')
+    for products in args.products:
+        raw = synthetic_history(args.days, products)
+        history = prepare(raw)
+        days = sorted(raw['date'].unique())
+        today = apply_schema(raw[raw['date'] == days[-1]].reset_index(drop=True), 'comparison')
+        previous = apply_schema(raw[raw['date'] == days[-2]].reset_index(drop=True), 'comparison')
+        for count in args.rules:
+            rules = synthetic_rules(count)
+            with tempfile.TemporaryDirectory() as tmp:
+                outbox = os.path.join(tmp, 'alerts.sqlite')
+                started = time.perf_counter()
+                queued = alerts.raise_alerts(today, days[-1], previous, history, rules, outbox)
+                seconds = time.perf_counter() - started
+            streaks = alerts.offender_days(days[-1], int(rules['Threshold'].max()), list(RETAILERS), history)
+            hits = len(alerts.evaluate(today, rules, previous, streaks))
+            print(f'{products:>9}{len(today):>9}{count:>7}{hits:>11}{len(queued):>8}{seconds:>9.3f}')
+
+    # The same day with its SKUs missing, as the outbox's NOT NULL keys once failed on
+    skuless = today.assign(sku=pd.Series(pd.NA, index=today.index, dtype=today['sku'].dtype))
+    with tempfile.TemporaryDirectory() as tmp:
+        queued = alerts.raise_alerts(skuless, days[-1], previous, history, synthetic_rules(4),
+                                     os.path.join(tmp, 'alerts.sqlite'))
+    assert queued and all(payload['sku'] == payload['dell_product'] for payload in queued)
+    print(f'\nWithout SKUs: {len(queued)} notifications queued, keyed by Dell product')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the price history analytics
+# Builds N days of daily comparisons for M Dell products at every retailer,
+# with products drifting in and out of Non-Compliant like real listings do,
+# and times each analysis in price_analytics.py on the whole history
+#
+# Usage: python3 bench_analytics.py [--days 365] [--products 5000]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import price_analytics  # noqa: E402
+from retailers import RETAILERS  # noqa: E402
+from schema import STATUS  # noqa: E402
+
+
+# Function to build a long comparison history: every product at every retailer on every day
+# Deviation follows a random walk per product, so statuses come in streaks
+def synthetic_history(days, products, seed=7):
+    rng = np.random.default_rng(seed)
+    retailers = list(RETAILERS)
+    dates = pd.date_range('2024-01-01', periods=days).strftime('%Y%m%d')
+    series = len(retailers) * products
+    steps = rng.normal(0, 1.5, (series, days))
+    steps[:, 0] = rng.normal(-4, 6, series)
+    deviation = np.cumsum(steps, axis=1).round(2).ravel()
+    dell_price = np.repeat(rng.uniform(150, 1500, series).round(2), days)
+    status = np.select([deviation >= 0, deviation >= -10], STATUS[:2], default=STATUS[2])
+    names = np.array([f'Dell Monitor {i:05d}' for i in range(products)])
+    return pd.DataFrame({
+        'date': np.tile(dates, series),
+        'Retailer': np.repeat(retailers, products * days),
+        'Dell_product': np.tile(np.repeat(names, days), len(retailers)),
+        'sku': np.tile(np.repeat(np.arange(products).astype(str), days), len(retailers)),
+        'Retailer_price': (dell_price * (1 + deviation / 100)).round(2),
+        'Dell_price': dell_price,
+        'Deviation': deviation,
+        'Status': status,
+    })
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the price history analytics on synthetic history')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--products', type=int, default=5000)
+    args = parser.parse_args()
+
+    raw = synthetic_history(args.days, args.products)
+    print(f'{len(raw)} comparison rows: {args.days} days x {args.products} products x {len(RETAILERS)} retailers')
+    stages = [
+        ('prepare', price_analytics.prepare, lambda: (raw,)),
+        ('rolling 7d / 30d deviation', price_analytics.rolling_deviation, lambda: (history,)),
+        ('violation episodes', price_analytics.violation_episodes, lambda: (history,)),
+        ('product summary', price_analytics.product_summary, lambda: (history, episodes)),
+        ('retailer trend', price_analytics.retailer_trend, lambda: (history,)),
+        ('retailer summary', price_analytics.retailer_summary, lambda: (summary, episodes)),
+    ]
+    total = 0.0
+    history = episodes = summary = None
+    print(f'{"analysis":<30}{"seconds":>9}{"rows out":>10}')
+    for name, function, arguments in stages:
+        seconds, result = timed(function, *arguments())
+        total += seconds
+        if function is price_analytics.prepare:
+            history = result
+        elif function is price_analytics.violation_episodes:
+            episodes = result
+        elif function is price_analytics.product_summary:
+            summary = result
+        print(f'{name:<30}{seconds:>9.3f}{len(result):>10}')
+    print(f'{"total":<30}{total:>9.3f}')
+    print(f'\n{len(episodes)} violation episodes, {episodes["days_to_fix"].notna().sum()} fixed, '
+          f'median time to fix {episodes["days_to_fix"].median():.0f} days')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Micro-benchmark for the HTML extraction engine
+# Times per-page parsing of Dell and Newegg result pages with the old
+# BeautifulSoup find_all code and with scripts/extraction.py, and checks
+# both produce the same records
+#
+# Usage: python3 bench_extraction.py [--pages-dir DIR] [--repeat N]
+
+# Import necessary libraries
+import argparse
+import html
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+from extraction import extract_dell_page, extract_newegg_page  # noqa: E402
+from fixtures import load_pages  # noqa: E402
+
+
+# The per-page parsing the Dell scraper used before the extraction engine
+def legacy_dell_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    product_name = [a.get_text().strip('\n') for a in soup.find_all('h3', class_='ps-title')]
+    product_id = [b.get_text().strip('\n') for b in soup.find_all('div', class_='ps-product-detail-info')]
+    price_holder_2 = []
+    for d in soup.find_all('div', class_='ps-dell-price ps-simplified'):
+        d = d.get_text().strip('\n').split(' ')[-1].strip('$').replace(',', '')
+        price_holder_2.append(float(d))
+    specs = []
+    for spec in soup.find_all('div', class_='ps-snp-tech-specs ps-icon-specs-container'):
+        specs.append([g.get_text().strip('\n').strip('  ').strip('\n')
+                      for g in spec.find_all('span', class_='ps-iconography-specs-label')])
+    link = [str(h).split('//')[-1].split('"')[0] for h in soup.find_all('h3', class_='ps-title')]
+    price = price_holder_2[::2]
+    return [
+        {'Dell_product': a, 'Dell_product_id': b, 'Dell_price': c, 'Dell_link': d, 'Dell_specs': e}
+        for a, b, c, d, e in zip(product_name, product_id, price, link, specs)
+    ]
+
+
+# The per-page parsing the Newegg scraper used before the extraction engine
+def legacy_newegg_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    product_name = [a.get_text().strip('\n') for a in soup.find_all('div', class_='item-info')]
+    # str(tag) re-escapes '&' in links, the engine returns the real URL
+    product_id = [html.unescape(str(b).split('//')[-1].split('"')[0].split('/')[-1])
+                  for b in soup.find_all('div', class_='item-info')]
+    price = []
+    for d in soup.find_all('li', class_='price-current'):
+        d = d.get_text().split(u'\xa0')[0].strip('\n').strip('$').replace(',', '').replace(' ', '')
+        price.append(d)
+    link = [html.unescape(str(h).split('//')[-1].split('"')[0]) for h in soup.find_all('div', class_='item-info')]
+    return [
+        {'Newegg_name': a, 'Newegg_sku': b, 'Newegg_price': c, 'Newegg_link': d}
+        for a, b, c, d in zip(product_name, product_id, price, link)
+    ]
+
+
+# lxml normalizes \r\n line endings in text the way browsers do, html.parser kept them
+def normalize(records):
+    return [{k: v.replace('\r\n', '\n') if isinstance(v, str) else v for k, v in r.items()} for r in records]
+
+
+# Function to time one parser over every page, returning per-page seconds
+def time_pages(parse, pages, repeat):
+    timings = []
+    for content in pages:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse(content)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page parse time before and after the extraction engine')
+    parser.add_argument('--pages-dir', help='directory of saved dell_<n>.html / newegg_<n>.html pages')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per page, the best one is kept')
+    args = parser.parse_args()
+
+    dell_pages, newegg_pages = load_pages(args.pages_dir)
+    cases = [
+        ('dell', dell_pages, legacy_dell_page, lambda c: extract_dell_page(c)[0]),
+        ('newegg', newegg_pages, legacy_newegg_page, lambda c: extract_newegg_page(c)[0]),
+    ]
+
+    print(f'{"site":<8}{"pages":>6}{"before ms/page":>16}{"after ms/page":>15}{"speedup":>9}')
+    for site, pages, before, after in cases:
+        if not pages:
+            continue
+        # Both parsers have to agree before the timings mean anything
+        for content in pages:
+            old = normalize(before(content))
+            new = normalize(after(content))
+            if old != [{k: r[k] for k in o} for o, r in zip(old, new)] or len(old) != len(new):
+                raise SystemExit(f'{site}: extraction engine output differs from the old parser')
+        old_ms = statistics.median(time_pages(before, pages, args.repeat)) * 1000
+        new_ms = statistics.median(time_pages(after, pages, args.repeat)) * 1000
+        print(f'{site:<8}{len(pages):>6}{old_ms:>16.2f}{new_ms:>15.2f}{old_ms / new_ms:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
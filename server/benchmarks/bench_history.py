@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the columnar price history store
+# Writes N days of dated listing/comparison CSVs (the saved day in scripts/data
+# with prices nudged day to day), imports them into a Parquet store, then times
+# loading history the CSV way (glob + read_csv + concat + filter) against
+# price_store.query with the same predicates pushed down
+#
+# Usage: python3 bench_history.py [--days 90] [--scale 1]
+
+# Import necessary libraries
+import argparse
+import datetime
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+from fixtures import latest_csv  # noqa: E402
+from price_store import import_csv_history, query  # noqa: E402
+
+
+# Function to write `days` of dated CSVs, each a copy of the saved day with prices nudged
+def write_history(target, days, scale):
+    rng = np.random.default_rng(7)
+    sources = {
+        'official_dell_monitor': ('Dell_price', pd.read_csv(latest_csv('official_dell_monitor'))),
+        'bestbuy_dell_monitor': ('Bestbuy_price', pd.read_csv(latest_csv('bestbuy_dell_monitor'))),
+        'newegg_dell_monitor': ('Newegg_price', pd.read_csv(latest_csv('newegg_dell_monitor'))),
+        'bestbuy_comparison': ('Bestbuy_price', pd.read_csv(latest_csv('bestbuy_comparison'))),
+        'newegg_comparison': ('Newegg_price', pd.read_csv(latest_csv('newegg_comparison'))),
+    }
+    sources = {name: (col, pd.concat([df] * scale, ignore_index=True)) for name, (col, df) in sources.items()}
+    start = datetime.date(2024, 1, 1)
+    for day in range(days):
+        stamp = (start + datetime.timedelta(days=day)).strftime('%Y%m%d')
+        for name, (price_column, df) in sources.items():
+            df = df.copy()
+            prices = pd.to_numeric(df[price_column], errors='coerce')
+            df[price_column] = (prices * rng.uniform(0.9, 1.05, len(df))).round(2)
+            if 'Deviation' in df:
+                df['Deviation'] = (df[price_column] - df['Dell_price']) / df['Dell_price'] * 100
+            df.to_csv(os.path.join(target, f'{name}_{stamp}.csv'), index=False)
+    return start
+
+
+# The CSV way: glob every dated comparison, parse them all, then filter
+def load_csv_history(source, start, end, retailers):
+    frames = []
+    for path in glob.glob(os.path.join(source, '*_comparison_*.csv')):
+        retailer, _, stamp = os.path.basename(path)[:-4].rpartition('_')
+        retailer = retailer.replace('_comparison', '')
+        df = pd.read_csv(path)
+        df['date'] = stamp
+        df['retailer'] = retailer
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    if start:
+        df = df[df['date'] >= start]
+    if end:
+        df = df[df['date'] <= end]
+    if retailers:
+        df = df[df['retailer'].isin(retailers)]
+    return df
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - begin)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV history vs the Parquet price store')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--scale', type=int, default=1, help='repeat each day\'s rows this many times')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as target:
+        start = write_history(target, args.days, args.scale)
+        root = os.path.join(target, 'history')
+        begin = time.perf_counter()
+        import_csv_history(target, root)
+        import_s = time.perf_counter() - begin
+
+        last = (start + datetime.timedelta(days=args.days - 1)).strftime('%Y%m%d')
+        window = (start + datetime.timedelta(days=max(args.days - 30, 0))).strftime('%Y%m%d')
+        cases = [
+            (f'all {args.days} days', None, None, None),
+            ('last 30 days, bestbuy', window, last, ['bestbuy']),
+        ]
+        print(f'\nOne-time import of {args.days} days: {import_s:.2f}s')
+        print(f'{"query":<26}{"rows":>8}{"CSV s":>9}{"store s":>9}{"speedup":>9}')
+        for label, lo, hi, retailers in cases:
+            csv_s, csv_df = timed(load_csv_history, target, lo, hi, retailers)
+            store_s, store_df = timed(query, 'comparisons', lo, hi, retailers=retailers, root=root)
+            if len(csv_df) != len(store_df):
+                raise SystemExit(f'{label}: CSV returned {len(csv_df)} rows, store returned {len(store_df)}')
+            print(f'{label:<26}{len(store_df):>8}{csv_s:>9.3f}{store_s:>9.3f}{csv_s / store_s:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the cross-retailer product matcher
+# Builds a synthetic Dell catalogue and retailer listings written the way
+# BestBuy and Newegg title them (some with the model code, some without, some
+# accessories), then times product_matcher.match_retailer and checks how many
+# Dell products got the listing they were generated from
+#
+# Usage: python3 bench_matcher.py [--dell 5000] [--listings 30000]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+from bench_search import synthetic_products  # noqa: E402
+from product_matcher import match_retailer  # noqa: E402
+
+TEMPLATES = [
+    'Dell {size}" QHD 165Hz IPS LED FreeSync {feature} ({code}) - Black',
+    'DELL {code} {feature}, {size}" FHD 1920x1080 100Hz, HDMI, DP',
+    'Dell {size} inch {feature} FHD (1920 x 1080) Anti-Glare Screen - {code}',
+    'Dell {size}" {feature} 1920 x 1080 Full HD IPS, DisplayPort HDMI',
+    'Privacy Filter for Dell {code} Monitor',
+]
+
+
+# Function to write `n` retailer listings for a Dell catalogue, remembering which product each came from
+def synthetic_listings(dell, n, seed=11):
+    rng = np.random.default_rng(seed)
+    source = rng.integers(0, len(dell), n)
+    template = rng.choice(len(TEMPLATES), n, p=[0.35, 0.3, 0.2, 0.1, 0.05])
+    names = []
+    for row, t in zip(source, template):
+        title, code = dell['Dell_product'].iloc[row].rsplit(' - ', 1)
+        size = title.split()[-1] if title.split()[-1].isdigit() else ''.join(c for c in title if c.isdigit())[:2]
+        feature = title.split(size, 1)[-1].strip() or 'Monitor'
+        names.append(TEMPLATES[t].format(size=size, code=code, feature=feature))
+    return pd.DataFrame({
+        'Bestbuy_name': names,
+        'Bestbuy_sku': [str(10000000 + i) for i in range(n)],
+        'Bestbuy_price': rng.uniform(99, 2999, n).round(2),
+        'source': source,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and check the product matcher on synthetic catalogues')
+    parser.add_argument('--dell', type=int, default=5000)
+    parser.add_argument('--listings', type=int, default=30000)
+    args = parser.parse_args()
+
+    dell = synthetic_products(args.dell)
+    listings = synthetic_listings(dell, args.listings)
+
+    begin = time.perf_counter()
+    matches = match_retailer(dell, listings, 'bestbuy')
+    elapsed = time.perf_counter() - begin
+    naive_pairs = len(dell) * len(listings)
+    compared = int(matches['candidates'].sum())
+
+    truth = listings.set_index('Bestbuy_sku')['source']
+    expected = dell['Dell_product'].to_numpy()[truth.loc[matches['sku']].to_numpy()]
+    correct = (matches['Dell_product'].to_numpy() == expected).mean()
+    print(f'\n{len(dell)} Dell products x {len(listings)} listings ({naive_pairs:,} possible pairs)')
+    print(f'Matched {len(matches)} Dell products in {elapsed:.2f}s, '
+          f'scoring about {compared:,} blocked pairs for the matched products')
+    print(f'{correct * 100:.1f}% of matches point at the product the listing was made from')
+    print(matches['confidence'].describe().round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
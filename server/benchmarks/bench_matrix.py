@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the cross-retailer price matrix
+# Grows the saved catalogue N times (100x by default) and builds the combined
+# table both ways: the chained merges and fillna Product_page.py used before,
+# and price_matrix.build. Then times the catalogue-wide queries on the matrix,
+# and single-product lookups against filtering the merged table for the name
+#
+# Usage: python3 bench_matrix.py [--scale 100] [--lookups 1000]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import price_matrix  # noqa: E402
+import schema  # noqa: E402
+from fixtures import scale_catalogue  # noqa: E402
+
+
+# Function to build the combined table the way Product_page.py did before the matrix
+def merged_table(index, dell, bestbuy, newegg):
+    df = pd.merge(index, bestbuy, how='left', on=['Bestbuy_sku'])
+    df = pd.merge(df, newegg, how='left', on=['Newegg_sku'])
+    df = pd.merge(df, dell, how='inner', on=['Dell_product'])
+    df = df[['Dell_product', 'Dell_price', 'Bestbuy_price', 'Newegg_price']].sort_values('Dell_price')
+    return df.fillna('Not sold in this retailer')
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the price matrix against the merged combined table')
+    parser.add_argument('--scale', type=int, default=100, help='grow the saved catalogue this many times')
+    parser.add_argument('--lookups', type=int, default=1000, help='single-product lookups to time')
+    args = parser.parse_args()
+
+    catalogue = {name: schema.apply(df, name) for name, df in scale_catalogue(args.scale).items()}
+    tables = [catalogue[name] for name in ('index', 'dell', 'bestbuy', 'newegg')]
+    listings = {'bestbuy': catalogue['bestbuy'], 'newegg': catalogue['newegg']}
+
+    print(f'{"step":<40}{"seconds":>9}')
+    seconds, merged = timed(merged_table, *tables)
+    print(f'{"chained merges + fillna":<40}{seconds:>9.3f}')
+    seconds, matrix = timed(price_matrix.build, catalogue['index'], catalogue['dell'], listings)
+    print(f'{"build matrix":<40}{seconds:>9.3f}')
+    for name in ('lowest', 'spread', 'undercuts', 'coverage', 'render'):
+        seconds, _ = timed(getattr(matrix, name))
+        print(f'{name + "()":<40}{seconds:>9.3f}')
+
+    products = np.random.default_rng(3).choice(matrix.names, args.lookups)
+    seconds, _ = timed(lambda: [merged[merged['Dell_product'] == p] for p in products])
+    print(f'{f"{args.lookups} lookups, filtering the table":<40}{seconds:>9.3f}')
+    seconds, _ = timed(lambda: [matrix.lookup(p) for p in products])
+    print(f'{f"{args.lookups} lookups, matrix.lookup":<40}{seconds:>9.3f}')
+
+    print(f'\n{len(merged)} merged rows, {len(matrix.names)} products x {len(matrix.sources)} sources '
+          f'({matrix.prices.nbytes / 1024:.0f} KB of prices)')
+    print(f'merged price columns: {", ".join(str(merged[c].dtype) for c in merged.columns[1:])}')
+
+
+if __name__ == '__main__':
+    main()
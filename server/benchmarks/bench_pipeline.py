@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# End-to-end benchmark for the nightly pipeline
+# For each catalogue scale a stub_server.py process serves the recorded Dell,
+# Newegg and BestBuy pages, then every stage is timed on its own:
+#   fetch    all result pages from the three stand-in sites, as the scrapers request them
+#   parse    the pages into listing frames with the scrapers' own extractors
+#   compare  every retailer against Dell with the comparison engine
+#   output   the listing CSVs, comparison CSVs and serving artifacts (into a temp dir)
+# Wall and CPU time, rows, bytes and the process' peak memory after each stage
+# are written to benchmarks/results/ as JSON, and --baseline compares a run
+# against an earlier results file to flag regressions.
+#
+# Usage: python3 bench_pipeline.py [--scales 1 10 100 1000] [--baseline results/bench_pipeline_X.json]
+
+# Import necessary libraries
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+scripts_dir = os.path.join(os.path.dirname(bench_dir), 'scripts')
+results_dir = os.path.join(bench_dir, 'results')
+sys.path.insert(0, scripts_dir)
+
+import bestbuy_scraper  # noqa: E402
+import comparison  # noqa: E402
+import dell_scraper  # noqa: E402
+import newegg_scraper  # noqa: E402
+from extraction import extract_dell_page, extract_newegg_page  # noqa: E402
+from fetcher import fetch_page, fetch_pages, full_url, make_session  # noqa: E402
+from fixtures import scale_catalogue  # noqa: E402
+from serving import write_artifacts  # noqa: E402
+
+STAGES = ['fetch', 'parse', 'compare', 'output']
+DELL_COLUMNS = ['Dell_product', 'Dell_product_id', 'Dell_price', 'Dell_specs', 'Dell_link']
+NEWEGG_COLUMNS = ['Newegg_name', 'Newegg_sku', 'Newegg_price', 'Newegg_link']
+BESTBUY_COLUMNS = ['Bestbuy_name', 'Bestbuy_sku', 'Bestbuy_price', 'Bestbuy_link']
+
+
+# Function to read the process' peak resident memory so far, in MB
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+# Times one stage and records what it cost
+class StageTimer:
+    def __init__(self, trace_memory=False):
+        self.stages = {}
+        self.trace_memory = trace_memory
+
+    def run(self, name, function, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start_cpu = time.process_time()
+        start = time.perf_counter()
+        result = function(*args)
+        entry = {
+            'wall_s': round(time.perf_counter() - start, 4),
+            'cpu_s': round(time.process_time() - start_cpu, 4),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        if self.trace_memory:
+            entry['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        self.stages[name] = entry
+        return result
+
+
+# Function to start the stand-in sites for a scale and return (process, base URL)
+# `latency` seconds are added to every response, like a real site's round trip
+def start_stub(scale, latency=0.0):
+    process = subprocess.Popen([sys.executable, os.path.join(bench_dir, 'stub_server.py'),
+                                '--scale', str(scale), '--port', '0', '--latency', str(latency)],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=bench_dir)
+    url = process.stdout.readline().strip()
+    if not url.startswith('http'):
+        process.kill()
+        raise SystemExit(f'stub_server.py did not start for scale {scale}')
+    return process, url
+
+
+# Fetch stage: the same URLs, order and concurrency the scrapers use, rate limits off
+def fetch_all(url):
+    dell_scraper.base_url = newegg_scraper.base_url = bestbuy_scraper.base_url = url
+    session = make_session(pool_size=max(dell_scraper.fetch_workers, bestbuy_scraper.fetch_workers))
+
+    dell_first = fetch_page(session, dell_scraper.page_url(1))
+    dell_pages = dell_scraper.get_page_loop(extract_dell_page(dell_first)[1]['total_product'])
+    dell = [dell_first] + fetch_pages(session, [dell_scraper.page_url(i) for i in range(2, dell_pages + 1)],
+                                      workers=dell_scraper.fetch_workers)
+
+    newegg_first = fetch_page(session, newegg_scraper.page_url(1))
+    newegg_pages = extract_newegg_page(newegg_first)[1].get('page_count', 1)
+    newegg = [newegg_first] + fetch_pages(session, [newegg_scraper.page_url(i) for i in range(2, newegg_pages + 1)],
+                                          workers=1)
+
+    search = f'{url}/api/v2/json/search'
+    params = {'query': 'dell monitor', 'category': 'monitors', 'condition': 'new'}
+    bestbuy_first = fetch_page(session, search, params={**params, 'page': 1})
+    bestbuy_pages = bestbuy_scraper.get_page_count(json.loads(bestbuy_first))
+    bestbuy = [bestbuy_first] + fetch_pages(
+        session, [full_url(search, {**params, 'page': i}) for i in range(2, bestbuy_pages + 1)],
+        workers=bestbuy_scraper.fetch_workers)
+    session.close()
+    return {'dell': dell, 'newegg': newegg, 'bestbuy': bestbuy}
+
+
+# Parse stage: every page into the frames the scrapers would write
+def parse_all(pages):
+    dell = [record for page in pages['dell'] for record in extract_dell_page(page)[0]]
+    newegg = [record for page in pages['newegg'] for record in extract_newegg_page(page)[0]]
+    bestbuy = [record for page in pages['bestbuy'] for record in bestbuy_scraper.parse_products(json.loads(page))]
+    return {
+        'dell': pd.DataFrame(dell, columns=DELL_COLUMNS),
+        'newegg': pd.DataFrame(newegg, columns=NEWEGG_COLUMNS),
+        'bestbuy': pd.DataFrame(bestbuy, columns=BESTBUY_COLUMNS),
+    }
+
+
+# Output stage: the listing CSVs, comparison CSVs and serving artifacts, written to `target`
+def write_all(frames, df, target, date='20240701'):
+    for name, prefix in [('dell', 'official'), ('bestbuy', 'bestbuy'), ('newegg', 'newegg')]:
+        frames[name].to_csv(os.path.join(target, f'{prefix}_dell_monitor_{date}.csv'), index=False)
+    comparison.data_dir = target
+    comparison.write_outputs(df, date)
+    layouts = {r: comparison.layout(rows, r)
+               for r, rows in df.groupby('Retailer', sort=False, observed=True)}
+    write_artifacts(df, layouts, frames['dell'], date, root=target)
+
+
+# Function to run every stage for one catalogue scale
+def run_scale(scale, trace_memory=False):
+    catalogue = scale_catalogue(scale)
+    process, url = start_stub(scale)
+    timer = StageTimer(trace_memory)
+    try:
+        pages = timer.run('fetch', fetch_all, url)
+    finally:
+        process.kill()
+        process.wait()
+    frames = timer.run('parse', parse_all, pages)
+    listings = {'bestbuy': frames['bestbuy'], 'newegg': frames['newegg']}
+    df = timer.run('compare', comparison.compare_all, catalogue['index'], frames['dell'], listings)
+
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as target, open(os.devnull, 'w') as quiet:
+        sys.stdout = quiet
+        try:
+            timer.run('output', write_all, frames, df, target)
+        finally:
+            sys.stdout = stdout
+
+    expected = {name: len(catalogue[name]) for name in ['dell', 'bestbuy', 'newegg']}
+    return {
+        'scale': scale,
+        'pages': {name: len(p) for name, p in pages.items()},
+        'bytes_fetched': sum(len(p) for site in pages.values() for p in site),
+        'rows': {name: len(frame) for name, frame in frames.items()},
+        'expected_rows': expected,
+        'compared_rows': len(df),
+        'stages': timer.stages,
+    }
+
+
+# Function to print one run as a table, with the ratio to a baseline run when there is one
+def print_run(run, baseline=None, threshold=1.2):
+    print(f'\nScale {run["scale"]}x: {run["rows"]["dell"]} Dell, {run["rows"]["bestbuy"]} BestBuy, '
+          f'{run["rows"]["newegg"]} Newegg rows, {sum(run["pages"].values())} pages, '
+          f'{run["bytes_fetched"] / 1024 / 1024:.1f} MB fetched, {run["compared_rows"]} compared')
+    print(f'  {"stage":<9}{"wall s":>9}{"cpu s":>9}{"peak MB":>9}{"vs base":>9}')
+    for name in STAGES:
+        stage = run['stages'][name]
+        ratio = ''
+        if baseline and name in baseline['stages']:
+            change = stage['wall_s'] / max(baseline['stages'][name]['wall_s'], 1e-9)
+            ratio = f'{change:.2f}x' + (' !' if change > threshold else '')
+        print(f'  {name:<9}{stage["wall_s"]:>9.3f}{stage["cpu_s"]:>9.3f}{stage["peak_rss_mb"]:>9.1f}{ratio:>9}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time fetch / parse / compare / output at growing catalogue scales')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record each stage\'s peak Python allocations (slower)')
+    parser.add_argument('--baseline', help='an earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='flag stages this many times slower')
+    parser.add_argument('--output', help='where to write the results (default: results/bench_pipeline_<time>.json)')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {run['scale']: run for run in json.load(f)['runs']}
+
+    if args.trace_memory:
+        tracemalloc.start()
+    started = datetime.datetime.now()
+    runs = []
+    for scale in args.scales:
+        run = run_scale(scale, args.trace_memory)
+        if run['rows'] != run['expected_rows']:
+            raise SystemExit(f'Scale {scale}: parsed {run["rows"]}, expected {run["expected_rows"]}')
+        print_run(run, baseline.get(scale), args.threshold)
+        runs.append(run)
+
+    results = {
+        'benchmark': 'pipeline',
+        'started': started.isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': runs,
+    }
+    path = args.output or os.path.join(results_dir, f'bench_pipeline_{started.strftime("%Y%m%dT%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nResults saved to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the MAP policy engine
+# Re-classifies a synthetic year of daily comparisons (bench_analytics.py's
+# history) under the default bands, checks that matches the fixed bands the
+# comparison used before policies, then under a policy with per-retailer
+# tolerances, per-product MAP prices and promo windows, as policy.py whatif does
+#
+# Usage: python3 bench_policy.py [--days 365] [--products 5000] [--rules 2000]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import policy  # noqa: E402
+from bench_analytics import synthetic_history  # noqa: E402
+from retailers import RETAILERS  # noqa: E402
+from schema import STATUS  # noqa: E402
+
+
+# Function to write a proposed policy: a tolerance per retailer, then product rules,
+# half of them MAP prices for one retailer and half promo windows everywhere
+def synthetic_rules(path, history, count, seed=11):
+    rng = np.random.default_rng(seed)
+    products = history.drop_duplicates('Dell_product')[['Dell_product', 'Dell_price']]
+    picked = products.sample(count, replace=count > len(products), random_state=seed)
+    dates = pd.to_datetime(history['date'].unique(), format='%Y%m%d').sort_values()
+    starts = dates[rng.integers(0, len(dates), count)]
+    promo = np.arange(count) % 2 == 1
+    rules = pd.DataFrame({
+        'Dell_product': picked['Dell_product'].to_numpy(),
+        'Retailer': np.where(promo, '', rng.choice(list(RETAILERS), count)),
+        'Start': starts.strftime('%Y%m%d'),
+        'End': np.where(promo, (starts + pd.to_timedelta(rng.integers(3, 15, count), unit='D')).strftime('%Y%m%d'),
+                        ''),
+        'Map_price': (picked['Dell_price'].to_numpy() * np.where(promo, 0.85, 0.95)).round(2),
+        'Grace': np.where(promo, 0, 2),
+        'Tolerance': 10,
+        'Note': np.where(promo, 'promo', 'MAP'),
+    })
+    tolerances = pd.DataFrame({'Dell_product': '', 'Retailer': list(RETAILERS), 'Start': '', 'End': '',
+                               'Map_price': np.nan, 'Grace': 1, 'Tolerance': 12, 'Note': 'retailer tolerance'})
+    pd.concat([tolerances, rules], ignore_index=True).to_csv(path, index=False)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time re-classifying a price history under a MAP policy')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--rules', type=int, default=2000)
+    args = parser.parse_args()
+
+    history = synthetic_history(args.days, args.products)
+    print(f'{len(history)} comparison rows: {args.days} days x {args.products} products x {len(RETAILERS)} retailers')
+    # The fixed bands, on the deviation the comparison computes from the two prices
+    deviation = ((history['Retailer_price'] - history['Dell_price']) / history['Dell_price'] * 100).to_numpy()
+    bands = np.select([deviation >= 0, deviation >= -10, deviation < -10], STATUS, default='Undetermined')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proposed = os.path.join(tmp, 'proposed.csv')
+        synthetic_rules(proposed, history, args.rules)
+        seconds, default = timed(policy.load_policy, os.path.join(tmp, 'missing.csv'))
+        print(f'{"step":<34}{"seconds":>9}')
+        print(f'{"load default policy":<34}{seconds:>9.3f}')
+        seconds, statuses = timed(default.classify, history, history['date'])
+        print(f'{"classify, default bands":<34}{seconds:>9.3f}')
+        mismatched = int((np.asarray(statuses) != bands).sum())
+
+        seconds, proposal = timed(policy.load_policy, proposed)
+        print(f'{"load and flatten " + str(args.rules) + " rules":<34}{seconds:>9.3f}')
+        seconds, changed_to = timed(proposal.classify, history, history['date'])
+        print(f'{"classify, proposed policy":<34}{seconds:>9.3f}')
+
+    print(f'\n{mismatched} rows differ from the fixed bands under the default policy')
+    moved = pd.crosstab(pd.Series(np.asarray(statuses), name='Default'),
+                        pd.Series(np.asarray(changed_to), name='Proposed'))
+    print(moved.to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Memory report for the typed schema
+# Writes the saved catalogue grown N times (100x by default) as the day's CSVs,
+# then loads every table twice: the way the scripts used to (pandas' inferred
+# dtypes, text as Python objects) and through schema.read_csv. Bytes per row
+# are reported for each table and for the comparison frame, along with the
+# comparison's peak Python allocations in one pass and in chunks under a budget
+#
+# Usage: python3 bench_schema.py [--scale 100] [--budget-mb 2]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import comparison  # noqa: E402
+import schema  # noqa: E402
+from fixtures import scale_catalogue  # noqa: E402
+
+FILES = {'index': 'index.csv', 'dell': 'official_dell_monitor_{date}.csv',
+         'bestbuy': 'bestbuy_dell_monitor_{date}.csv', 'newegg': 'newegg_dell_monitor_{date}.csv'}
+
+
+# Function to read a CSV the way the scripts did before the schema: text as Python objects
+def read_inferred(path, dataset):
+    with pd.option_context('future.infer_string', False):
+        return pd.read_csv(path, dtype=str if dataset == 'index' else None)
+
+
+# Function to turn a typed frame back into the object columns the untyped engine produced
+def untyped(df):
+    return df.astype({column: object for column in df.columns if not pd.api.types.is_float_dtype(df[column])})
+
+
+# Function to run the comparison with Python allocations traced, returning (frame, peak MB)
+def traced_compare(tables, budget):
+    tracemalloc.start()
+    df = comparison.compare_all(tables['index'], tables['dell'],
+                                {'bestbuy': tables['bestbuy'], 'newegg': tables['newegg']}, budget=budget)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return df, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes per row before and after the typed schema')
+    parser.add_argument('--scale', type=int, default=100, help='grow the saved catalogue this many times')
+    parser.add_argument('--budget-mb', type=float, default=2, help='memory budget for the chunked comparison')
+    args = parser.parse_args()
+
+    budget = int(args.budget_mb * 1024 * 1024)
+    catalogue = scale_catalogue(args.scale)
+    before, after = {}, {}
+    with tempfile.TemporaryDirectory() as target:
+        for name, pattern in FILES.items():
+            path = os.path.join(target, pattern.format(date='20240701'))
+            catalogue[name].to_csv(path, index=False)
+            before[name] = read_inferred(path, name)
+            after[name] = schema.read_csv(path, name)
+
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as quiet:
+        sys.stdout = quiet
+        try:
+            typed, one_pass_mb = traced_compare(after, 2 ** 62)
+            chunked, chunked_mb = traced_compare(after, budget)
+        finally:
+            sys.stdout = stdout
+    pd.testing.assert_frame_equal(typed, chunked)
+    before['comparison'], after['comparison'] = untyped(typed), typed
+
+    print(f'\nScale {args.scale}x')
+    print(f'{"table":<12}{"rows":>9}{"before B/row":>14}{"after B/row":>13}{"before MB":>11}{"after MB":>10}'
+          f'{"saved":>8}')
+    total_before = total_after = 0
+    for name in [*FILES, 'comparison']:
+        rows = len(after[name])
+        old, new = schema.bytes_per_row(before[name]), schema.bytes_per_row(after[name])
+        total_before += old * rows
+        total_after += new * rows
+        print(f'{name:<12}{rows:>9}{old:>14.0f}{new:>13.0f}{old * rows / 1024 / 1024:>11.1f}'
+              f'{new * rows / 1024 / 1024:>10.1f}{1 - new / old:>8.0%}')
+    print(f'{"total":<48}{total_before / 1024 / 1024:>11.1f}{total_after / 1024 / 1024:>10.1f}'
+          f'{1 - total_after / total_before:>8.0%}')
+    chunks = comparison.chunk_count(comparison.long_index(after['index'], ['bestbuy', 'newegg']), budget)
+    print(f'\nComparison peak Python allocations: {one_pass_mb:.1f} MB in one pass, {chunked_mb:.1f} MB '
+          f'in {chunks} chunks under a {args.budget_mb:g} MB budget, same {len(typed)} rows')
+
+
+if __name__ == '__main__':
+    main()
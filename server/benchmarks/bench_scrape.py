@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the staged fetch / parse / write scrape
+# Serves the catalogue grown N times from stub_server.py with a round-trip
+# latency, then pulls every Dell and Newegg result page through
+# fetcher.iter_parsed the way the scrapers do, once per parse worker count.
+# With 0 workers pages are parsed on the writer's thread between downloads,
+# with more they are parsed in worker processes while the next pages download.
+#
+# Usage: python3 bench_scrape.py [--scale 20] [--latency 0.05] [--parse-workers 0 2 4]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+import dell_scraper  # noqa: E402
+import newegg_scraper  # noqa: E402
+from bench_pipeline import peak_rss_mb, start_stub  # noqa: E402
+from extraction import extract_dell_page, extract_newegg_page, parse_page, record_parsed  # noqa: E402
+from fetcher import fetch_page, iter_parsed, make_session  # noqa: E402
+
+
+# Function to scrape every Dell and Newegg page, returning (records per site, wall s, CPU s in this process)
+def scrape(url, parse_workers):
+    dell_scraper.base_url = newegg_scraper.base_url = url
+    session = make_session(pool_size=dell_scraper.fetch_workers)
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+
+    records = {}
+    dell_pages = dell_scraper.get_page_loop(
+        extract_dell_page(fetch_page(session, dell_scraper.page_url(1)))[1]['total_product'])
+    newegg_pages = extract_newegg_page(fetch_page(session, newegg_scraper.page_url(1)))[1].get('page_count', 1)
+    for site, module, pages, workers in [('dell', dell_scraper, dell_pages, dell_scraper.fetch_workers),
+                                         ('newegg', newegg_scraper, newegg_pages, 1)]:
+        urls = [module.page_url(i) for i in range(2, pages + 1)]
+        records[site] = 0
+        for _, parsed in iter_parsed(session, urls, partial(parse_page, site), workers=workers,
+                                     parse_workers=parse_workers):
+            records[site] += len(record_parsed(site, parsed)[0])
+    session.close()
+    return records, time.perf_counter() - start, time.process_time() - start_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape time with parsing on the writer thread vs worker processes')
+    parser.add_argument('--scale', type=int, default=20, help='grow the saved catalogue this many times')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--parse-workers', type=int, nargs='+', default=[0, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    process, url = start_stub(args.scale, args.latency)
+    try:
+        print(f'Scale {args.scale}x, {args.latency * 1000:.0f} ms per response, {os.cpu_count()} CPUs')
+        print(f'{"parse workers":<15}{"wall s":>9}{"cpu s":>9}{"peak MB":>9}  records')
+        baseline = None
+        for workers in args.parse_workers:
+            records, wall, cpu = scrape(url, workers)
+            if baseline is not None and records != baseline:
+                raise SystemExit(f'{workers} parse workers returned {records}, expected {baseline}')
+            baseline = records
+            print(f'{workers:<15}{wall:>9.3f}{cpu:>9.3f}{peak_rss_mb():>9.1f}  {records}')
+    finally:
+        process.kill()
+        process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the product search index
+# Generates N synthetic Dell product names (series, size, features and a model
+# code like the real ones), then times the old search_product loop from
+# Product_page.py against product_search.ProductIndex for a mix of exact,
+# prefix, partial model code, multi-word and misspelt queries
+#
+# Usage: python3 bench_search.py [--products 100000] [--legacy-rows 20000]
+
+# Import necessary libraries
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(bench_dir), 'scripts'))
+
+from product_search import build_index  # noqa: E402
+
+SERIES = {
+    'P': 'Dell', 'S': 'Dell', 'SE': 'Dell', 'E': 'Dell', 'G': 'Dell Gaming',
+    'U': 'Dell UltraSharp', 'C': 'Dell', 'AW': 'Alienware',
+}
+SIZES = [19, 22, 24, 25, 27, 32, 34, 38, 43, 49]
+FEATURES = ['', 'Monitor', 'USB-C Monitor', 'USB-C Hub Monitor', '4K UHD Monitor', 'Curved Monitor',
+            'Gaming Monitor', 'QD-OLED Gaming Monitor', 'Video Conferencing Monitor', 'Touch Monitor']
+SUFFIXES = ['H', 'HN', 'DE', 'QE', 'DGM', 'DW', 'HX', 'Q', 'DF', 'W', 'QC', 'D', 'DS', 'HF']
+
+
+# Function to make `n` distinct product names shaped like Dell's
+def synthetic_products(n, seed=7):
+    rng = np.random.default_rng(seed)
+    series = list(SERIES)
+    names = set()
+    while len(names) < n:
+        k = n - len(names)
+        s = rng.choice(series, k)
+        size = rng.choice(SIZES, k)
+        gen = rng.integers(10, 30, k)
+        suffix = rng.choice(SUFFIXES, k)
+        feature = rng.choice(FEATURES, k)
+        for s_, size_, gen_, suffix_, feature_ in zip(s, size, gen, suffix, feature):
+            code = f'{s_}{size_}{gen_}{suffix_}'
+            title = ' '.join(part for part in [SERIES[s_], str(size_), feature_] if part)
+            names.add(f'{title} - {code}')
+    names = sorted(names)
+    rng.shuffle(names)
+    return pd.DataFrame({
+        'Dell_product': names,
+        'Dell_price': rng.uniform(99, 2999, n).round(2),
+    })
+
+
+# The search Product_page.py used before the index
+def legacy_search(df, product_name):
+    search_df = pd.DataFrame()
+    for i in df['Dell_product']:
+        if product_name in i:
+            search_df = pd.concat([search_df, df[df['Dell_product'] == i]])
+    return search_df
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - begin)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Linear search_product vs the token index')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--legacy-rows', type=int, default=20000,
+                        help='run the old loop on this many rows only, it is quadratic in matches')
+    args = parser.parse_args()
+
+    df = synthetic_products(args.products)
+    legacy_df = df.head(args.legacy_rows)
+    sample = df['Dell_product'].iloc[len(df) // 2]
+    code = sample.split(' - ')[-1]
+    queries = [
+        ('exact model code', code),
+        ('partial model code', code[1:5]),
+        ('prefix', code[:4]),
+        ('multi-word', 'UltraSharp 27 USB-C'),
+        ('misspelt code', code[:-2] + code[-1] + code[-2] if code[-1] != code[-2] else code + 'X'),
+    ]
+
+    begin = time.perf_counter()
+    index = build_index(df)
+    build_s = time.perf_counter() - begin
+    print(f'\nIndex over {len(df)} products built in {build_s:.2f}s '
+          f'({len(index.vocabulary)} distinct tokens)')
+    print(f'Old loop timed on the first {len(legacy_df)} rows')
+    print(f'{"query":<20}{"text":<22}{"old hits":>9}{"old s":>9}{"hits":>8}{"top 10 ms":>11}')
+    for label, text in queries:
+        legacy_s, legacy = timed(legacy_search, legacy_df, text, repeat=1)
+        index_s, _ = timed(index.search, text, limit=10)
+        hits = len(index.search(text, limit=None))
+        print(f'{label:<20}{text:<22}{len(legacy):>9}{legacy_s:>9.3f}{hits:>8}{index_s * 1000:>11.2f}')
+
+    # The ranked top hit for an exact model code must carry that code
+    top = index.search(code, limit=1)['Dell_product'].iloc[0]
+    if not top.endswith(f' - {code}'):
+        raise SystemExit(f'Top hit for {code} was {top!r}')
+
+
+if __name__ == '__main__':
+    main()
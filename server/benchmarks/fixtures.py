@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Recorded-page fixtures for the benchmarks
+# Renders the saved scraper CSVs in scripts/data back into search result pages
+# (and BestBuy API responses) using the same markup the scrapers select on, so
+# everything can be measured without hitting the live sites. scale_catalogue()
+# grows the saved catalogue N times with distinct products, SKUs and index rows.
+
+# Import necessary libraries
+import ast
+import glob
+import html
+import json
+import os
+import zlib
+
+import pandas as pd
+
+# Directory paths
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+scripts_dir = os.path.join(os.path.dirname(bench_dir), 'scripts')
+data_dir = os.path.join(scripts_dir, 'data')
+
+DELL_PAGE_SIZE = 12
+NEWEGG_PAGE_SIZE = 36
+BESTBUY_PAGE_SIZE = 24
+
+# Some page chrome around the results so the parser has realistic work to skip
+_PAGE_HEAD = '''<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<script>window.__state = {{"search": "monitor", "filters": []}};</script>
+<link rel="stylesheet" href="//assets.example.com/site.css"></head>
+<body><header><nav><ul>{nav}</ul></nav></header><main>
+'''
+_PAGE_TAIL = '''</main><footer><p>Terms of use | Privacy</p>{nav}</footer></body></html>'''
+_NAV = ''.join(f'<li><a href="/category/{i}">Category {i}</a></li>' for i in range(40))
+
+
+# Function to find the most recent saved CSV for a dataset prefix
+def latest_csv(prefix):
+    files = sorted(glob.glob(os.path.join(data_dir, f'{prefix}_*.csv')))
+    if not files:
+        raise FileNotFoundError(f'No saved {prefix} CSV found in {data_dir}')
+    return files[-1]
+
+
+def _dell_card(row):
+    specs = row['Dell_specs']
+    if isinstance(specs, str):
+        specs = ast.literal_eval(specs)
+    spec_html = ''.join(
+        f'<li><span class="ps-iconography-specs-label">\n{html.escape(s)}\n</span></li>' for s in specs
+    )
+    price = f'{row["Dell_price"]:,.2f}'
+    part = html.escape(str(row['Dell_product_id']))
+    return f'''<article class="stack-system ps-stack">
+<div class="ps-image"><img src="//i.dell.com/is/image/DellContent/{zlib.crc32(row["Dell_link"].encode())}" alt=""></div>
+<h3 class="ps-title"><a href="//{html.escape(row["Dell_link"])}">{html.escape(row["Dell_product"])}</a></h3>
+<div class="ps-product-detail-info">{part}</div>
+<div class="ps-snp-tech-specs ps-icon-specs-container"><ul>{spec_html}</ul></div>
+<div class="ps-dell-price ps-simplified"><span class="sr-only">Dell Price</span> ${price}</div>
+<div class="ps-dell-price ps-simplified"><span class="sr-only">Dell Price</span> ${price}</div>
+<button class="ps-add-to-cart">Add to Cart</button>
+</article>
+'''
+
+
+def _newegg_price(price):
+    if isinstance(price, str) and price:
+        dollars, _, cents = price.partition('.')
+        return f'$<strong>{dollars}</strong><sup>.{cents or "00"}</sup>\xa0(2 Offers)'
+    return ''
+
+
+def _newegg_card(row):
+    # Saved links may still carry the &amp; the old str(tag) scraping left in them
+    link = html.escape(html.unescape(row['Newegg_link']))
+    price_html = _newegg_price(row['Newegg_price'])
+    return f'''<div class="item-cell"><div class="item-container">
+<a class="item-img" href="https://{link}"><img src="//c1.neweggimages.com/ProductImageCompressAll300/{html.escape(str(row["Newegg_sku"]))}.jpg" alt=""></a>
+<div class="item-info"><a class="item-brand" href="https://www.newegg.ca/Dell/BrandStore/ID-1100"><img src="//c1.neweggimages.com/Brandimage_70x28/Brand1100.gif" alt="Dell"></a>
+<a class="item-title" href="https://{link}">{html.escape(row["Newegg_name"])}</a></div>
+<div class="item-action"><ul class="price"><li class="price-was"></li>
+<li class="price-current">{price_html}</li>
+<li class="price-ship">Free Shipping</li></ul></div>
+</div></div>
+'''
+
+
+# Function to render Dell search pages from a Dell listing frame
+def render_dell_pages(dell, page_size=DELL_PAGE_SIZE):
+    total = len(dell)
+    rows = dell.to_dict(orient='records')
+    pages = []
+    for start in range(0, total, page_size):
+        end = min(start + page_size, total)
+        cards = ''.join(_dell_card(row) for row in rows[start:end])
+        pages.append(
+            _PAGE_HEAD.format(title='Monitors | Dell Canada', nav=_NAV)
+            + f'<p class="pageinfo">Showing {start + 1}-{end} of {total} results</p>'
+            + f'<section class="ps-results">{cards}</section>'
+            + _PAGE_TAIL.format(nav=_NAV)
+        )
+    return pages
+
+
+# Function to render Newegg search pages from a Newegg listing frame
+def render_newegg_pages(newegg, page_size=NEWEGG_PAGE_SIZE):
+    rows = newegg.to_dict(orient='records')
+    page_count = max(1, -(-len(rows) // page_size))
+    pages = []
+    for number in range(1, page_count + 1):
+        cards = ''.join(_newegg_card(row) for row in rows[(number - 1) * page_size:number * page_size])
+        pages.append(
+            _PAGE_HEAD.format(title='monitor dell | Newegg.ca', nav=_NAV)
+            + f'<span class="list-tool-pagination-text">Page <strong>{number}<!-- -->/<!-- -->{page_count}</strong></span>'
+            + f'<div class="item-cells-wrap">{cards}</div>'
+            + _PAGE_TAIL.format(nav=_NAV)
+        )
+    return pages
+
+
+# Function to render BestBuy search API responses from a BestBuy listing frame
+# Each page reports total / totalPages / pageSize like the live API, and one
+# empty page past the end is added for scrapers that walk until an empty page
+def render_bestbuy_pages(bestbuy, page_size=BESTBUY_PAGE_SIZE):
+    rows = bestbuy.to_dict(orient='records')
+    total = len(rows)
+    page_count = max(1, -(-total // page_size))
+    pages = []
+    for number in range(1, page_count + 2):
+        products = []
+        for row in rows[(number - 1) * page_size:number * page_size]:
+            price = pd.to_numeric(row['Bestbuy_price'], errors='coerce')
+            products.append({
+                'name': row['Bestbuy_name'],
+                'sku': str(row['Bestbuy_sku']),
+                'salePrice': None if pd.isna(price) else float(price),
+            })
+        pages.append({'currentPage': number, 'total': total, 'totalPages': page_count,
+                      'pageSize': page_size, 'products': products})
+    return [json.dumps(page) for page in pages]
+
+
+# Function to render one Newegg product page per listing, keyed by the path of its link
+# A carousel of other items follows the buy box, like on the live pages
+def render_newegg_products(newegg):
+    pages = {}
+    rows = newegg.to_dict(orient='records')
+    for i, row in enumerate(rows):
+        path = '/' + html.unescape(str(row['Newegg_link'])).split('?')[0].split('/', 1)[-1]
+        others = ''.join(_newegg_card(other) for other in rows[i + 1:i + 4])
+        pages[path] = (
+            _PAGE_HEAD.format(title=f'{html.escape(row["Newegg_name"])} - Newegg.ca', nav=_NAV)
+            + f'<h1 class="product-title">{html.escape(row["Newegg_name"])}</h1>'
+            + '<div class="product-price"><ul class="price"><li class="price-current">'
+            + f'{_newegg_price(row["Newegg_price"])}</li></ul></div>'
+            + f'<div class="item-cells-wrap">{others}</div>'
+            + _PAGE_TAIL.format(nav=_NAV)
+        )
+    return pages
+
+
+# Function to render one BestBuy product API entry per listing, keyed by SKU
+def render_bestbuy_products(bestbuy):
+    entries = {}
+    for row in bestbuy.to_dict(orient='records'):
+        price = pd.to_numeric(row['Bestbuy_price'], errors='coerce')
+        entries[str(row['Bestbuy_sku'])] = json.dumps({
+            'sku': str(row['Bestbuy_sku']),
+            'name': row['Bestbuy_name'],
+            'salePrice': None if pd.isna(price) else float(price),
+        })
+    return entries
+
+
+# Function to read the saved catalogue: Dell, BestBuy and Newegg listings plus index.csv
+def load_catalogue():
+    return {
+        'dell': pd.read_csv(latest_csv('official_dell_monitor')),
+        'bestbuy': pd.read_csv(latest_csv('bestbuy_dell_monitor'), dtype={'Bestbuy_sku': str}),
+        'newegg': pd.read_csv(latest_csv('newegg_dell_monitor'), dtype={'Newegg_price': str}),
+        'index': pd.read_csv(os.path.join(scripts_dir, 'index.csv'), dtype=str),
+    }
+
+
+# Function to grow the saved catalogue `factor` times
+# Copy k of every product gets a " v{k}" name and SKUs tagged with k, and
+# index.csv grows with it, so the copies match each other exactly like the
+# saved day does and every stage sees `factor` times the work
+def scale_catalogue(factor=1, catalogue=None):
+    catalogue = catalogue or load_catalogue()
+    if factor <= 1:
+        return catalogue
+
+    def grow(df, columns):
+        copies = []
+        for k in range(factor):
+            copy = df.copy()
+            if k:
+                for column, tag in columns.items():
+                    values = copy[column].astype(str)
+                    copy[column] = values.where(copy[column].isna(), values + tag.format(k=k))
+            copies.append(copy)
+        return pd.concat(copies, ignore_index=True)
+
+    return {
+        'dell': grow(catalogue['dell'], {'Dell_product': ' v{k}', 'Dell_link': '-v{k}'}),
+        'bestbuy': grow(catalogue['bestbuy'], {'Bestbuy_sku': '{k:04d}', 'Bestbuy_name': ' v{k}'}),
+        'newegg': grow(catalogue['newegg'], {'Newegg_sku': '-{k}', 'Newegg_name': ' v{k}',
+                                             'Newegg_link': '-{k}'}),
+        'index': grow(catalogue['index'], {'Dell_product': ' v{k}', 'Bestbuy_sku': '{k:04d}',
+                                           'Newegg_sku': '-{k}', 'CCE_sku': '-{k}'}),
+    }
+
+
+# Function to load saved pages from a directory, or render them from the CSVs
+# Saved pages are expected to be named dell_<n>.html and newegg_<n>.html
+def load_pages(pages_dir=None):
+    if pages_dir:
+        def read(prefix):
+            files = sorted(glob.glob(os.path.join(pages_dir, f'{prefix}_*.html')),
+                           key=lambda f: int(os.path.basename(f).split('_')[-1].split('.')[0]))
+            pages = []
+            for path in files:
+                with open(path, 'rb') as f:
+                    pages.append(f.read())
+            return pages
+        return read('dell'), read('newegg')
+
+    dell = pd.read_csv(latest_csv('official_dell_monitor'))
+    newegg = pd.read_csv(latest_csv('newegg_dell_monitor'), dtype={'Newegg_price': str})
+    dell_pages = [p.encode('utf-8') for p in render_dell_pages(dell)]
+    newegg_pages = [p.encode('utf-8') for p in render_newegg_pages(newegg)]
+    return dell_pages, newegg_pages
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Local stand-in for Dell, Newegg and BestBuy
+# Serves the recorded fixture pages on the URLs the scrapers request, so a
+# whole scrape can run offline against it:
+#   /en-ca/search/monitor?p=N      Dell search result pages
+#   /p/pl?d=monitor+dell&page=N    Newegg search result pages
+#   /api/v2/json/search?page=N     BestBuy search API responses
+#   /<slug>/p/<item>               Newegg product pages
+#   /api/v2/json/product/<sku>     BestBuy product API entries
+# Every response carries an ETag and answers If-None-Match with a 304.
+#
+# Usage: python3 stub_server.py [--scale 10] [--port 8766] [--latency 0.05]
+#        then point DELL_BASE_URL / NEWEGG_BASE_URL / BESTBUY_BASE_URL at the printed URL
+
+# Import necessary libraries
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import (load_pages, render_bestbuy_pages, render_bestbuy_products, render_dell_pages,
+                      render_newegg_pages, render_newegg_products, scale_catalogue)
+
+
+# Function to render every page of a catalogue up front, outside of anything being timed
+def render_site(catalogue):
+    return {
+        'dell': [p.encode('utf-8') for p in render_dell_pages(catalogue['dell'])],
+        'newegg': [p.encode('utf-8') for p in render_newegg_pages(catalogue['newegg'])],
+        'bestbuy': [p.encode('utf-8') for p in render_bestbuy_pages(catalogue['bestbuy'])],
+        'newegg_products': {k: p.encode('utf-8') for k, p in render_newegg_products(catalogue['newegg']).items()},
+        'bestbuy_products': {k: p.encode('utf-8') for k, p in render_bestbuy_products(catalogue['bestbuy']).items()},
+    }
+
+
+class StubServer:
+    def __init__(self, site, host='127.0.0.1', port=0, latency=0.0):
+        self.site = site
+        self.latency = latency
+        self.requests = {'200': 0, '304': 0, '404': 0}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+        self._thread = None
+
+    def _count(self, status):
+        with self._lock:
+            self.requests[status] += 1
+
+    # Function to pick the page a request path asks for, None if there is no such page
+    def page(self, path):
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        if parts.path.startswith('/en-ca/search'):
+            pages, number = self.site['dell'], query.get('p', ['1'])[0]
+        elif parts.path.startswith('/p/pl'):
+            pages, number = self.site['newegg'], query.get('page', ['1'])[0]
+        elif parts.path.startswith('/api/v2/json/search'):
+            pages, number = self.site['bestbuy'], query.get('page', ['1'])[0]
+        elif parts.path.startswith('/api/v2/json/product/'):
+            body = self.site.get('bestbuy_products', {}).get(parts.path.rsplit('/', 1)[-1])
+            return body, 'application/json' if body is not None else None
+        elif '/p/' in parts.path:
+            body = self.site.get('newegg_products', {}).get(parts.path)
+            return body, 'text/html; charset=utf-8' if body is not None else None
+        else:
+            return None, None
+        number = int(number) if number.isdigit() else 0
+        if not 1 <= number <= len(pages):
+            return None, None
+        content_type = 'application/json' if pages is self.site['bestbuy'] else 'text/html; charset=utf-8'
+        return pages[number - 1], content_type
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                body, content_type = server.page(self.path)
+                if body is None:
+                    server._count('404')
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    server._count('304')
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                server._count('200')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded Dell / Newegg / BestBuy pages locally')
+    parser.add_argument('--scale', type=int, default=1, help='grow the saved catalogue this many times')
+    parser.add_argument('--port', type=int, default=8766, help='0 picks a free port')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--pages-dir', help='serve saved dell_<n>.html / newegg_<n>.html pages instead')
+    args = parser.parse_args()
+
+    site = render_site(scale_catalogue(args.scale))
+    if args.pages_dir:
+        site['dell'], site['newegg'] = load_pages(args.pages_dir)
+    server = StubServer(site, port=args.port, latency=args.latency)
+    # The first line is the URL, so a parent process can read it back
+    print(server.url, flush=True)
+    print(f'{len(site["dell"])} Dell, {len(site["newegg"])} Newegg and {len(site["bestbuy"])} BestBuy pages',
+          file=sys.stderr, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
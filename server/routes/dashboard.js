@@ -5,6 +5,7 @@ const path = require("path");
 const fs = require("fs");
 const bcrypt = require("bcrypt");
 const knex = require("../knex");
+const { readManifest, readArtifact } = require("../serving");
 
 // Define paths to your CSV files
 const DATA_DIR = path.resolve(__dirname, "../scripts/data");
@@ -19,17 +20,6 @@ function getMostRecentFile(pattern) {
   return files[0];
 }
 
-// Get the most recent files
-const mostRecentBestBuyFile = getMostRecentFile("bestbuy_comparison");
-const mostRecentNeweggFile = getMostRecentFile("newegg_comparison");
-
-if (!mostRecentBestBuyFile || !mostRecentNeweggFile) {
-  throw new Error("No recent data files found.");
-}
-
-const BESTBUY_CSV = path.join(DATA_DIR, mostRecentBestBuyFile);
-const NEWEGG_CSV = path.join(DATA_DIR, mostRecentNeweggFile);
-
 // Get the user ID when authorized
 router
   .route("/:id")
@@ -82,10 +72,30 @@ router
 // Endpoint to fetch data and calculate metrics
 router.get("/retailer-metrics", async (req, res) => {
   try {
+    // Metrics are precomputed by the last comparison run
+    const manifest = readManifest();
+    const summary = manifest && readArtifact(manifest, "summary");
+    if (summary && summary.retailers.bestbuy && summary.retailers.newegg) {
+      const fromSummary = ({ totalProducts, complianceRate, averageDeviation, totalDeviatedProducts, topOffendingProducts }) =>
+        ({ totalProducts, complianceRate, averageDeviation, totalDeviatedProducts, topOffendingProducts });
+      return res.status(200).json({
+        bestbuy: fromSummary(summary.retailers.bestbuy),
+        newegg: fromSummary(summary.retailers.newegg),
+        total: { totalDeviatedProducts: summary.totalOffenders },
+      });
+    }
+
+    // Before the first published run, fall back to the most recent comparison CSVs
+    const mostRecentBestBuyFile = getMostRecentFile("bestbuy_comparison");
+    const mostRecentNeweggFile = getMostRecentFile("newegg_comparison");
+    if (!mostRecentBestBuyFile || !mostRecentNeweggFile) {
+      throw new Error("No recent data files found.");
+    }
+
     // Fetch data from CSV files
     const [bestbuyData, neweggData] = await Promise.all([
-      csvtojson().fromFile(BESTBUY_CSV),
-      csvtojson().fromFile(NEWEGG_CSV),
+      csvtojson().fromFile(path.join(DATA_DIR, mostRecentBestBuyFile)),
+      csvtojson().fromFile(path.join(DATA_DIR, mostRecentNeweggFile)),
     ]);
 
     // Calculate metrics for BestBuy
@@ -115,7 +125,7 @@ router.get("/retailer-metrics", async (req, res) => {
 // Function to calculate metrics (compliance rate, average deviation, etc.) for a given retailer's data
 const calculateMetrics = (data) => {
   const totalProducts = data.length;
-  const compliantProducts = data.filter(product => product.Status === 'Green').length;
+  const compliantProducts = data.filter(product => product.Status === 'Compliant').length;
   const complianceRate = (compliantProducts / totalProducts) * 100 || 0;
   const averageDeviation = data.reduce((sum, product) => sum + parseFloat(product.Deviation || 0), 0) / totalProducts || 0;
   const totalDeviatedProducts = totalProducts - compliantProducts;
@@ -125,14 +135,14 @@ const calculateMetrics = (data) => {
     complianceRate: complianceRate.toFixed(2),
     averageDeviation: averageDeviation.toFixed(2),
     totalDeviatedProducts,
-    topOffendingProducts: data.filter(product => product.Status !== 'Green').slice(0, 5),
+    topOffendingProducts: data.filter(product => product.Status !== 'Compliant').slice(0, 5),
   };
 };
 
 // Function to calculate total deviated products across both retailers
 const calculateTotalMetrics = (bestbuyData, neweggData) => {
-  const totalBestBuyDeviated = bestbuyData.filter(product => product.Status !== 'Green').length;
-  const totalNeweggDeviated = neweggData.filter(product => product.Status !== 'Green').length;
+  const totalBestBuyDeviated = bestbuyData.filter(product => product.Status !== 'Compliant').length;
+  const totalNeweggDeviated = neweggData.filter(product => product.Status !== 'Compliant').length;
   const totalDeviatedProducts = totalBestBuyDeviated + totalNeweggDeviated;
 
   return {
@@ -3,6 +3,7 @@ const router = express.Router();
 const path = require('path');
 const fs = require('fs');
 const csvtojson = require('csvtojson');
+const { readManifest, readArtifact } = require('../serving');
 require('dotenv').config();
 
 // Load environment variables
@@ -21,6 +22,24 @@ function getMostRecentFile(pattern) {
 // Endpoint to fetch dashboard data
 router.get('/dashboard', async (req, res) => {
   try {
+    // Metrics are precomputed by the last comparison run
+    const manifest = readManifest();
+    const summary = manifest && readArtifact(manifest, 'summary');
+    if (summary && summary.retailers.bestbuy && summary.retailers.newegg) {
+      const { bestbuy, newegg } = summary.retailers;
+      return res.json({
+        totalOffenders: 2, // Assuming monitoring BestBuy and Newegg
+        bestbuyTop5: bestbuy.topOffendingProducts,
+        neweggTop5: newegg.topOffendingProducts,
+        totalDeviatedProductsBestBuy: bestbuy.totalPriceChanges,
+        totalDeviatedProductsNewegg: newegg.totalPriceChanges,
+        averageDeviationBestBuy: parseFloat(bestbuy.averageDeviation),
+        averageDeviationNewegg: parseFloat(newegg.averageDeviation),
+        complianceRateBestBuy: parseFloat(bestbuy.complianceRate),
+        complianceRateNewegg: parseFloat(newegg.complianceRate)
+      });
+    }
+
     const mostRecentBestBuyFile = getMostRecentFile('bestbuy_comparison');
     const mostRecentNeweggFile = getMostRecentFile('newegg_comparison');
 
@@ -37,14 +56,14 @@ router.get('/dashboard', async (req, res) => {
     ]);
 
     const totalOffenders = 2; // Assuming monitoring BestBuy and Newegg
-    const bestbuyTop5 = bestbuyData.filter(item => item.Status !== 'Green').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
-    const neweggTop5 = neweggData.filter(item => item.Status !== 'Green').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
-    const totalDeviatedProductsBestBuy = bestbuyData.filter(item => item.Deviation !== 0).length;
-    const totalDeviatedProductsNewegg = neweggData.filter(item => item.Deviation !== 0).length;
+    const bestbuyTop5 = bestbuyData.filter(item => item.Status !== 'Compliant').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
+    const neweggTop5 = neweggData.filter(item => item.Status !== 'Compliant').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
+    const totalDeviatedProductsBestBuy = bestbuyData.filter(item => parseFloat(item.Deviation) !== 0).length;
+    const totalDeviatedProductsNewegg = neweggData.filter(item => parseFloat(item.Deviation) !== 0).length;
     const averageDeviationBestBuy = bestbuyData.reduce((sum, item) => sum + parseFloat(item.Deviation || 0), 0) / bestbuyData.length;
     const averageDeviationNewegg = neweggData.reduce((sum, item) => sum + parseFloat(item.Deviation || 0), 0) / neweggData.length;
-    const complianceRateBestBuy = (bestbuyData.filter(item => item.Status === 'Green').length / bestbuyData.length) * 100;
-    const complianceRateNewegg = (neweggData.filter(item => item.Status === 'Green').length / neweggData.length) * 100;
+    const complianceRateBestBuy = (bestbuyData.filter(item => item.Status === 'Compliant').length / bestbuyData.length) * 100;
+    const complianceRateNewegg = (neweggData.filter(item => item.Status === 'Compliant').length / neweggData.length) * 100;
 
     const dashboardData = {
       totalOffenders,
@@ -3,6 +3,7 @@ const router = express.Router();
 const path = require('path');
 const fs = require('fs');
 const csvtojson = require('csvtojson');
+const { readManifest, readArtifact } = require('../serving');
 require('dotenv').config();
 
 // Load environment variables
@@ -29,6 +30,13 @@ const fetchDataFromFile = async (filePath) => {
 // Endpoint to fetch Dell data
 router.get('/dell', async (req, res) => {
   try {
+    // Precomputed by the last comparison run, no directory scan or CSV parse
+    // Without an artifact (nothing published yet) fall back to the most recent CSV
+    const manifest = readManifest();
+    const artifact = manifest && readArtifact(manifest, 'dell');
+    if (artifact) {
+      return res.json(artifact);
+    }
     const mostRecentDellFile = getMostRecentFile('official_dell_monitor');
     if (!mostRecentDellFile) {
       throw new Error("No recent Dell data file found.");
@@ -46,6 +54,11 @@ router.get('/dell', async (req, res) => {
 // Endpoint to fetch BestBuy comparison data
 router.get('/compare/dell-bestbuy', async (req, res) => {
   try {
+    const manifest = readManifest();
+    const artifact = manifest && readArtifact(manifest, ['products', 'bestbuy']);
+    if (artifact) {
+      return res.json(artifact);
+    }
     const mostRecentBestBuyFile = getMostRecentFile('bestbuy_comparison');
     if (!mostRecentBestBuyFile) {
       throw new Error("No recent BestBuy data file found.");
@@ -63,6 +76,11 @@ router.get('/compare/dell-bestbuy', async (req, res) => {
 // Endpoint to fetch Newegg comparison data
 router.get('/compare/dell-newegg', async (req, res) => {
   try {
+    const manifest = readManifest();
+    const artifact = manifest && readArtifact(manifest, ['products', 'newegg']);
+    if (artifact) {
+      return res.json(artifact);
+    }
     const mostRecentNeweggFile = getMostRecentFile('newegg_comparison');
     if (!mostRecentNeweggFile) {
       throw new Error("No recent Newegg data file found.");
@@ -80,6 +98,17 @@ router.get('/compare/dell-newegg', async (req, res) => {
 // Endpoint to fetch all products data
 router.get('/', async (req, res) => {
   try {
+    // Served from the artifacts only when every source has been published
+    const manifest = readManifest();
+    const artifacts = manifest && {
+      dellData: readArtifact(manifest, 'dell'),
+      bestbuyData: readArtifact(manifest, ['products', 'bestbuy']),
+      neweggData: readArtifact(manifest, ['products', 'newegg'])
+    };
+    if (artifacts && artifacts.dellData && artifacts.bestbuyData && artifacts.neweggData) {
+      return res.json(artifacts);
+    }
+
     const mostRecentDellFile = getMostRecentFile('official_dell_monitor');
     const mostRecentBestBuyFile = getMostRecentFile('bestbuy_comparison');
     const mostRecentNeweggFile = getMostRecentFile('newegg_comparison');
@@ -3,6 +3,7 @@ const router = express.Router();
 const path = require('path');
 const fs = require('fs');
 const csvtojson = require('csvtojson');
+const { readManifest, readArtifact } = require('../serving');
 require('dotenv').config();
 
 // Load environment variables
@@ -18,9 +19,33 @@ function getMostRecentFile(pattern) {
   return files[0];
 }
 
+// Function to shape a retailer's precomputed summary the way this endpoint returns it
+const fromSummary = (manifest, summary, retailer) => {
+  const metrics = summary.retailers[retailer];
+  return {
+    totalProducts: metrics.totalProducts,
+    complianceRate: metrics.complianceRate,
+    averageDeviation: metrics.averageDeviation,
+    topOffendingProducts: metrics.topOffendingProducts,
+    totalDeviatedProducts: metrics.totalDeviatedProducts,
+    allProducts: readArtifact(manifest, ['products', retailer]) || []
+  };
+};
+
 // Endpoint to fetch retailer data
 router.get('/', async (req, res) => {
   try {
+    // Metrics are precomputed by the last comparison run
+    const manifest = readManifest();
+    const summary = manifest && readArtifact(manifest, 'summary');
+    if (summary && summary.retailers.bestbuy && summary.retailers.newegg) {
+      return res.json({
+        totalOffenders: summary.totalOffenders,
+        bestbuy: fromSummary(manifest, summary, 'bestbuy'),
+        newegg: fromSummary(manifest, summary, 'newegg')
+      });
+    }
+
     const mostRecentBestBuyFile = getMostRecentFile('bestbuy_comparison');
     const mostRecentNeweggFile = getMostRecentFile('newegg_comparison');
 
@@ -38,10 +63,10 @@ router.get('/', async (req, res) => {
 
     const calculateMetrics = (data) => {
       const totalProducts = data.length;
-      const complianceRate = (data.filter(item => item.Status === 'Green').length / totalProducts) * 100;
+      const complianceRate = (data.filter(item => item.Status === 'Compliant').length / totalProducts) * 100;
       const averageDeviation = data.reduce((sum, item) => sum + parseFloat(item.Deviation || 0), 0) / totalProducts;
-      const topOffendingProducts = data.filter(item => item.Status !== 'Green').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
-      const totalDeviatedProducts = data.filter(item => item.Status !== 'Green').length;
+      const topOffendingProducts = data.filter(item => item.Status !== 'Compliant').sort((a, b) => a.Deviation - b.Deviation).slice(0, 5);
+      const totalDeviatedProducts = data.filter(item => item.Status !== 'Compliant').length;
 
       return {
         totalProducts,
@@ -54,7 +79,7 @@ router.get('/', async (req, res) => {
     };
 
     const retailerData = {
-      totalOffenders: bestbuyData.concat(neweggData).filter(item => item.Status !== 'Green').length,
+      totalOffenders: bestbuyData.concat(neweggData).filter(item => item.Status !== 'Compliant').length,
       bestbuy: calculateMetrics(bestbuyData),
       newegg: calculateMetrics(neweggData)
     };
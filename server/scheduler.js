@@ -1,52 +1,228 @@
 const cron = require('node-cron');
-const { exec } = require('child_process');
+const { execFile } = require('child_process');
+const fs = require('fs');
 const path = require('path');
 require('dotenv').config();
 
 const scriptsDir = path.join(__dirname, 'scripts');
+const runsDir = path.join(scriptsDir, 'data', 'pipeline_runs');
+const metricsDir = process.env.METRICS_DIR || path.join(scriptsDir, 'data', 'metrics');
 
-// Function to execute a Python script
-function runPythonScript(scriptName, callback) {
+// The nightly pipeline as a dependency graph
+// A stage starts as soon as every stage in `needs` has succeeded and every stage
+// in `after` has finished (whatever its outcome). The scrapers hit different
+// hosts and write different CSVs, so they all start at once.
+const stages = [
+    { name: 'dell', script: 'dell_scraper.py', needs: [] },
+    { name: 'newegg', script: 'newegg_scraper.py', needs: [] },
+    { name: 'bestbuy', script: 'bestbuy_scraper.py', needs: [] },
+    { name: 'compare_newegg', script: 'Compare_Dell_newegg_current_date.py', needs: ['dell', 'newegg'] },
+    { name: 'compare_bestbuy', script: 'Compare_Dell_Bestbuy_current_date.py', needs: ['dell', 'bestbuy'] },
+    {
+        name: 'product_page',
+        script: 'Product_page.py',
+        needs: ['dell', 'newegg', 'bestbuy'],
+        after: ['compare_newegg', 'compare_bestbuy'],
+    },
+];
+
+// By default the whole graph runs inside one Python process (scripts/pipeline.py),
+// so interpreter start-up and imports are paid once and DataFrames are handed
+// between stages in memory. PIPELINE_MODE=scripts runs one process per stage.
+const singleProcessStages = [
+    { name: 'pipeline', script: 'pipeline.py', needs: [] },
+];
+const pipelineMode = process.env.PIPELINE_MODE || 'single';
+const nightlyStages = pipelineMode === 'scripts' ? stages : singleProcessStages;
+
+// Function to execute a Python script, resolving with its timing and exit status
+function runPythonScript(scriptName) {
     const scriptPath = path.join(scriptsDir, scriptName);
-    console.log(`Starting execution of ${scriptName} at ${new Date().toISOString()}`);
+    const startedAt = new Date();
+    console.log(`Starting execution of ${scriptName} at ${startedAt.toISOString()}`);
 
-    exec(`python3 ${scriptPath}`, (err, stdout, stderr) => {
-        if (err) {
-            console.error(`Error executing ${scriptName} at ${new Date().toISOString()}: ${err.message}`);
-            return callback(err);
-        }
-        console.log(`${scriptName} output at ${new Date().toISOString()}: ${stdout}`);
-        if (stderr) console.error(`${scriptName} stderr at ${new Date().toISOString()}: ${stderr}`);
-        callback(null);
+    return new Promise((resolve) => {
+        execFile('python3', [scriptPath], { maxBuffer: 64 * 1024 * 1024 }, (err, stdout, stderr) => {
+            const finishedAt = new Date();
+            const result = {
+                script: scriptName,
+                startedAt: startedAt.toISOString(),
+                finishedAt: finishedAt.toISOString(),
+                durationMs: finishedAt - startedAt,
+                exitCode: err ? (typeof err.code === 'number' ? err.code : 1) : 0,
+                status: err ? 'failed' : 'succeeded',
+            };
+            if (err) {
+                console.error(`Error executing ${scriptName} at ${finishedAt.toISOString()}: ${err.message}`);
+            } else {
+                console.log(`${scriptName} output at ${finishedAt.toISOString()}: ${stdout}`);
+            }
+            if (stderr) console.error(`${scriptName} stderr at ${finishedAt.toISOString()}: ${stderr}`);
+            resolve(result);
+        });
     });
 }
 
-// Function to run all scripts in sequence
-function runAllScriptsSequentially() {
-    runPythonScript('dell_scraper.py', (err) => {
-        if (err) return;
-        runPythonScript('newegg_scraper.py', (err) => {
-            if (err) return;
-            runPythonScript('bestbuy_scraper.py', (err) => {
-                if (err) return;
-                runPythonScript('compare_dell_newegg_current_date.py', (err) => {
-                    if (err) return;
-                    runPythonScript('compare_dell_bestbuy_current_date.py', (err) => {
-                        if (err) return;
-                        runPythonScript('product_page.py', (err) => {
-                            if (err) return;
-                            console.log('All scripts executed successfully');
-                        });
+// Function to run the whole graph, each stage as early as its inputs allow
+// A failed stage only skips the stages that need it
+function runPipeline(graph = nightlyStages) {
+    const pipelineStart = new Date();
+    const results = {};
+    const running = {};
+
+    const settled = (name) => results[name] !== undefined;
+
+    return new Promise((resolve) => {
+        const schedule = () => {
+            let progressed = true;
+            while (progressed) {
+                progressed = false;
+                for (const stage of graph) {
+                    if (settled(stage.name) || running[stage.name]) continue;
+
+                    const needs = stage.needs || [];
+                    const after = stage.after || [];
+                    const blocked = needs.filter((dep) => settled(dep) && results[dep].status !== 'succeeded');
+                    if (blocked.length > 0) {
+                        results[stage.name] = { script: stage.script, status: 'skipped', exitCode: null, blockedBy: blocked };
+                        console.error(`Skipping ${stage.script}: ${blocked.join(', ')} did not succeed`);
+                        // A skip can settle stages further down, so go round again
+                        progressed = true;
+                        continue;
+                    }
+                    if (!needs.every(settled) || !after.every(settled)) continue;
+
+                    running[stage.name] = runPythonScript(stage.script).then((result) => {
+                        results[stage.name] = result;
+                        delete running[stage.name];
+                        schedule();
                     });
-                });
-            });
-        });
+                }
+            }
+
+            if (Object.keys(running).length === 0) {
+                resolve(finish());
+            }
+        };
+
+        const finish = () => {
+            const pipelineEnd = new Date();
+            const report = {
+                startedAt: pipelineStart.toISOString(),
+                finishedAt: pipelineEnd.toISOString(),
+                durationMs: pipelineEnd - pipelineStart,
+                succeeded: graph.every((stage) => results[stage.name] && results[stage.name].status === 'succeeded'),
+                stages: results,
+            };
+            writeRunReport(report);
+            writeRunMetrics(report, graph);
+            for (const stage of graph) {
+                const result = results[stage.name] || { status: 'not run' };
+                const duration = result.durationMs === undefined ? '-' : `${(result.durationMs / 1000).toFixed(1)}s`;
+                console.log(`  ${stage.name.padEnd(16)} ${result.status.padEnd(10)} ${duration}`);
+            }
+            console.log(report.succeeded
+                ? `All scripts executed successfully in ${(report.durationMs / 1000).toFixed(1)}s`
+                : `Pipeline finished with failures in ${(report.durationMs / 1000).toFixed(1)}s`);
+            return report;
+        };
+
+        schedule();
+    });
+}
+
+// Function to keep each run's per-stage timings and exit status on disk
+function writeRunReport(report) {
+    try {
+        fs.mkdirSync(runsDir, { recursive: true });
+        const stamp = report.startedAt.replace(/[-:]/g, '').replace(/\..*$/, '');
+        fs.writeFileSync(path.join(runsDir, `pipeline_${stamp}.json`), JSON.stringify(report, null, 2));
+    } catch (error) {
+        console.error(`Unable to write pipeline run report: ${error.message}`);
+    }
+}
+
+// Function to export each stage's duration and outcome in Prometheus text format
+// next to the metrics the Python stages write themselves
+function writeRunMetrics(report, graph) {
+    if (process.env.METRICS === 'off') return;
+    const lines = [
+        '# HELP spectra_scheduler_stage_seconds Wall time of each scheduled stage in the last run',
+        '# TYPE spectra_scheduler_stage_seconds gauge',
+    ];
+    for (const stage of graph) {
+        const result = report.stages[stage.name] || {};
+        if (result.durationMs !== undefined) {
+            lines.push(`spectra_scheduler_stage_seconds{job="scheduler",stage="${stage.name}"} ${result.durationMs / 1000}`);
+        }
+    }
+    lines.push('# HELP spectra_scheduler_stage_success 1 if the stage succeeded in the last run, 0 if not');
+    lines.push('# TYPE spectra_scheduler_stage_success gauge');
+    for (const stage of graph) {
+        const success = (report.stages[stage.name] || {}).status === 'succeeded' ? 1 : 0;
+        lines.push(`spectra_scheduler_stage_success{job="scheduler",stage="${stage.name}"} ${success}`);
+    }
+    lines.push('# HELP spectra_scheduler_run_seconds Wall time of the last scheduled run');
+    lines.push('# TYPE spectra_scheduler_run_seconds gauge');
+    lines.push(`spectra_scheduler_run_seconds{job="scheduler"} ${report.durationMs / 1000}`);
+    lines.push('# HELP spectra_scheduler_last_run_timestamp_seconds When the last scheduled run finished');
+    lines.push('# TYPE spectra_scheduler_last_run_timestamp_seconds gauge');
+    lines.push(`spectra_scheduler_last_run_timestamp_seconds{job="scheduler"} ${Date.parse(report.finishedAt) / 1000}`);
+    try {
+        fs.mkdirSync(metricsDir, { recursive: true });
+        const promPath = path.join(metricsDir, 'scheduler.prom');
+        fs.writeFileSync(`${promPath}.tmp`, lines.join('\n') + '\n');
+        fs.renameSync(`${promPath}.tmp`, promPath);
+    } catch (error) {
+        console.error(`Unable to write pipeline metrics: ${error.message}`);
+    }
+}
+
+// Between nightly runs, scripts/refresh.py re-checks only the highest-priority
+// SKUs (offending, volatile or stale) within a per-host request budget.
+// REFRESH_CRON=off turns it off. A refresh never overlaps the nightly run or
+// another refresh, it is simply skipped until the next slot.
+const refreshCron = process.env.REFRESH_CRON || '0 6-22/2 * * *';
+let nightlyRunning = false;
+let refreshRunning = false;
+
+// Function to run the nightly pipeline, flagging it so refreshes wait for it
+function runNightly() {
+    nightlyRunning = true;
+    return runPipeline().finally(() => {
+        nightlyRunning = false;
+    });
+}
+
+// Function to run one intra-day refresh unless the nightly run or another refresh is going
+function runRefresh() {
+    if (nightlyRunning || refreshRunning) {
+        console.log(`Skipping refresh at ${new Date().toISOString()}: ${nightlyRunning ? 'nightly run' : 'previous refresh'} still going`);
+        return Promise.resolve(null);
+    }
+    refreshRunning = true;
+    return runPythonScript('refresh.py').finally(() => {
+        refreshRunning = false;
     });
 }
 
 // Schedule all scripts to run at midnight
 cron.schedule('0 0 * * *', () => {
-    runAllScriptsSequentially();
+    runNightly();
 });
 
-console.log('Scrapers and comparison scripts scheduled to run at midnight.');
\ No newline at end of file
+console.log('Scrapers and comparison scripts scheduled to run at midnight.');
+
+if (refreshCron !== 'off') {
+    cron.schedule(refreshCron, () => {
+        runRefresh();
+    });
+    console.log(`Priority refresh scheduled at '${refreshCron}'.`);
+}
+
+// `node scheduler.js --now` also runs the pipeline once straight away
+if (process.argv.includes('--now')) {
+    runNightly();
+}
+
+module.exports = { stages, runPipeline, runRefresh };
@@ -10,6 +10,12 @@ import pandas as pd
 import datetime
 import os
 from dotenv import load_dotenv
+from product_search import build_index, load_index, save_index
+from price_db import load_listings
+from price_matrix import build as build_matrix
+import schema
+import metrics
+import profiling
 
 # Load environment variables
 load_dotenv()
@@ -25,14 +31,14 @@ data_dir = os.path.join(script_dir, 'data')
 # Import all CSV files saved daily
 # Note that the index.csv is a local file. Make sure to put the correct path to read it
 index_path = os.path.join(script_dir, 'index.csv')
-dell_path = os.path.join(data_dir, f'official_dell_monitor_{date}.csv')
-bestbuy_path = os.path.join(data_dir, f'bestbuy_dell_monitor_{date}.csv')
-newegg_path = os.path.join(data_dir, f'newegg_dell_monitor_{date}.csv')
 
 # Function to read CSV files and handle errors
-def read_csv_file(file_path):
+# With a dataset name the columns are read straight into that dataset's dtypes
+def read_csv_file(file_path, dataset=None, **kwargs):
     try:
-        return pd.read_csv(file_path)
+        if dataset is not None:
+            return schema.read_csv(file_path, dataset, **kwargs)
+        return pd.read_csv(file_path, **kwargs)
     except FileNotFoundError:
         print(f"File not found: {file_path}")
         return pd.DataFrame()  # Return an empty DataFrame if file is not found
@@ -40,47 +46,91 @@ def read_csv_file(file_path):
         print(f"Error reading {file_path}: {e}")
         return pd.DataFrame()  # Return an empty DataFrame if any other error occurs
 
-index = read_csv_file(index_path)
-dell = read_csv_file(dell_path)
-bestbuy = read_csv_file(bestbuy_path)
-newegg = read_csv_file(newegg_path)
-
-# Ensure all required data frames are not empty
-if index.empty or dell.empty or bestbuy.empty or newegg.empty:
-    print("One or more CSV files are missing or empty. Exiting script.")
-    exit(1)
-
-# Merge the CSV files into a big table
-df = pd.merge(index, bestbuy, how="left", on=['Bestbuy_sku'])
-df = pd.merge(df, newegg, how="left", on=['Newegg_sku'])
-df = pd.merge(df, dell, how="inner", on=['Dell_product'])
-df = df[['Dell_product', 'Dell_price', 'Bestbuy_price', 'Newegg_price']].sort_values('Dell_price', ascending=True)
-
-# Fill the 'null' value with an actual string
-df = df.fillna('Not sold in this retailer')
-
-# Call the table that contains everything
-# And print out summaries
-print(df)
-a = df['Bestbuy_price'].count()
-b = df['Newegg_price'].count()
-print(f'There are {df.shape[0]} products found on Dell.')
-print(f'Bestbuy has {a} products.')
-print(f'Newegg has {b} products.')
-
-# Save the merged data to a CSV file
-output_path = os.path.join(data_dir, f'combined_product_data_{date}.csv')
-df.to_csv(output_path, index=False)
-print(f"Combined product data saved to {output_path}")
+# Function to combine all products from all retailers and Dell into one table
+# Frames already in memory (e.g. from pipeline.py) are used as-is, anything
+# not passed in is read from today's CSVs
+def combine_products(index=None, dell=None, bestbuy=None, newegg=None, date=date):
+    if index is None:
+        index = read_csv_file(index_path, 'index')
+    if dell is None:
+        dell = read_csv_file(os.path.join(data_dir, f'official_dell_monitor_{date}.csv'), 'dell')
+    if bestbuy is None:
+        bestbuy = read_csv_file(os.path.join(data_dir, f'bestbuy_dell_monitor_{date}.csv'), 'bestbuy')
+    if newegg is None:
+        newegg = read_csv_file(os.path.join(data_dir, f'newegg_dell_monitor_{date}.csv'), 'newegg')
+
+    # Ensure all required data frames are not empty
+    if index.empty or dell.empty or bestbuy.empty or newegg.empty:
+        raise ValueError("One or more CSV files are missing or empty")
+
+    # SKUs are matched as text, whatever type they were read or scraped as
+    index = schema.apply(index, 'index')
+    dell = schema.apply(dell, 'dell')
+    bestbuy = schema.apply(bestbuy, 'bestbuy')
+    newegg = schema.apply(newegg, 'newegg')
+
+    # Lay every price out in one matrix, products x Dell and each retailer, NaN where not sold
+    matrix = build_matrix(index, dell, {'bestbuy': bestbuy, 'newegg': newegg})
+    metrics.record_merge('combine', len(index), len(dell), len(matrix.names))
+    df = matrix.frame()
+    coverage = matrix.coverage()
+
+    # Call the table that contains everything, with the 'not sold' text only in what is shown
+    # And print out summaries
+    table = matrix.render(df)
+    print(table)
+    print(f'There are {df.shape[0]} products found on Dell.')
+    print(f'Bestbuy has {coverage.at["bestbuy", "Products"]} products.')
+    print(f'Newegg has {coverage.at["newegg", "Products"]} products.')
+
+    # Save the combined table to a CSV file
+    output_path = os.path.join(data_dir, f'combined_product_data_{date}.csv')
+    table.to_csv(output_path, index=False)
+    print(f"Combined product data saved to {output_path}")
+
+    df['Dell_product'] = df['Dell_product'].astype(str)
+
+    # Load the day's products, listings and prices into the SQLite serving store
+    load_listings({'dell': dell, 'bestbuy': bestbuy, 'newegg': newegg}, date)
+
+    # Prebuild the search index so lookups never rescan the table
+    index = build_index(df)
+    save_index(index, date)
+    _search_indexes[date] = (df, index)
+    return df
+
+
+# Search indexes by date: the one combine_products built, or the day's saved one, kept in memory
+_search_indexes = {}
+
+
+# Function to get the search index for a day's table, only building one for a table it has not seen
+# Without a table the index saved for that day is loaded
+def search_index(df=None, date=date):
+    cached = _search_indexes.get(date)
+    if cached is not None and (df is None or cached[0] is df):
+        return cached[1]
+    index = load_index(date) if df is None else build_index(df)
+    _search_indexes[date] = (df, index)
+    return index
+
 
 # Define a function to search the product name
-df['Dell_product'] = df['Dell_product'].astype(str)
-def search_product(product_name):
-    search_df = pd.DataFrame()
-    for i in df['Dell_product']:
-        if product_name in i:
-            search_df = pd.concat([search_df, df[df['Dell_product'] == i]])
+# Goes through the token index in product_search.py, best matches first
+def search_product(df, product_name, limit=None, date=date):
+    search_df = search_index(df, date).search(product_name, limit=limit)
     print(search_df)
+    return search_df
+
+
+# Run this function
+if __name__ == '__main__':
+    # Pass --profile to run it under cProfile and tracemalloc
+    try:
+        df = profiling.run_script('combine', combine_products)
+    except ValueError as e:
+        print(f'{e}. Exiting script.')
+        exit(1)
 
-# Demonstration of the searching function, delete the # below if you want to test it
-# search_product('223')
\ No newline at end of file
+    # Demonstration of the searching function, delete the # below if you want to test it
+    # search_product(df, '223')
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Alerting on each day's comparison
+# Every published comparison is checked against the rules in alert_rules.csv
+# (or ALERT_RULES), for every retailer at once. Each rule is one of:
+#   deviation        the price is at least Threshold percent below Dell's
+#   new_offender     the product is Non-Compliant now and was not in the previous snapshot
+#   offender_days    the product has been Non-Compliant for at least Threshold days running
+#   price_drop       the price fell at least Threshold percent since the previous snapshot
+# Retailer limits a rule to one retailer. Each kind's rules are evaluated
+# together as one boolean matrix (rows x rules), so adding rules or SKUs adds
+# columns and rows rather than passes over the data, and of the rules of one
+# kind that fire on a SKU only the strongest (highest threshold) is kept.
+#
+# Once a kind of rule fired for a SKU it stays quiet for that SKU for the rule's
+# Cooldown_hours, unless a stronger rule of that kind fires. Whatever is left for
+# one SKU becomes one notification, and each run's notifications are written as
+# one batch to a SQLite outbox (data/alerts.sqlite, or ALERTS_DB). A sender drains
+# it: notifications are only marked sent once the sender has taken the whole
+# batch, so a failed send is retried on the next drain.
+# ALERTS=off turns alerting off.
+#
+# Usage: python3 alerts.py run [--date YYYYMMDD]          check a published day's comparison again
+#        python3 alerts.py pending                       list the notifications waiting to be sent
+#        python3 alerts.py drain [--jsonl PATH]          send them as JSON lines to PATH (or stdout)
+
+# Import necessary libraries
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from retailers import RETAILERS
+from schema import read_csv
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+rules_path = os.getenv('ALERT_RULES', os.path.join(script_dir, 'alert_rules.csv'))
+db_path = os.getenv('ALERTS_DB', os.path.join(data_dir, 'alerts.sqlite'))
+
+ENABLED = os.getenv('ALERTS', 'on') != 'off'
+# Notifications handed to the sender at a time
+BATCH_SIZE = int(os.getenv('ALERT_BATCH', '100'))
+VIOLATION = 'Non-Compliant'
+KINDS = ['deviation', 'new_offender', 'offender_days', 'price_drop']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    created REAL NOT NULL,
+    date TEXT NOT NULL,
+    retailer TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    sent REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_unsent ON outbox (sent, id);
+CREATE TABLE IF NOT EXISTS alert_log (
+    retailer TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    last_alert REAL NOT NULL,
+    PRIMARY KEY (retailer, sku, kind)
+);
+"""
+
+
+# Function to open the outbox, creating the tables on first use
+def connect(path=None):
+    path = path or db_path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Function to read the alert rules, raising ValueError naming the line of a rule that cannot be used
+def load_rules(path=None):
+    path = path or rules_path
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['Name', 'Kind', 'Threshold', 'Retailer', 'Cooldown_hours'])
+    rules = read_csv(path, 'alert_rules').reindex(columns=['Name', 'Kind', 'Threshold', 'Retailer', 'Cooldown_hours'])
+    retailer = rules['Retailer'].fillna('').str.strip()
+    rules['Retailer'] = retailer.where(retailer != '')
+    rules['Cooldown_hours'] = rules['Cooldown_hours'].fillna(24.0)
+    # A new offender is a yes / no, it fires at 1
+    rules['Threshold'] = rules['Threshold'].where(rules['Kind'] != 'new_offender', 1.0)
+    lines = pd.Series(np.arange(2, len(rules) + 2), index=rules.index)
+    problems = [
+        (rules['Name'].isna() | rules['Name'].duplicated(), 'every rule needs a name of its own'),
+        (~rules['Kind'].isin(KINDS), f'Kind must be one of {", ".join(KINDS)}'),
+        (rules['Threshold'].isna() | (rules['Threshold'] < 0), 'Threshold must be a number, 0 or more'),
+        (~rules['Retailer'].isin(list(RETAILERS)) & rules['Retailer'].notna(), 'unknown retailer'),
+        (rules['Cooldown_hours'] < 0, 'Cooldown_hours must not be negative'),
+    ]
+    for bad, reason in problems:
+        if bad.any():
+            raise ValueError(f'{path} line {lines[bad].iloc[0]}: {reason}')
+    return rules.reset_index(drop=True)
+
+
+# Function to find how many days each product at each retailer has been Non-Compliant up to `date`
+# Only the last `days` days of history are read, longer streaks count as `days`
+def offender_days(date, days, retailers, history=None):
+    from price_analytics import load_history, prepare, violation_episodes
+    if history is None:
+        start = (pd.Timestamp(str(date)) - pd.Timedelta(days=days - 1)).strftime('%Y%m%d')
+        history = load_history(start, date, retailers)
+    elif 'product_id' not in history:
+        history = prepare(history)
+    if history.empty:
+        return pd.DataFrame(columns=['Retailer', 'Dell_product', 'offender_days'])
+    episodes = violation_episodes(history)
+    current = episodes[episodes['end'] == pd.Timestamp(str(date))]
+    return pd.DataFrame({'Retailer': current['Retailer'].astype(str).to_numpy(),
+                         'Dell_product': current['Dell_product'].astype(str).to_numpy(),
+                         'offender_days': current['days'].to_numpy('float64')})
+
+
+# Function to measure what each kind of rule looks at, one column per kind, one row per comparison row
+def measures(df, previous=None, streaks=None):
+    key = ['Retailer', 'Dell_product']
+    rows = df[key].astype(str)
+    if previous is not None and not previous.empty:
+        prev = previous.drop_duplicates(key)
+        prev = pd.DataFrame({'Retailer': prev['Retailer'].astype(str).to_numpy(),
+                             'Dell_product': prev['Dell_product'].astype(str).to_numpy(),
+                             'prev_price': prev['Retailer_price'].to_numpy('float64'),
+                             'prev_status': prev['Status'].astype(str).to_numpy()})
+        rows = rows.merge(prev, how='left', on=key)
+    else:
+        rows = rows.assign(prev_price=np.nan, prev_status=None)
+    if streaks is not None and not streaks.empty:
+        rows = rows.merge(streaks, how='left', on=key)
+    else:
+        rows['offender_days'] = np.nan
+
+    violating = (df['Status'] == VIOLATION).to_numpy()
+    price = df['Retailer_price'].to_numpy('float64')
+    prev_price = rows['prev_price'].to_numpy('float64')
+    return pd.DataFrame({
+        'deviation': -df['Deviation'].to_numpy('float64'),
+        'new_offender': np.where(violating & (rows['prev_status'] != VIOLATION).to_numpy(), 1.0, np.nan),
+        'offender_days': np.where(violating, rows['offender_days'].to_numpy('float64'), np.nan),
+        'price_drop': (prev_price - price) / prev_price * 100,
+    }, index=df.index)
+
+
+# Function to evaluate every rule on every row at once, one boolean matrix (rows x rules) per kind
+# Of the rules of one kind that fire on a row only the strongest (highest threshold) is kept,
+# so what comes out grows with the rows and kinds, not with the number of rules
+# Returns one row per (comparison row, rule) that fired, with the value that fired it
+def evaluate(df, rules, previous=None, streaks=None):
+    found = [pd.DataFrame({'row': np.array([], dtype=int), 'rule': np.array([], dtype=int), 'value': []})]
+    if rules.empty or df.empty:
+        return found[0]
+    measured = measures(df, previous, streaks)
+    retailers = df['Retailer'].astype(str).to_numpy()
+    for kind, group in rules.groupby('Kind', sort=False):
+        group = group.sort_values('Threshold', kind='stable')
+        values = measured[kind].to_numpy()
+        # Weakest threshold first, so the strongest rule that fired is the last True column
+        fired = values[:, None] >= group['Threshold'].to_numpy('float64')[None, :]
+        scoped = group['Retailer'].notna().to_numpy()
+        if scoped.any():
+            fired[:, scoped] &= retailers[:, None] == group.loc[scoped, 'Retailer'].to_numpy(str)[None, :]
+        row = np.flatnonzero(fired.any(axis=1))
+        strongest = fired.shape[1] - 1 - np.argmax(fired[row, ::-1], axis=1)
+        found.append(pd.DataFrame({'row': row, 'rule': group.index.to_numpy()[strongest], 'value': values[row]}))
+    return pd.concat(found, ignore_index=True).sort_values(['row', 'rule'], kind='stable').reset_index(drop=True)
+
+
+# Function to key each comparison row by its SKU, or by its Dell product where it has none
+# (history imported from CSVs that predate SKUs), so every alert has a key to throttle and queue on
+# Returns the keys and which rows had no SKU
+def alert_keys(df):
+    sku = df['sku'].astype(object).fillna('') if 'sku' in df else pd.Series('', index=df.index, dtype=object)
+    missing = (sku.astype(str) == '').to_numpy()
+    return sku.where(~missing, df['Dell_product'].astype(object)).astype(str), missing
+
+
+# Function to drop what fired within its cooldown for that SKU
+# The cooldown is kept per SKU and kind of rule, a stronger rule of the same kind
+# (a higher threshold than the last one sent) is sent straight away
+# Returns what is left to send and the (retailer, sku, kind) log entries to record
+def throttle(fired, df, rules, conn, now):
+    rows, picked = fired['row'].to_numpy(), fired['rule'].to_numpy()
+    hits = pd.DataFrame({
+        'retailer': np.asarray(df['Retailer'].astype(str), dtype=object)[rows],
+        'sku': np.asarray(df['sku'].astype(str), dtype=object)[rows],
+        'kind': np.asarray(rules['Kind'].astype(str), dtype=object)[picked],
+    }, dtype=object)
+    log = pd.read_sql_query('SELECT retailer, sku, kind, threshold, last_alert FROM alert_log', conn,
+                            dtype={'retailer': object, 'sku': object, 'kind': object})
+    seen = hits.merge(log, how='left', on=['retailer', 'sku', 'kind'])
+    last, sent_threshold = seen['last_alert'].to_numpy('float64'), seen['threshold'].to_numpy('float64')
+    threshold = rules['Threshold'].to_numpy('float64')[picked]
+    cooldown = rules['Cooldown_hours'].to_numpy('float64')[picked] * 3600
+    due = np.isnan(last) | (now - last >= cooldown) | (threshold > sent_threshold)
+    hits['rule'] = np.asarray(rules['Name'].astype(str), dtype=object)[picked]
+    hits['threshold'] = threshold
+    return fired[due].reset_index(drop=True), hits[due]
+
+
+# Function to turn what fired into one notification per SKU
+# A SKU listed for more than one Dell product is reported on its first row, each rule once
+def notifications(fired, df, rules, date):
+    rows, picked = fired['row'].to_numpy(), fired['rule'].to_numpy()
+    hits = pd.DataFrame({
+        'row': rows,
+        'retailer': df['Retailer'].astype(str).to_numpy()[rows],
+        'sku': df['sku'].astype(str).to_numpy()[rows],
+        'rule': rules['Name'].astype(str).to_numpy()[picked],
+        'kind': rules['Kind'].astype(str).to_numpy()[picked],
+        'threshold': rules['Threshold'].to_numpy('float64')[picked],
+        'value': fired['value'].to_numpy('float64').round(2),
+    }).drop_duplicates(['retailer', 'sku', 'rule'])
+    reasons = {}
+    for retailer, sku, rule, kind, threshold, value in zip(
+            *(hits[column].tolist() for column in ['retailer', 'sku', 'rule', 'kind', 'threshold', 'value'])):
+        reasons.setdefault((retailer, sku), []).append(
+            {'rule': rule, 'kind': kind, 'threshold': threshold, 'value': value})
+
+    first = hits.drop_duplicates(['retailer', 'sku'])
+    rows = df.iloc[first['row'].to_numpy()]
+    payloads = []
+    for retailer, sku, product, price, dell_price, deviation, status in zip(
+            first['retailer'].tolist(), first['sku'].tolist(), rows['Dell_product'].astype(str).tolist(),
+            rows['Retailer_price'].tolist(), rows['Dell_price'].tolist(), rows['Deviation'].tolist(),
+            rows['Status'].astype(str).tolist()):
+        found = reasons[(retailer, sku)]
+        payloads.append({
+            'date': str(date),
+            'retailer': retailer,
+            'sku': sku,
+            'dell_product': product,
+            'retailer_price': price,
+            'dell_price': dell_price,
+            'deviation': round(deviation, 2),
+            'status': status,
+            'rules': found,
+            'message': f'{RETAILERS[retailer]}: {product} at ${price:,.2f} is {deviation:+.1f}% against '
+                       f'Dell\'s ${dell_price:,.2f} (' + ', '.join(hit['rule'] for hit in found) + ')',
+        })
+    return payloads
+
+
+# Function to check a comparison against the alert rules and queue what fired in the outbox
+#   previous: the previous snapshot, for new offenders and price drops
+#   history: comparisons up to `date`, for offender streaks (read from the history store when not passed)
+# Returns the notifications queued in this run
+def raise_alerts(df, date, previous=None, history=None, rules=None, path=None):
+    if not ENABLED:
+        return []
+    started = time.perf_counter()
+    rules = load_rules() if rules is None else rules
+    df = df.reset_index(drop=True)
+    keys, missing = alert_keys(df)
+    if missing.any():
+        print(f'Alerts: {int(missing.sum())} rows have no SKU, keyed by their Dell product instead')
+    df = df.assign(sku=keys)
+    streak_rules = rules[rules['Kind'] == 'offender_days']
+    streaks = None
+    if not streak_rules.empty and (df['Status'] == VIOLATION).any():
+        streaks = offender_days(date, int(streak_rules['Threshold'].max()), list(df['Retailer'].astype(str).unique()),
+                                history)
+    fired = evaluate(df, rules, previous, streaks)
+
+    now = time.time()
+    with closing(connect(path)) as conn, conn:
+        due, log = throttle(fired, df, rules, conn, now)
+        payloads = notifications(due, df, rules, date)
+        batch = f'{date}-{int(now * 1000)}'
+        conn.executemany(
+            'INSERT INTO outbox (batch, created, date, retailer, sku, rules, payload) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((batch, now, str(date), p['retailer'], p['sku'], ','.join(r['rule'] for r in p['rules']),
+              json.dumps(p)) for p in payloads))
+        conn.executemany(
+            'INSERT INTO alert_log (retailer, sku, kind, rule, threshold, last_alert) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (retailer, sku, kind) DO UPDATE SET rule = excluded.rule, threshold = excluded.threshold, '
+            'last_alert = excluded.last_alert',
+            zip(*(log[column].tolist() for column in ['retailer', 'sku', 'kind', 'rule', 'threshold']),
+                [now] * len(log)))
+
+    hit_counts = np.bincount(fired['rule'].to_numpy(int), minlength=len(rules))
+    queued_counts = np.bincount(due['rule'].to_numpy(int), minlength=len(rules))
+    for name, hits, queued in zip(rules['Name'].astype(str), hit_counts, queued_counts):
+        if hits:
+            metrics.inc('spectra_alerts_total', int(queued), rule=name, outcome='queued')
+            metrics.inc('spectra_alerts_total', int(hits - queued), rule=name, outcome='suppressed')
+    print(f'Alerts: {len(fired)} rule hits, {len(fired) - len(due)} within their cooldown, '
+          f'{len(payloads)} notifications queued in {time.perf_counter() - started:.2f}s')
+    return payloads
+
+
+# Function to list the notifications waiting in the outbox, oldest first
+def pending(path=None):
+    with closing(connect(path)) as conn:
+        return pd.read_sql_query('SELECT id, batch, date, retailer, sku, rules FROM outbox WHERE sent IS NULL '
+                                 'ORDER BY id', conn)
+
+
+# Function to hand waiting notifications to `send` a batch at a time, oldest first
+# A batch is marked sent only once send() returns, if it raises the batch stays for the next drain
+# Returns how many notifications were sent
+def drain(send, batch_size=BATCH_SIZE, path=None):
+    sent = 0
+    with closing(connect(path)) as conn:
+        while True:
+            rows = conn.execute('SELECT id, payload FROM outbox WHERE sent IS NULL ORDER BY id LIMIT ?',
+                                (batch_size,)).fetchall()
+            if not rows:
+                return sent
+            send([json.loads(payload) for _, payload in rows])
+            with conn:
+                conn.executemany('UPDATE outbox SET sent = ? WHERE id = ?', ((time.time(), i) for i, _ in rows))
+            sent += len(rows)
+
+
+# Function to make a sender that appends each notification as one JSON line to a file, or stdout
+def jsonl_sender(path=None):
+    def send(batch):
+        lines = ''.join(json.dumps(payload) + '\n' for payload in batch)
+        if path is None:
+            sys.stdout.write(lines)
+            return
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+    return send
+
+
+def main():
+    current_time = datetime.datetime.now()
+    today = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+    parser = argparse.ArgumentParser(description='Raise price alerts and drain the alert outbox')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="check a published day's comparison against the alert rules")
+    run.add_argument('--date', default=today)
+    commands.add_parser('pending', help='list the notifications waiting to be sent')
+    send = commands.add_parser('drain', help='send the waiting notifications as JSON lines')
+    send.add_argument('--jsonl', help='file to append them to, stdout if not given')
+    send.add_argument('--batch', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        from comparison import load_previous
+        from price_analytics import load_history
+        df = load_history(args.date, args.date)
+        if df.empty:
+            print(f'No comparison published for {args.date}')
+            return
+        previous, _ = load_previous(args.date)
+        raise_alerts(df, args.date, previous)
+    elif args.command == 'pending':
+        df = pending()
+        print(df.to_string(index=False))
+        print(f'{len(df)} notifications waiting')
+    else:
+        sent = drain(jsonl_sender(args.jsonl), args.batch)
+        print(f'{sent} notifications sent', file=sys.stderr)
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
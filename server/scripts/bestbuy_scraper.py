@@ -7,11 +7,17 @@
 # Import necessary libraries
 import requests
 import csv
+import json
 import time
 import datetime
 import pandas as pd
 import os
 from dotenv import load_dotenv
+from price_store import append_listing
+from fetcher import make_session, make_cache, fetch_page, iter_ordered, RateLimiter
+from checkpoint import PageCheckpoint
+import metrics
+import profiling
 
 # Load environment variables
 load_dotenv()
@@ -40,62 +46,146 @@ def is_new_item(name):
     ]
     return not any(keyword in name_lower for keyword in unwanted_keywords)
 
+# Base URL and fetch settings can be overridden from .env, e.g. to test against recorded pages
+base_url = os.getenv('BESTBUY_BASE_URL', 'https://www.bestbuy.ca').rstrip('/')
+fetch_workers = int(os.getenv('BESTBUY_FETCH_WORKERS', '4'))
+rate_limit = float(os.getenv('BESTBUY_RATE_LIMIT', '2'))
+
 # Function to fetch product data from a specific page
-def fetch_products(page):
-    url = 'https://www.bestbuy.ca/api/v2/json/search'
+# Goes through the shared session and on-disk response cache
+# Returns None when the request fails
+def fetch_products(page, session=None, cache=None, limiter=None):
+    url = f'{base_url}/api/v2/json/search'
     params = {
         'query': 'dell monitor',
         'category': 'monitors',
         'condition': 'new',
         'page': page
     }
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Failed to fetch page {page}: {response.status_code}")
+    if session is None:
+        with make_session(pool_size=1) as session:
+            return fetch_products(page, session, cache, limiter)
+    try:
+        return json.loads(fetch_page(session, url, limiter, params=params, cache=cache))
+    except requests.HTTPError as e:
+        print(f"Failed to fetch page {page}: {e.response.status_code}")
         return None
 
-# Main function to scrape data and save to CSV
-def scrape_bestbuy_dell():
+# Function to build the URL of one product's API entry, for re-checking a single price
+def product_url(sku):
+    return f'{base_url}/api/v2/json/product/{sku}'
+
+# Function to read the sale price from one product's API entry
+def parse_product_price(content):
+    return json.loads(content).get('salePrice')
+
+# Function to read how many result pages there are from the first response
+# Uses totalPages when the API reports it, else total / pageSize, else None
+def get_page_count(data):
+    if data.get('totalPages'):
+        return int(data['totalPages'])
+    page_size = data.get('pageSize') or len(data.get('products') or [])
+    if data.get('total') is not None and page_size:
+        return -(-int(data['total']) // int(page_size))
+    return None
+
+# Function to keep the new monitors from one page of results
+def parse_products(data):
+    start = time.perf_counter()
     products = []
-    page = 1
-
-    while True:
-        print(f"Fetching page {page}")
-        data = fetch_products(page)
-        if data and 'products' in data and data['products']:
-            for item in data['products']:
-                name = item.get('name', 'N/A')
-                sku = item.get('sku', 'N/A')
-                price = item.get('salePrice', 'N/A')
-                link = 'https://www.bestbuy.ca/en-ca/product/' + item.get('sku', 'N/A')
-                if is_new_item(name):
-                    products.append({
-                        'Bestbuy_name': name,
-                        'Bestbuy_sku': sku,
-                        'Bestbuy_price': price,
-                        'Bestbuy_link': link
-                    })
-            page += 1
-            time.sleep(1)  # Short delay to avoid hitting rate limits
-        else:
-            break
-    
-    # Write data to CSV
+    for item in data['products']:
+        name = item.get('name', 'N/A')
+        sku = item.get('sku', 'N/A')
+        price = item.get('salePrice', 'N/A')
+        link = 'https://www.bestbuy.ca/en-ca/product/' + item.get('sku', 'N/A')
+        if is_new_item(name):
+            products.append({
+                'Bestbuy_name': name,
+                'Bestbuy_sku': sku,
+                'Bestbuy_price': price,
+                'Bestbuy_link': link
+            })
+    metrics.record_page('bestbuy', time.perf_counter() - start, len(products))
+    return products
+
+# Function to stop the scrape on a page that failed to download
+# The page is not written, so the checkpoint stays before it and a rerun fetches it again
+def page_failed(page):
+    raise RuntimeError(f'BestBuy page {page} could not be fetched, rerun to resume from it')
+
+# Main function to scrape data and save to CSV
+# Each page is written out as soon as it is parsed, and a rerun the same
+# day carries on after the last page that was written
+# The files are labelled with `date`, today unless a run passes one
+def scrape_bestbuy_dell(date=date):
+    started = time.perf_counter()
+    session = make_session(pool_size=fetch_workers)
+    cache = make_cache()
+    # Shared token bucket, it pauses every worker when the API answers 429 or 5xx
+    limiter = RateLimiter(rate_limit, burst=fetch_workers)
+
     csv_path = os.path.join(data_dir, f'bestbuy_dell_monitor_{date}.csv')
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Bestbuy_name', 'Bestbuy_sku', 'Bestbuy_price', 'Bestbuy_link']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(products)
+    fieldnames = ['Bestbuy_name', 'Bestbuy_sku', 'Bestbuy_price', 'Bestbuy_link']
+    checkpoint = PageCheckpoint(csv_path, fieldnames, date)
+    checkpoint.open()
+    pages = checkpoint.cursor.get('pages', 0)
+    try:
+        # The first page tells us how many pages there are
+        if checkpoint.last_page == 0:
+            print("Fetching page 1")
+            data = fetch_products(1, session, cache, limiter)
+            if data is None:
+                page_failed(1)
+            if 'products' in data and data['products']:
+                pages = 1
+                checkpoint.write_page(1, parse_products(data), page_count=get_page_count(data), pages=pages,
+                                      more=True)
+        page_loop = checkpoint.cursor.get('page_count')
+
+        if page_loop is not None:
+            # Fetch the remaining pages concurrently, results are written in page order
+            print('Loop through this many pages: ', page_loop)
+            results = iter_ordered(lambda page: fetch_products(page, session, cache, limiter),
+                                   range(checkpoint.last_page + 1, page_loop + 1), fetch_workers)
+            for page, data in results:
+                print(f"Fetching page {page}")
+                if data is None:
+                    results.close()
+                    page_failed(page)
+                records = []
+                if data and data.get('products'):
+                    records = parse_products(data)
+                    pages += 1
+                checkpoint.write_page(page, records, pages=pages)
+        elif checkpoint.cursor.get('more'):
+            # No paging metadata, walk the pages until an empty one
+            page = checkpoint.last_page + 1
+            while True:
+                print(f"Fetching page {page}")
+                data = fetch_products(page, session, cache, limiter)
+                if data is None:
+                    page_failed(page)
+                if not ('products' in data and data['products']):
+                    break
+                pages += 1
+                checkpoint.write_page(page, parse_products(data), pages=pages)
+                page += 1
+    finally:
+        session.close()
+        checkpoint.close()
+    print(f'HTTP cache: {cache.summary()}')
 
+    # Every page is in, publish the CSV and read it back as a dataframe
+    bestbuy_monitor = checkpoint.finish('bestbuy')
+    print(f'Scraped {len(bestbuy_monitor)} products from {pages} pages in {time.perf_counter() - started:.1f}s')
     print(f'Data scraped and saved to {csv_path}')
     #df = pd.read_csv(f'd:/brainstation/dropbox/bestbuy_dell_monitor{date}.csv')
     #display(df.head(10))
 
+    # Keep the day's listing in the price history store too
+    append_listing(bestbuy_monitor, 'bestbuy', date)
+    return bestbuy_monitor
+
 if __name__ == '__main__':
-    scrape_bestbuy_dell()
\ No newline at end of file
+    # Pass --profile to run it under cProfile and tracemalloc
+    profiling.run_script('scrape_bestbuy', scrape_bestbuy_dell)
\ No newline at end of file
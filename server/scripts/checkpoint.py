@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming, checkpointed output for the scrapers
+# Each finished page's records are appended to {csv}.partial straight away and
+# {csv}.checkpoint.json records the last finished page, the file size after it
+# and what the first page told us (page count, totals). A scraper that crashes
+# on page 40 is rerun the same day and carries on from page 41: the partial
+# file is cut back to the last finished page and nothing before it is fetched
+# again. Once the last page is written the partial file becomes the day's CSV.
+
+# Import necessary libraries
+import csv
+import json
+import os
+
+from specs import write_specs
+
+
+class PageCheckpoint:
+    def __init__(self, csv_path, columns, date):
+        self.path = csv_path
+        self.columns = list(columns)
+        self.date = date
+        self.partial_path = f'{csv_path}.partial'
+        self.state_path = f'{csv_path}.checkpoint.json'
+        self.state = None
+        self._file = None
+        self._writer = None
+
+    # Function to load today's checkpoint, or start a fresh partial file
+    # Returns the state: last_page (0 when starting over), rows, bytes and cursor
+    def open(self):
+        state = self._load()
+        if state is not None:
+            # Anything after the last finished page is a half-written page, drop it
+            with open(self.partial_path, 'r+b') as f:
+                f.truncate(state['bytes'])
+            self._file = open(self.partial_path, 'a', newline='', encoding='utf-8')
+            print(f'Resuming {os.path.basename(self.path)} after page {state["last_page"]} '
+                  f'({state["rows"]} rows already written)')
+        else:
+            self._file = open(self.partial_path, 'w', newline='', encoding='utf-8')
+            csv.writer(self._file, lineterminator='\n').writerow(self.columns)
+            self._file.flush()
+            state = {'date': self.date, 'columns': self.columns, 'last_page': 0, 'rows': 0,
+                     'bytes': self._file.tell(), 'cursor': {}}
+        # Same quoting and line endings pandas' to_csv wrote before
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore',
+                                      lineterminator='\n')
+        self.state = state
+        self._save()
+        return state
+
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get('date') != self.date or state.get('columns') != self.columns
+                or not os.path.exists(self.partial_path)
+                or os.path.getsize(self.partial_path) < state.get('bytes', 0)):
+            return None
+        return state
+
+    def _save(self):
+        tmp = f'{self.state_path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    @property
+    def last_page(self):
+        return self.state['last_page']
+
+    @property
+    def cursor(self):
+        return self.state['cursor']
+
+    # Function to append one finished page's records and move the checkpoint past it
+    # Any keyword arguments are saved in the cursor along with it
+    def write_page(self, page, records, **cursor):
+        self._writer.writerows(records)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.state['cursor'].update(cursor)
+        self.state['last_page'] = page
+        self.state['rows'] += len(records)
+        self.state['bytes'] = self._file.tell()
+        self._save()
+
+    # Function to publish the finished CSV and read it back, typed as `dataset`, for the stages after the scrape
+    def finish(self, dataset):
+        self._file.close()
+        df = write_specs(self.partial_path, dataset, self.path)
+        os.remove(self.partial_path)
+        os.remove(self.state_path)
+        return df
+
+    # Function to close the partial file, keeping the checkpoint to resume from
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
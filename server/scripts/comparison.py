@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# !!!Important note: run the scraper first to obtain the daily CSV before any data analysis!!!
+# Comparison engine for every retailer at once
+# index.csv is turned into one long (Dell_product, Retailer, sku) table, merged
+# with every retailer's listing and Dell's prices in a single pass, and
+# Price_dif / Deviation / Status are computed once for all rows. Statuses come
+# from the MAP policy in policy.py. Adding a retailer only needs a new entry in
+# retailers.py and its daily listing CSV.
+#
+# Usage: python3 comparison.py [--date YYYYMMDD] [--retailers bestbuy newegg ...] [--profile]
+
+# Import necessary libraries
+import argparse
+import datetime
+import glob
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+import metrics
+import profiling
+from alerts import raise_alerts
+from policy import load_policy
+from price_db import load_comparisons
+from price_store import append_comparisons, query
+from price_store import dates as store_dates
+from retailers import RETAILERS
+from schema import STATUS_DTYPE, TEXT, RETAILER_DTYPE, bytes_per_row, read_csv, to_price
+from schema import apply as apply_schema
+from serving import locked, write_artifacts, write_atomic
+
+# Load environment variables
+load_dotenv()
+
+# Prepare the variables
+current_time = datetime.datetime.now()
+date = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+index_path = os.path.join(script_dir, 'index.csv')
+
+# A product at a retailer is the same row from one day's snapshot to the next
+SNAPSHOT_KEY = ['Retailer', 'Dell_product']
+
+# Comparisons expected to need more than this much memory while merging are run in chunks
+MEMORY_BUDGET = int(float(os.getenv('COMPARE_MEMORY_MB', '256')) * 1024 * 1024)
+
+
+# Function to read index.csv with every SKU kept as text
+def load_index():
+    return read_csv(index_path, 'index')
+
+
+# Function to read Dell's listing for a date
+def load_dell(date=date):
+    return read_csv(os.path.join(data_dir, f'official_dell_monitor_{date}.csv'), 'dell')
+
+
+# Function to read every retailer listing that exists for a date
+def load_listings(date=date, retailers=None):
+    listings = {}
+    for retailer in retailers or RETAILERS:
+        path = os.path.join(data_dir, f'{retailer}_dell_monitor_{date}.csv')
+        if os.path.exists(path):
+            listings[retailer] = read_csv(path, retailer)
+    return listings
+
+
+# Function to stack every retailer's listing into (Retailer, sku, Retailer_price)
+def long_listings(listings):
+    frames = []
+    for retailer, listing in listings.items():
+        label = RETAILERS[retailer]
+        frames.append(pd.DataFrame({
+            'Retailer': pd.Categorical([retailer] * len(listing), dtype=RETAILER_DTYPE),
+            'sku': apply_schema(listing[[f'{label}_sku']], retailer)[f'{label}_sku'].to_numpy(),
+            'Retailer_price': to_price(listing[f'{label}_price']).to_numpy(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# Function to turn index.csv into (Dell_product, Retailer, sku), one row per listed SKU
+def long_index(index, retailers):
+    sku_columns = {f'{RETAILERS[r]}_sku': r for r in retailers if f'{RETAILERS[r]}_sku' in index.columns}
+    long = index.melt(id_vars='Dell_product', value_vars=list(sku_columns), var_name='Retailer', value_name='sku')
+    long = long.dropna(subset=['sku'])
+    long['Retailer'] = long['Retailer'].map(sku_columns).astype(RETAILER_DTYPE)
+    long['sku'] = long['sku'].astype(TEXT)
+    return long.reset_index(drop=True)
+
+
+# Function to measure how the retailer's price differs from Dell's, and by how much
+def deviate(df):
+    df['Price_dif'] = df['Retailer_price'] - df['Dell_price']
+    df['Deviation'] = (df['Price_dif'] / df['Dell_price']) * 100
+    return df
+
+
+# Function to score rows: their deviation from Dell's price and their status under the MAP policy on `date`
+def score(df, policy=None, date=date):
+    df = deviate(df)
+    df['Status'] = (policy or load_policy()).classify(df, date)
+    return df
+
+
+# Function to hash the prices that decide a row's score
+def price_hash(df):
+    return pd.util.hash_pandas_object(df[['Retailer_price', 'Dell_price']].astype(float), index=False).to_numpy()
+
+
+# Function to score only the rows whose prices moved since the previous snapshot
+# Unchanged rows carry yesterday's Price_dif / Deviation forward, every status is
+# re-classified since a policy rule can start or end without any price moving
+# Returns the scored rows and how many of them changed
+def score_changed(df, previous, policy=None, date=date):
+    prev = previous.drop_duplicates(SNAPSHOT_KEY)
+    prev = pd.DataFrame({
+        **{key: prev[key].to_numpy() for key in SNAPSHOT_KEY},
+        '_prev_hash': pd.array(price_hash(prev), dtype='UInt64'),
+        'Price_dif': prev['Price_dif'].to_numpy(),
+        'Deviation': prev['Deviation'].to_numpy(),
+        'Status': pd.Categorical(prev['Status'], dtype=STATUS_DTYPE),
+    })
+    df = df.merge(prev, how='left', on=SNAPSHOT_KEY)
+    seen = df['_prev_hash'].notna().to_numpy()
+    changed = ~seen | (price_hash(df) != df['_prev_hash'].fillna(0).to_numpy('uint64'))
+    if changed.any():
+        rescored = deviate(df.loc[changed, ['Retailer_price', 'Dell_price']].copy())
+        df.loc[changed, ['Price_dif', 'Deviation']] = rescored[['Price_dif', 'Deviation']]
+    df['Status'] = (policy or load_policy()).classify(df, date)
+    return df.drop(columns='_prev_hash'), int(changed.sum())
+
+
+# Function to work out how many chunks of index rows keep a comparison under the memory budget
+# Each merged row costs about its index row plus the price and score columns, and
+# merging and scoring hold a few copies of it at once
+def chunk_count(skus, budget=MEMORY_BUDGET):
+    needed = len(skus) * (bytes_per_row(skus) + 5 * 8) * 3
+    return max(1, int(np.ceil(needed / max(budget, 1))))
+
+
+# Function to merge, score and rank every retailer in one pass
+# Statuses follow the MAP policy in force on `date` (map_policy.csv unless one is passed)
+# With a previous snapshot only the rows whose prices moved are re-scored
+# Index rows are independent of each other, so a comparison bigger than the
+# memory budget is merged and scored a chunk at a time with the same result
+# Returns the long comparison frame sorted by retailer then deviation
+def compare_all(index, dell, listings, previous=None, budget=MEMORY_BUDGET, policy=None, date=date):
+    listings = {r: df for r, df in listings.items() if df is not None and r in RETAILERS}
+    if not listings:
+        return apply_schema(pd.DataFrame(columns=['Dell_product', 'Retailer', 'sku', 'Retailer_price',
+                                                  'Dell_price', 'Price_dif', 'Deviation', 'Status']),
+                            'comparison')
+
+    policy = policy or load_policy()
+    skus, prices = long_index(index, listings), long_listings(listings)
+    dell_prices = apply_schema(dell[['Dell_product', 'Dell_price']], 'dell')
+    delta = previous is not None and not previous.empty
+    chunks = chunk_count(skus, budget)
+    if chunks > 1:
+        print(f'Comparing {len(skus)} index rows in {chunks} chunks to stay under '
+              f'{budget / 1024 / 1024:g} MB')
+
+    parts = []
+    counts = dict.fromkeys(['listed', 'matched', 'priced', 'scored', 'changed'], 0)
+    size = -(-len(skus) // chunks)
+    for start in range(0, max(len(skus), 1), size or 1):
+        # Merge the CSVs into one long table
+        df = skus.iloc[start:start + size].merge(prices, how='inner', on=['Retailer', 'sku'])
+        merged = df.merge(dell_prices, how='inner', on=['Dell_product'])
+        counts['listed'] += len(df)
+        df = merged.dropna(subset=['Retailer_price', 'Dell_price'])
+        counts['matched'] += len(merged)
+        counts['priced'] += len(df)
+        if delta:
+            df, changed = score_changed(df, previous, policy, date)
+            counts['changed'] += changed
+        else:
+            df = score(df, policy, date)
+        counts['scored'] += len(df)
+        parts.append(df)
+    df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+    metrics.record_merge('index_listings', len(skus), len(prices), counts['listed'])
+    metrics.record_merge('dell_prices', counts['listed'], len(dell), counts['matched'])
+    metrics.record_merge('priced', counts['matched'], 0, counts['priced'])
+    if delta:
+        metrics.event('delta', rows=counts['scored'], changed=counts['changed'])
+        print(f'Delta mode: {counts["changed"]} of {counts["scored"]} rows changed since the previous snapshot')
+
+    # Sort once, every per-retailer output below keeps this order
+    df = df.sort_values(['Retailer', 'Deviation'], kind='stable').reset_index(drop=True)
+    return apply_schema(df, 'comparison')
+
+
+# Function to find the most recent comparison snapshot before `date`, retailer by retailer
+# (one may have been compared alone on the last run, so each keeps its own latest date)
+# Reads each from the price history store, or its dated comparison CSVs if the store has none
+# Returns (None, None) when no retailer has any history
+def load_previous(date=date, retailers=None):
+    frames = []
+    previous_date = None
+    for retailer in list(retailers or RETAILERS):
+        earlier = [d for d in store_dates('comparisons', retailer) if d < date]
+        if earlier:
+            df = query('comparisons', start=earlier[-1], end=earlier[-1], retailers=[retailer])
+            df = df.rename(columns={'retailer': 'Retailer'})
+            found = earlier[-1]
+        else:
+            files = sorted(f for f in glob.glob(os.path.join(data_dir, f'{retailer}_comparison_*.csv'))
+                           if f[-12:-4] < date)
+            if not files:
+                continue
+            df = read_csv(files[-1], 'comparison').rename(columns={f'{RETAILERS[retailer]}_price': 'Retailer_price'})
+            df['Retailer'] = retailer
+            df['Price_dif'] = df['Retailer_price'] - df['Dell_price']
+            found = files[-1][-12:-4]
+        frames.append(apply_schema(df, 'comparison'))
+        previous_date = max(previous_date or '', found)
+    if not frames:
+        return None, None
+    return apply_schema(pd.concat(frames, ignore_index=True), 'comparison'), previous_date
+
+
+# Function to list what changed between two snapshots: new, removed, repriced
+# and status-flipped products (a status flip wins over a plain reprice)
+def change_log(current, previous):
+    columns = SNAPSHOT_KEY + ['Retailer_price', 'Dell_price', 'Status']
+    merged = current[columns].merge(previous[columns].drop_duplicates(SNAPSHOT_KEY), how='outer',
+                                    on=SNAPSHOT_KEY, suffixes=('', '_prev'), indicator=True)
+    repriced = ((merged['Retailer_price'] != merged['Retailer_price_prev'])
+                | (merged['Dell_price'] != merged['Dell_price_prev']))
+    change = np.select(
+        [merged['_merge'] == 'left_only',
+         merged['_merge'] == 'right_only',
+         merged['Status'] != merged['Status_prev'],
+         repriced],
+        ['new', 'removed', 'status_flip', 'repriced'],
+        default='')
+    merged['Change'] = change
+    merged = merged[merged['Change'] != '']
+    return apply_schema(merged.rename(columns={
+        'Retailer_price_prev': 'Old_price', 'Retailer_price': 'New_price',
+        'Status_prev': 'Old_status', 'Status': 'New_status',
+    })[['Retailer', 'Dell_product', 'Change', 'Old_price', 'New_price', 'Old_status', 'New_status', 'Dell_price']],
+        'changes')
+
+
+# Function to save the day's change log for `retailers`, keeping the rows of any other
+# retailer already in it (the single-retailer Compare_* scripts each write their own)
+def write_changes(changes, date=date, retailers=None):
+    save_path = os.path.join(data_dir, f'price_changes_{date}.csv')
+    with locked(save_path):
+        if os.path.exists(save_path):
+            earlier = read_csv(save_path, 'changes')
+            kept = earlier[~earlier['Retailer'].astype(str).isin(retailers or list(RETAILERS))]
+            changes = apply_schema(pd.concat([kept, changes], ignore_index=True), 'changes')
+        write_atomic(save_path, changes.to_csv(index=False))
+    return save_path
+
+
+# Function to compute each retailer's totals from the long frame
+def summarize(df):
+    flags = pd.DataFrame({
+        'Retailer': df['Retailer'],
+        'total_products': 1,
+        'total_offending_products': (df['Price_dif'] < 0).astype(int),
+        'total_deviated_products': (df['Price_dif'] != 0).astype(int),
+        'compliant_products': (df['Price_dif'] == 0).astype(int),
+    })
+    totals = flags.groupby('Retailer', sort=False, observed=True).sum()
+    totals['compliance_rate'] = (totals['compliant_products'] / totals['total_products'] * 100).round(2)
+    return totals
+
+
+# Function to put one retailer's rows back into its original comparison layout
+def layout(rows, retailer):
+    return rows[['Dell_product', 'Dell_price', 'Retailer_price', 'Deviation', 'Status']].rename(
+        columns={'Retailer_price': f'{RETAILERS[retailer]}_price'})
+
+
+# Function to write every retailer's comparison CSV and build its JSON summary
+def write_outputs(df, date=date):
+    totals = summarize(df)
+    outputs = {}
+    for retailer, rows in df.groupby('Retailer', sort=False, observed=True):
+        out = layout(rows, retailer)
+        save_path = os.path.join(data_dir, f'{retailer}_comparison_{date}.csv')
+        out.to_csv(save_path, index=False)
+        print(f"Comparison results saved to {save_path}")
+
+        t = totals.loc[retailer]
+        outputs[retailer] = {
+            'total_products': int(t['total_products']),
+            'total_offending_products': int(t['total_offending_products']),
+            'total_deviated_products': int(t['total_deviated_products']),
+            'compliance_rate': float(t['compliance_rate']),
+            'products': out.to_dict(orient='records'),
+        }
+    return outputs
+
+
+# Function to publish a day's comparison: the per-retailer CSVs, the serving
+# artifacts and both stores, replacing whatever was there for that day, then
+# raise alerts against the previous snapshot (read from the stores when not passed)
+# Returns write_outputs' per-retailer summaries
+def publish(df, dell, date=date, previous=None):
+    outputs = write_outputs(df, date)
+
+    # Precompute what the dashboard routes serve and publish it through latest.json
+    layouts = {retailer: layout(rows, retailer)
+               for retailer, rows in df.groupby('Retailer', sort=False, observed=True)}
+    write_artifacts(df, layouts, dell, date)
+
+    # Keep the day's comparison in the price history store and the SQLite serving store too
+    append_comparisons(df, date)
+    load_comparisons(df, date)
+
+    # The day is published by now, a broken rule file or outbox only costs its alerts
+    try:
+        if previous is None:
+            previous, _ = load_previous(date, list(df['Retailer'].astype(str).unique()))
+        raise_alerts(df, date, previous)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f'Unable to raise alerts for {date}: {e}')
+    return outputs
+
+
+# Function to run the comparison for every retailer that has data
+# Frames already in memory (e.g. from pipeline.py) are used as-is, anything
+# not passed in is read from the day's CSVs
+# In delta mode (the default) rows are only re-scored when their prices moved
+# since the previous snapshot, and a compact price_changes_{date}.csv is written
+# next to the full comparison files
+def compare_retailers(index=None, dell=None, listings=None, date=date, retailers=None, delta=True):
+    if index is None:
+        index = load_index()
+    if dell is None:
+        dell = load_dell(date)
+    if listings is None:
+        listings = load_listings(date, retailers)
+    elif retailers:
+        listings = {r: df for r, df in listings.items() if r in retailers}
+
+    previous, previous_date = load_previous(date, list(listings)) if delta else (None, None)
+    df = compare_all(index, dell, listings, previous, date=date)
+    outputs = publish(df, dell, date, previous)
+
+    if previous is not None:
+        changes = change_log(df, previous)
+        save_path = write_changes(changes, date, list(listings))
+        counts = changes['Change'].value_counts()
+        print(f'Changes since {previous_date}: '
+              + ', '.join(f'{counts.get(c, 0)} {c}' for c in ['new', 'removed', 'repriced', 'status_flip']))
+        print(f"Change log saved to {save_path}")
+
+    for retailer, output in outputs.items():
+        print(f'{RETAILERS[retailer]}: {output["total_products"]} products, '
+              f'{output["total_offending_products"]} offending, '
+              f'{output["total_deviated_products"]} deviated, '
+              f'compliance rate {output["compliance_rate"]}%')
+    return df, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare every retailer against Dell in one pass')
+    parser.add_argument('--date', default=date, help='date of the CSVs to compare, YYYYMMDD')
+    parser.add_argument('--retailers', nargs='*', choices=list(RETAILERS), help='limit to these retailers')
+    parser.add_argument('--no-delta', dest='delta', action='store_false',
+                        help='re-score every row and skip the change log')
+    parser.add_argument('--profile', action='store_true', help='run under cProfile and tracemalloc')
+    args = parser.parse_args()
+    profiling.run_script('compare', compare_retailers, date=args.date, retailers=args.retailers, delta=args.delta)
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,16 @@
 # Always run the scraper first before doing any data analysis
 
 # Import python libraries
-from bs4 import BeautifulSoup
-import requests
 import pandas as pd
-from string import digits
 import datetime
 import os
+from functools import partial
 from dotenv import load_dotenv
+from price_store import append_listing
+from fetcher import make_session, make_cache, fetch_page, iter_parsed, RateLimiter
+from checkpoint import PageCheckpoint
+from extraction import extract_dell_page, parse_page, record_parsed
+import profiling
 
 # Load environment variables
 load_dotenv()
@@ -28,115 +31,81 @@ data_dir = os.path.join(script_dir, 'data')
 if not os.path.exists(data_dir):
     os.makedirs(data_dir)
 
+# Base URL and fetch settings can be overridden from .env
+# Point DELL_BASE_URL at a local server serving recorded pages to test offline
+base_url = os.getenv('DELL_BASE_URL', 'https://www.dell.com').rstrip('/')
+fetch_workers = int(os.getenv('DELL_FETCH_WORKERS', '4'))
+rate_limit = float(os.getenv('DELL_RATE_LIMIT', '2'))
+
+
+# Function to build the URL of one search results page
+def page_url(page):
+    return f'{base_url}/en-ca/search/monitor?p={page}&t=Product'
+
+
 # Get total product and page number first
 # As we are automating looping through all pages
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-}
-url = 'https://www.dell.com/en-ca/search/monitor?p=1&t=Product'
-response = requests.get(url, headers=headers)
-soup = BeautifulSoup(response.content, 'html.parser')
-pageinfo = soup.find('p', class_='pageinfo')
-pageinfo = str(pageinfo)
-pageinfo = ''.join(c for c in pageinfo if c in digits)
-total_product = int(pageinfo[3:])
-if total_product % 12 == 0:
-    page_loop = total_product // 12
-else:
-    page_loop = total_product // 12 + 1
-
-print('Total products we found: ', total_product)
-print('Loop through this many pages: ', page_loop)
-
-def scrape_dell_monitor():
-    # Create all the dummy variables
-    product_name = []
-    product_id = []
-    specs = []
-    price = []
-    link = []
-    price_holder_2 = []
-    spec_holder_2 = []
-    spec_holder_3 = []
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-
-    # Run this part to get the HTML info from the URL we wanted
-    # and loop it through the pages that we defined earlier
-    for i in range(1, page_loop + 1):
-        url = f'https://www.dell.com/en-ca/search/monitor?p={i}&t=Product'
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # These variables are temporary holders for the data that we want
-        product_name_holder = soup.find_all('h3', class_='ps-title')
-        product_id_holder = soup.find_all('div', class_='ps-product-detail-info')
-        price_holder = soup.find_all('div', class_='ps-dell-price ps-simplified')
-        spec_holder = soup.find_all('div', class_='ps-snp-tech-specs ps-icon-specs-container')
-        link_holder = soup.find_all('h3', class_='ps-title')
-
-        # The following FOR loops are to clean the temporary holders that we fetched above
-        for a in product_name_holder:
-            a = a.get_text().strip('\n')
-            product_name.append(a)
-
-        for b in product_id_holder:
-            b = b.get_text().strip('\n')  # .strip('Order Code')
-            product_id.append(b)
-
-        for d in price_holder:
-            d = d.get_text().strip('\n')
-            d = d.split(' ')[-1]
-            d = d.strip('$')
-            d = d.replace(',', '')
-            d = float(d)
-            price_holder_2.append(d)
-
-        for f in range(len(spec_holder)):
-            spec_holder_2 = spec_holder[f].find_all('span', class_='ps-iconography-specs-label')
-            for g in spec_holder_2:
-                g = g.get_text().strip('\n').strip('  ').strip('\n')
-                spec_holder_3.append(g)
-            specs.append(spec_holder_3)
-            spec_holder_3 = []
-
-        for h in link_holder:
-            h = str(h)
-            h = h.split('//')[-1].split('"')[0]
-            link.append(h)
-
-        print(f'Fetching page {i}')
-        i += 1
-
-    for e in range(0, len(price_holder_2), 2):
-        price.append(price_holder_2[e])
-
-    print(len(product_name))
-    print(len(product_id))
-    print(len(price))
-    print(len(specs))
-    print(len(link))
-
-    # Put the data in a dataframe
+def get_page_loop(total_product):
+    if total_product % 12 == 0:
+        page_loop = total_product // 12
+    else:
+        page_loop = total_product // 12 + 1
+    return page_loop
+
+
+# Function to scrape the listing into the CSV and history store for `date` (today unless a run passes one)
+def scrape_dell_monitor(date=date):
+    # One keep-alive session shared by every worker thread
+    session = make_session(pool_size=fetch_workers)
+    limiter = RateLimiter(rate_limit, burst=fetch_workers)
+    # Pages fetched recently are served from disk, older ones are revalidated
+    cache = make_cache()
+
+    # Each page is written out as soon as it is parsed, and a rerun the same
+    # day carries on after the last page that was written
+    csv_path = os.path.join(data_dir, f'official_dell_monitor_{date}.csv')
+    columns = ['Dell_product', 'Dell_product_id', 'Dell_price', 'Dell_specs', 'Dell_link']
+    checkpoint = PageCheckpoint(csv_path, columns, date)
+    checkpoint.open()
+    try:
+        # The first page tells us how many pages there are
+        if checkpoint.last_page == 0:
+            first_page = fetch_page(session, page_url(1), limiter, cache=cache)
+            records, meta = extract_dell_page(first_page)
+            checkpoint.write_page(1, records, total_product=meta['total_product'])
+            print('Fetching page 1')
+        total_product = checkpoint.cursor['total_product']
+        page_loop = get_page_loop(total_product)
+        print('Total products we found: ', total_product)
+        print('Loop through this many pages: ', page_loop)
+
+        # Fetch the remaining pages concurrently while worker processes parse the
+        # ones already downloaded into one record per product card, and write
+        # them in page order (parsed here instead when profiling, so the profile sees it)
+        urls = [page_url(i) for i in range(checkpoint.last_page + 1, page_loop + 1)]
+        pages = iter_parsed(session, urls, partial(parse_page, 'dell'), workers=fetch_workers,
+                            parse_workers=0 if profiling.enabled() else None, limiter=limiter, cache=cache)
+        for i, (_, parsed) in enumerate(pages, start=checkpoint.last_page + 1):
+            records, _ = record_parsed('dell', parsed)
+            checkpoint.write_page(i, records)
+            print(f'Fetching page {i}')
+    finally:
+        session.close()
+        checkpoint.close()
+    print(f'HTTP cache: {cache.summary()}')
+
+    # Every page is in, publish the CSV and read it back as a dataframe
+    Dell_monitor = checkpoint.finish('dell')
+    print(len(Dell_monitor))
     print('Below are the first 10 rows of the fetched data:')
-    data = {
-        'Dell_product': product_name,
-        'Dell_product_id': product_id,
-        'Dell_price': price,
-        'Dell_specs': specs,
-        'Dell_link': link
-    }
-
-    Dell_monitor = pd.DataFrame(data)
     print(Dell_monitor.head(10))
-
-    # Write data to CSV
-    csv_path = os.path.join(data_dir, f'official_dell_monitor_{date}.csv')
-    Dell_monitor.to_csv(csv_path, index=False)
     print(f'Data scraped and saved to {csv_path}')
 
+    # Keep the day's listing in the price history store too
+    append_listing(Dell_monitor, 'dell', date)
+    return Dell_monitor
+
 # Run this function
 if __name__ == '__main__':
-    scrape_dell_monitor()
\ No newline at end of file
+    # Pass --profile to run it under cProfile and tracemalloc
+    profiling.run_script('scrape_dell', scrape_dell_monitor)
\ No newline at end of file
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Shared HTML extraction engine for the Dell and Newegg scrapers
+# Each page is parsed once with lxml's streaming parser and every selector we
+# care about is checked in that one walk, so a page is never re-searched or
+# re-serialized to recover links
+
+# Import necessary libraries
+import time
+from io import BytesIO
+from string import digits
+
+from lxml import etree
+
+import metrics
+
+
+# Selectors are written like 'h3.ps-title' or 'div.ps-dell-price.ps-simplified'
+# and compiled to (tag, set of required classes)
+def compile_selector(selector):
+    tag, *classes = selector.split('.')
+    return tag, frozenset(classes)
+
+
+# Function to get an element's text the same way BeautifulSoup's get_text() did
+def element_text(el):
+    return ''.join(el.itertext())
+
+
+# Function to recover the last '//' link inside an element from its attributes
+# Matches what str(tag).split('//')[-1].split('"')[0] used to return
+def last_link(el):
+    link = None
+    for node in el.iter():
+        for value in node.attrib.values():
+            if '//' in value:
+                link = value
+    if link is None:
+        return ''
+    return link.split('//')[-1].split('"')[0]
+
+
+# Compiled set of selectors for one kind of page
+#   fields: list of (column, selector, extract) giving one value per product card
+#   lists:  list of (column, container selector, item selector, extract) giving a
+#           list per card built from the items inside each container
+#   meta:   list of (key, selector, extract) for page-level values, first match wins
+#   every:  {column: n} keeps only every n-th match of a field (Dell repeats prices)
+# Values are matched to cards by position, the n-th match of every column
+# belongs to the n-th card, exactly like the old parallel find_all lists
+class PageExtractor:
+    def __init__(self, fields=(), lists=(), meta=(), every=None):
+        self.columns = [f[0] for f in fields] + [l[0] for l in lists]
+        self.every = every or {}
+        self._rules = {}
+        for column, selector, extract in fields:
+            self._add_rule(selector, ('field', column, extract))
+        for column, container, item, extract in lists:
+            self._add_rule(container, ('list', column, None))
+            self._add_rule(item, ('item', column, extract))
+        for key, selector, extract in meta:
+            self._add_rule(selector, ('meta', key, extract))
+        self._tags = list(self._rules)
+
+    def _add_rule(self, selector, rule):
+        tag, classes = compile_selector(selector)
+        self._rules.setdefault(tag, []).append((classes, rule))
+
+    # Walk the page once and return (records, meta)
+    def extract(self, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        records = []
+        meta = {}
+        counts = dict.fromkeys(self.columns, 0)
+        open_lists = {}
+
+        def assign(column, value):
+            n = counts[column]
+            counts[column] = n + 1
+            every = self.every.get(column, 1)
+            if n % every:
+                return
+            position = n // every
+            while len(records) <= position:
+                records.append(dict.fromkeys(self.columns))
+            records[position][column] = value
+
+        events = etree.iterparse(BytesIO(content), events=('start', 'end'), tag=self._tags,
+                                 html=True, recover=True, no_network=True)
+        for event, el in events:
+            class_attr = el.get('class')
+            if not class_attr:
+                continue
+            classes = set(class_attr.split())
+            for required, (kind, column, extract) in self._rules[el.tag]:
+                if not required <= classes:
+                    continue
+                if kind == 'list':
+                    if event == 'start':
+                        open_lists[column] = []
+                    elif column in open_lists:
+                        assign(column, open_lists.pop(column))
+                elif event != 'end':
+                    continue
+                elif kind == 'item':
+                    if column in open_lists:
+                        open_lists[column].append(extract(el))
+                elif kind == 'field':
+                    assign(column, extract(el))
+                elif column not in meta:
+                    meta[column] = extract(el)
+        return records, meta
+
+
+# Dell search result pages
+
+def _dell_price(el):
+    d = element_text(el).strip('\n')
+    d = d.split(' ')[-1]
+    d = d.strip('$')
+    d = d.replace(',', '')
+    return float(d)
+
+
+def _dell_total_products(el):
+    pageinfo = ''.join(c for c in element_text(el) if c in digits)
+    return int(pageinfo[3:])
+
+
+dell_extractor = PageExtractor(
+    fields=[
+        ('Dell_product', 'h3.ps-title', lambda el: element_text(el).strip('\n')),
+        ('Dell_product_id', 'div.ps-product-detail-info', lambda el: element_text(el).strip('\n')),
+        ('Dell_price', 'div.ps-dell-price.ps-simplified', _dell_price),
+        ('Dell_link', 'h3.ps-title', last_link),
+    ],
+    lists=[
+        ('Dell_specs', 'div.ps-snp-tech-specs.ps-icon-specs-container', 'span.ps-iconography-specs-label',
+         lambda el: element_text(el).strip('\n').strip('  ').strip('\n')),
+    ],
+    meta=[
+        ('total_product', 'p.pageinfo', _dell_total_products),
+    ],
+    # Every Dell card renders its price twice, keep the first one
+    every={'Dell_price': 2},
+)
+
+
+# Newegg search result pages
+
+def _newegg_sku(el):
+    return last_link(el).split('/')[-1]
+
+
+def _newegg_price(el):
+    d = element_text(el).split(u'\xa0')[0].strip('\n')
+    d = d.strip('$')
+    d = d.replace(',', '')
+    d = d.replace(' ', '')
+    return d
+
+
+def _newegg_page_count(el):
+    pageinfo = element_text(el).split('/')[1]
+    return int(''.join(c for c in pageinfo if c in digits))
+
+
+newegg_extractor = PageExtractor(
+    fields=[
+        ('Newegg_name', 'div.item-info', lambda el: element_text(el).strip('\n')),
+        ('Newegg_sku', 'div.item-info', _newegg_sku),
+        ('Newegg_price', 'li.price-current', _newegg_price),
+        ('Newegg_link', 'div.item-info', last_link),
+    ],
+    meta=[
+        ('page_count', 'span.list-tool-pagination-text', _newegg_page_count),
+    ],
+)
+
+
+# Newegg product pages, for re-checking one listing's price
+# The buy box comes before any carousel of other items, so its price is the first match
+newegg_product_extractor = PageExtractor(
+    meta=[
+        ('Newegg_price', 'li.price-current', _newegg_price),
+    ],
+)
+
+
+EXTRACTORS = {'dell': dell_extractor, 'newegg': newegg_extractor, 'newegg_product': newegg_product_extractor}
+
+
+# Function to parse one page of a site, returning (records, meta, seconds it took)
+# It only touches the page, so it can run in a parse worker process (see fetcher.iter_parsed)
+def parse_page(site, content):
+    start = time.perf_counter()
+    records, meta = EXTRACTORS[site].extract(content)
+    return records, meta, time.perf_counter() - start
+
+
+# Function to record a page parse_page parsed, here or in a worker process, and return (records, meta)
+def record_parsed(site, parsed):
+    records, meta, seconds = parsed
+    metrics.record_page(site, seconds, len(records))
+    return records, meta
+
+
+# Function to extract every product card from one Dell page
+def extract_dell_page(content):
+    return record_parsed('dell', parse_page('dell', content))
+
+
+# Function to extract every product card from one Newegg page
+def extract_newegg_page(content):
+    return record_parsed('newegg', parse_page('newegg', content))
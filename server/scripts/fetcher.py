@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Shared HTTP helpers for the scrapers
+# One pooled keep-alive session per run, a per-host rate limit and a bounded
+# thread pool so pages can be fetched concurrently but merged back in order
+# Responses go through an on-disk cache: fresh pages are served from disk,
+# stale ones are revalidated with ETag / Last-Modified, and replay mode runs
+# a whole scrape offline from what earlier runs saved
+
+# Import necessary libraries
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+cache_dir = os.path.join(script_dir, 'data', 'http_cache')
+
+# Cache modes
+#   on:      serve fresh entries from disk, revalidate stale ones (default)
+#   refresh: always revalidate, a 304 still costs no body
+#   replay:  never touch the network, a page that was never cached is an error
+#   off:     plain requests, nothing read or written
+CACHE_MODES = ('on', 'refresh', 'replay', 'off')
+
+# Responses worth retrying, with exponential backoff starting at BACKOFF_BASE seconds
+# A Retry-After header from the server wins over our own delay
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+
+# Processes parsing downloaded pages, 0 parses them in the scraper's own process
+# One per core by default, none on a single core where a process only adds overhead
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', str(os.cpu_count() if (os.cpu_count() or 1) > 1 else 0)))
+
+# Same browser headers every scraper has been sending
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+# Function to build one session that keeps its TCP/TLS connections alive
+# pool_size should be at least the number of worker threads using it
+def make_session(pool_size=10, headers=None):
+    session = requests.Session()
+    session.headers.update(headers or DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# Token bucket per host: `rate` requests per second with bursts up to `burst`
+# A rate of 0 (or less) turns the limiter off
+# backoff() pauses a host for every thread sharing the limiter, e.g. after a 429
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._buckets = {}
+        self._paused = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused.get(host, now) - now
+                if delay <= 0:
+                    if self.rate <= 0:
+                        return
+                    tokens, last = self._buckets.get(host, (self.burst, now))
+                    tokens = min(self.burst, tokens + (now - last) * self.rate)
+                    if tokens >= 1:
+                        self._buckets[host] = (tokens - 1, now)
+                        return
+                    self._buckets[host] = (tokens, now)
+                    delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+
+    def backoff(self, url, delay):
+        host = urlsplit(url).netloc
+        with self._lock:
+            until = time.monotonic() + delay
+            self._paused[host] = max(self._paused.get(host, 0), until)
+            # Nothing saved up while paused may be spent in a burst afterwards
+            self._buckets[host] = (0, until)
+
+
+# Raised in replay mode when a page was never cached
+class CacheMiss(Exception):
+    pass
+
+
+# Content-addressed response cache
+#   objects/ab/abcd...  response bodies, named by the SHA-256 of their content
+#   entries/12/1234...  one JSON file per URL (SHA-256 of the full URL) with its
+#                       validators, fetch time and the body it points to
+# Identical bodies are stored once. When the objects grow past max_bytes the
+# least recently used entries are dropped, then any body nothing points to.
+class ResponseCache:
+    def __init__(self, root=cache_dir, mode='on', ttl=43200, max_bytes=200 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f'Unknown cache mode {mode!r}, expected one of {", ".join(CACHE_MODES)}')
+        self.root = root
+        self.mode = mode
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self.stats = dict.fromkeys(['fresh', 'revalidated', 'downloaded'], 0)
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, kind, digest):
+        return os.path.join(self.root, kind, digest[:2], digest)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _files(self, kind):
+        base = os.path.join(self.root, kind)
+        if not os.path.isdir(base):
+            return
+        for prefix in os.listdir(base):
+            for name in os.listdir(os.path.join(base, prefix)):
+                if not name.endswith('.tmp'):
+                    yield os.path.join(base, prefix, name)
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+        metrics.inc('spectra_http_cache_responses_total', outcome=stat)
+
+    # Function to read the cached entry and body for a URL, (None, None) if there is none
+    def lookup(self, url):
+        try:
+            with open(self._path('entries', hashlib.sha256(url.encode()).hexdigest())) as f:
+                entry = json.load(f)
+            with open(self._path('objects', entry['sha256']), 'rb') as f:
+                return entry, f.read()
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    # Function to save a response body and its validators for a URL
+    def store(self, url, content, headers, fetched_at=None):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._path('objects', digest)
+        added = 0
+        if not os.path.exists(object_path):
+            self._write(object_path, content)
+            added = len(content)
+        entry = {
+            'url': url,
+            'sha256': digest,
+            'size': len(content),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_at': fetched_at or time.time(),
+        }
+        self._write(self._path('entries', hashlib.sha256(url.encode()).hexdigest()), json.dumps(entry).encode())
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(path) for path in self._files('objects'))
+            else:
+                self._size += added
+            over = self._size > self.max_bytes
+        if over:
+            self.prune()
+
+    # Function to drop least recently fetched entries until the bodies fit in max_bytes
+    def prune(self):
+        with self._lock:
+            entries = []
+            for path in self._files('entries'):
+                try:
+                    with open(path) as f:
+                        entries.append((json.load(f), path))
+                except (OSError, ValueError):
+                    os.remove(path)
+            entries.sort(key=lambda e: e[0].get('fetched_at', 0))
+            sizes = {}
+            for path in self._files('objects'):
+                sizes[os.path.basename(path)] = (os.path.getsize(path), path)
+
+            live = {}
+            for entry, _ in entries:
+                live[entry.get('sha256')] = live.get(entry.get('sha256'), 0) + 1
+            total = sum(size for digest, (size, _) in sizes.items() if digest in live)
+            for entry, path in entries:
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                digest = entry.get('sha256')
+                live[digest] -= 1
+                if live[digest] == 0 and digest in sizes:
+                    total -= sizes[digest][0]
+
+            # Remove every body that no entry points to any more
+            for digest, (size, path) in sizes.items():
+                if not live.get(digest):
+                    os.remove(path)
+            self._size = total
+
+    # Function to get a URL through the cache, only touching the network when needed
+    def get(self, session, url, limiter=None, timeout=30):
+        if self.mode == 'off':
+            return _download(session, url, limiter, timeout).content
+
+        entry, content = self.lookup(url)
+        if self.mode == 'replay':
+            if content is None:
+                raise CacheMiss(f'{url} is not in the cache at {self.root}')
+            self._count('fresh')
+            return content
+        if content is not None and self.mode == 'on' and time.time() - entry['fetched_at'] < self.ttl:
+            self._count('fresh')
+            return content
+
+        # Stale or missing: ask the server, conditionally when we have validators
+        headers = {}
+        if content is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = _download(session, url, limiter, timeout, headers)
+        if response.status_code == 304 and content is not None:
+            self.store(url, content, {'ETag': response.headers.get('ETag', entry.get('etag')),
+                                      'Last-Modified': response.headers.get('Last-Modified',
+                                                                            entry.get('last_modified'))})
+            self._count('revalidated')
+            return content
+        self.store(url, response.content, response.headers)
+        self._count('downloaded')
+        return response.content
+
+    # Function to summarise how the run's pages were served
+    def summary(self):
+        return ', '.join(f'{count} {stat}' for stat, count in self.stats.items())
+
+
+# Function to build the response cache from .env settings
+#   SCRAPE_CACHE=on|refresh|replay|off, SCRAPE_CACHE_DIR, SCRAPE_CACHE_TTL (seconds),
+#   SCRAPE_CACHE_MAX_MB
+def make_cache():
+    return ResponseCache(
+        root=os.getenv('SCRAPE_CACHE_DIR', cache_dir),
+        mode=os.getenv('SCRAPE_CACHE', 'on'),
+        ttl=float(os.getenv('SCRAPE_CACHE_TTL', '43200')),
+        max_bytes=int(float(os.getenv('SCRAPE_CACHE_MAX_MB', '200')) * 1024 * 1024),
+    )
+
+
+# Function to work out how long to wait before retrying a response
+def retry_delay(response, attempt):
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return float(retry_after)
+    return BACKOFF_BASE * 2 ** attempt
+
+
+# Function to send one GET through the shared session and limiter
+# 429 and 5xx responses are retried with backoff, and the host is paused for
+# every thread sharing the limiter. A 304 is passed back to the cache, any
+# other error status raises. Every attempt's latency and size is recorded
+def _download(session, url, limiter=None, timeout=30, headers=None):
+    host = urlsplit(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.wait(url)
+        start = time.perf_counter()
+        response = session.get(url, timeout=timeout, headers=headers)
+        metrics.record_request(host, response.status_code, time.perf_counter() - start,
+                               len(response.content), attempt)
+        if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+            break
+        delay = retry_delay(response, attempt)
+        metrics.inc('spectra_http_retries_total', host=host, status=str(response.status_code))
+        print(f'Got {response.status_code} from {url}, retrying in {delay:.1f}s')
+        if limiter is not None:
+            limiter.backoff(url, delay)
+        else:
+            time.sleep(delay)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+
+# Function to build the full URL of a request, query string included
+def full_url(url, params=None):
+    if not params:
+        return url
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+# Function to fetch a single page through the shared session and limiter
+# With a cache, fresh pages never reach the limiter or the network
+def fetch_page(session, url, limiter=None, timeout=30, params=None, cache=None):
+    url = full_url(url, params)
+    if cache is not None:
+        return cache.get(session, url, limiter, timeout)
+    return _download(session, url, limiter, timeout).content
+
+
+# Function to run `function` over `items` with at most `workers` calls in flight,
+# yielding (item, result) in the order of `items` as soon as each is ready
+# At most 2 x `workers` results are held at once (the pool keeps working while
+# a slow item holds up the head), so a caller writing each one out as it
+# arrives keeps memory flat however many items there are
+def iter_ordered(function, items, workers=4):
+    items = iter(items)
+    workers = max(1, int(workers))
+    if workers == 1:
+        for item in items:
+            yield item, function(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for item in items:
+            window.append((item, pool.submit(function, item)))
+            if len(window) >= 2 * workers:
+                item, future = window.popleft()
+                yield item, future.result()
+        while window:
+            item, future = window.popleft()
+            yield item, future.result()
+
+
+# Function to fetch pages in order as they arrive, see iter_ordered
+def iter_pages(session, urls, workers=4, limiter=None, timeout=30, cache=None):
+    yield from iter_ordered(lambda url: fetch_page(session, url, limiter, timeout, cache=cache), urls, workers)
+
+
+# Function to start the parse worker processes
+# Fresh interpreters (forkserver, or spawn where there is none) rather than fork,
+# since the scraper already has download threads and locks running
+def make_parse_pool(parse_workers):
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=parse_workers, mp_context=context)
+
+
+# Function to download, parse and hand back pages as three overlapping stages
+#   download  `workers` threads fetch pages through the session, limiter and cache
+#   parse     each downloaded page goes straight to one of `parse_workers` processes,
+#             so parsing uses every core while the threads wait on the network
+#   write     the caller gets (url, parse(content)) in the order of `urls`
+# At most `in_flight` pages (2 x the larger of the two worker counts by default) are
+# downloading, parsing or waiting to be written at once, so a slow writer holds the
+# downloads back instead of piling pages up in memory
+# `parse` must be picklable (a module-level function or a functools.partial of one).
+# With parse_workers=0 pages are parsed in this process as they arrive
+def iter_parsed(session, urls, parse, workers=4, parse_workers=None, limiter=None, timeout=30, cache=None,
+                in_flight=None):
+    parse_workers = PARSE_WORKERS if parse_workers is None else int(parse_workers)
+    urls = list(urls)
+    if parse_workers < 1 or not urls:
+        for url, content in iter_pages(session, urls, workers, limiter, timeout, cache):
+            yield url, parse(content)
+        return
+
+    workers = max(1, int(workers))
+    parse_workers = min(parse_workers, len(urls))
+    in_flight = max(1, int(in_flight or 2 * max(workers, parse_workers)))
+    with make_parse_pool(parse_workers) as parsers, ThreadPoolExecutor(max_workers=workers) as downloads:
+        def download(url):
+            return parsers.submit(parse, fetch_page(session, url, limiter, timeout, cache=cache))
+
+        window = deque()
+        try:
+            for url in urls:
+                window.append((url, downloads.submit(download, url)))
+                if len(window) >= in_flight:
+                    url, future = window.popleft()
+                    yield url, future.result().result()
+            while window:
+                url, future = window.popleft()
+                yield url, future.result().result()
+        finally:
+            # Stopped early (an error, or the caller gave up): drop what has not started
+            for _, future in window:
+                future.cancel()
+
+
+# Function to fetch many pages with at most `workers` requests in flight
+# Results come back in the same order as `urls`, whatever order they finished in
+def fetch_pages(session, urls, workers=4, limiter=None, timeout=30, cache=None):
+    urls = list(urls)
+    if not urls:
+        return []
+    workers = max(1, min(int(workers), len(urls)))
+    if workers == 1:
+        return [fetch_page(session, url, limiter, timeout, cache=cache) for url in urls]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda url: fetch_page(session, url, limiter, timeout, cache=cache), urls))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Run metrics for the scrapers, comparisons and pipeline
+# Every stage records into one in-process registry: HTTP request latency,
+# bytes and retries, per-page parse time, rows in and out of each merge and
+# each stage's wall / CPU time. At the end of a run it is written to
+# data/metrics/ twice:
+#   {job}.prom               Prometheus text format, replaced atomically each run
+#                            (point node_exporter's textfile collector at the directory)
+#   {job}_{stamp}.jsonl      one JSON line per request, page, merge and stage
+# Scripts run on their own flush when they exit, pipeline.py flushes once for
+# the whole run. METRICS=off turns recording off.
+
+# Import necessary libraries
+import atexit
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Directory paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+metrics_dir = os.getenv('METRICS_DIR', os.path.join(script_dir, 'data', 'metrics'))
+
+ENABLED = os.getenv('METRICS', 'on') != 'off'
+
+# Histogram buckets, in seconds
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# name: (type, help, buckets)
+METRICS = {
+    'spectra_http_request_seconds': ('histogram', 'Time to answer one HTTP request, retries counted separately',
+                                     REQUEST_BUCKETS),
+    'spectra_http_response_bytes_total': ('counter', 'Response body bytes downloaded', None),
+    'spectra_http_retries_total': ('counter', 'Requests retried after a 429 or 5xx answer', None),
+    'spectra_http_cache_responses_total': ('counter', 'Pages served by the response cache, by outcome', None),
+    'spectra_page_parse_seconds': ('histogram', 'Time to parse one result page', PARSE_BUCKETS),
+    'spectra_page_records_total': ('counter', 'Records extracted from result pages', None),
+    'spectra_refresh_checks_total': ('counter', 'Single-product price re-checks by the intra-day refresh, by outcome',
+                                     None),
+    'spectra_alerts_total': ('counter', 'Alert rule hits by rule and outcome (queued or suppressed by cooldown)', None),
+    'spectra_merge_rows': ('gauge', 'Rows going into and coming out of each merge', None),
+    'spectra_stage_seconds': ('gauge', 'Wall and CPU time of each stage in the last run', None),
+    'spectra_stage_success': ('gauge', '1 if the stage succeeded in the last run, 0 if not', None),
+    'spectra_last_run_timestamp_seconds': ('gauge', 'When the last run finished', None),
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(labels, extra=()):
+    pairs = [(k, v) for k, v in labels] + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+# Holds one run's metrics and events, shared by every thread in the process
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.values = {name: {} for name in METRICS}
+            self.events = []
+            self.started = time.time()
+            self.flushed = False
+
+    # Function to add to a counter
+    def inc(self, name, value=1, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            series = self.values[name]
+            series[_key(labels)] = series.get(_key(labels), 0) + value
+
+    # Function to set a gauge
+    def set(self, name, value, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self.values[name][_key(labels)] = value
+
+    # Function to add one observation to a histogram
+    def observe(self, name, value, **labels):
+        if not ENABLED:
+            return
+        buckets = METRICS[name][2]
+        with self._lock:
+            series = self.values[name].setdefault(_key(labels), [[0] * len(buckets), 0, 0.0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    # Function to keep one event for the run's JSON lines
+    def event(self, kind, **fields):
+        if not ENABLED:
+            return
+        with self._lock:
+            self.events.append({'ts': round(time.time(), 3), 'event': kind, **fields})
+
+    # Function to render the registry in the Prometheus text exposition format
+    def prometheus(self, job):
+        lines = []
+        job_label = (('job', job),)
+        with self._lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                series = self.values[name]
+                if not series:
+                    continue
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(series.items()):
+                    labels = job_label + labels
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_label_text(labels)} {value:g}')
+                        continue
+                    counts, count, total = value
+                    for bound, bucket in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{_label_text(labels, [("le", f"{bound:g}")])} {bucket}')
+                    lines.append(f'{name}_bucket{_label_text(labels, [("le", "+Inf")])} {count}')
+                    lines.append(f'{name}_sum{_label_text(labels)} {total:.6f}')
+                    lines.append(f'{name}_count{_label_text(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    # Function to write the run's .prom file and JSON lines, returning their paths
+    def flush(self, job, directory=None):
+        if not ENABLED:
+            return None, None
+        directory = directory or metrics_dir
+        os.makedirs(directory, exist_ok=True)
+        self.set('spectra_last_run_timestamp_seconds', round(time.time(), 3))
+        stamp = datetime.datetime.fromtimestamp(self.started).strftime('%Y%m%dT%H%M%S')
+
+        prom_path = os.path.join(directory, f'{job}.prom')
+        tmp = f'{prom_path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus(job))
+        os.replace(tmp, prom_path)
+
+        events_path = os.path.join(directory, f'{job}_{stamp}.jsonl')
+        with self._lock:
+            events = list(self.events)
+            self.flushed = True
+        with open(events_path, 'w') as f:
+            for event in events:
+                f.write(json.dumps({'job': job, **event}, default=str) + '\n')
+        return prom_path, events_path
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set
+event = registry.event
+
+
+# Function to record a finished HTTP request
+def record_request(host, status, seconds, size, attempt=0):
+    observe('spectra_http_request_seconds', seconds, host=host, status=str(status))
+    inc('spectra_http_response_bytes_total', size, host=host)
+    event('http_request', host=host, status=status, seconds=round(seconds, 4), bytes=size, attempt=attempt)
+
+
+# Function to record one parsed page
+def record_page(site, seconds, records):
+    observe('spectra_page_parse_seconds', seconds, site=site)
+    inc('spectra_page_records_total', records, site=site)
+    event('page_parse', site=site, seconds=round(seconds, 5), records=records)
+
+
+# Function to record the rows going into and out of one merge
+def record_merge(merge, left, right, out):
+    for side, rows in [('left', left), ('right', right), ('out', out)]:
+        set_gauge('spectra_merge_rows', rows, merge=merge, side=side)
+    event('merge', merge=merge, left=left, right=right, out=out)
+
+
+# Function to record one finished stage
+def record_stage(stage, wall_s, cpu_s, succeeded=True, **fields):
+    set_gauge('spectra_stage_seconds', round(wall_s, 4), stage=stage, clock='wall')
+    set_gauge('spectra_stage_seconds', round(cpu_s, 4), stage=stage, clock='cpu')
+    set_gauge('spectra_stage_success', int(succeeded), stage=stage)
+    event('stage', stage=stage, wall_s=round(wall_s, 4), cpu_s=round(cpu_s, 4), succeeded=succeeded, **fields)
+
+
+# Times a block as a stage, for scripts run on their own
+@contextmanager
+def stage(name):
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        record_stage(name, time.perf_counter() - start, time.process_time() - start_cpu, succeeded)
+
+
+# Scripts in this directory run on their own write their metrics on the way out,
+# named after the script. Anything else importing them (benchmarks, notebooks) flushes itself
+def _flush_at_exit():
+    main = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else ''
+    if os.path.dirname(main) != script_dir or registry.flushed or not registry.events:
+        return
+    try:
+        registry.flush(os.path.splitext(os.path.basename(main))[0])
+    except OSError as e:
+        print(f'Unable to write metrics: {e}')
+
+
+atexit.register(_flush_at_exit)
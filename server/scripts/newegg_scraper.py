@@ -5,13 +5,18 @@
 # Always run the scraper first before doing any data analysis
 
 # Import necessary libraries
-from bs4 import BeautifulSoup
-import requests
 import pandas as pd
-from string import digits
 import datetime
+import html
 import os
+from functools import partial
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
+from price_store import append_listing
+from fetcher import make_session, make_cache, fetch_page, iter_parsed
+from extraction import extract_newegg_page, parse_page, record_parsed
+from checkpoint import PageCheckpoint
+import profiling
 
 # Load environment variables
 load_dotenv()
@@ -28,95 +33,79 @@ data_dir = os.path.join(script_dir, 'data')
 if not os.path.exists(data_dir):
     os.makedirs(data_dir)
 
-# Initiate and fetch the first page from Newegg
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-}
-url = 'https://www.newegg.ca/p/pl?d=monitor+dell&page=1'
-response = requests.get(url, headers=headers)
-soup = BeautifulSoup(response.content, 'html.parser')
-
-# Fetch the number of total product pages on the Newegg website
-pagination = soup.find('span', class_='list-tool-pagination-text')
-if pagination:
-    pageinfo = pagination.get_text().split('/')[1]
-    pageinfo = ''.join(c for c in pageinfo if c in digits)
-    page_loop = int(pageinfo) + 1
-else:
-    page_loop = 1
-
-print('Loop through this many pages: ', page_loop - 1)
-
-def scrape_newegg_monitor():
-    # Create all the dummy variables
-    product_name = []
-    product_id = []
-    specs = []
-    price = []
-    link = []
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-
-    # Run this part to get the HTML info from the URL we wanted
-    # and loop it through the pages that we defined earlier
-    for i in range(1, page_loop):
-        url = f'https://www.newegg.ca/p/pl?d=monitor+dell&page={i}'
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # These variables are temporary holders for the data that we want
-        product_name_holder = soup.find_all('div', class_='item-info')
-        product_id_holder = soup.find_all('div', class_='item-info')
-        price_holder = soup.find_all('li', class_='price-current')
-        link_holder = soup.find_all('div', class_='item-info')
-
-        # The following FOR loops are to clean the temporary holders that we fetched above
-        for a in product_name_holder:
-            a = a.get_text().strip('\n')
-            product_name.append(a)
-
-        for b in product_id_holder:
-            b = str(b)
-            b = b.split('//')[-1].split('"')[0]
-            b = b.split('/')[-1]
-            product_id.append(b)
-
-        for d in price_holder:
-            d = d.get_text().split(u'\xa0')[0].strip('\n')
-            d = d.strip('$')
-            d = d.replace(',', '')
-            d = d.replace(' ', '')
-            price.append(d)
-
-        for h in link_holder:
-            h = str(h)
-            h = h.split('//')[-1].split('"')[0]
-            link.append(h)
-
-        print(f'Fetching page {i}')
-        i += 1
-
-    # Print out the length of each "column" for easy de-bugging
-    print(len(product_name))
-    print(len(product_id))
-    print(len(price))
-    print(len(link))
-
-    # Put the data in a dataframe
-    print('Below are the first 10 rows of the fetched data:')
-    dict = {'Newegg_name': product_name, 'Newegg_sku': product_id, 'Newegg_price': price, 'Newegg_link': link}
+# Base URL can be overridden from .env, e.g. to test against recorded pages
+base_url = os.getenv('NEWEGG_BASE_URL', 'https://www.newegg.ca').rstrip('/')
+
+
+# Function to build the URL of one search results page
+def page_url(page):
+    return f'{base_url}/p/pl?d=monitor+dell&page={page}'
+
+
+# Function to build the URL of one product page from its saved Newegg_link, for re-checking a single price
+def product_url(link):
+    parts = urlsplit('//' + html.unescape(link).split('//')[-1])
+    return f'{base_url}{parts.path}' + (f'?{parts.query}' if parts.query else '')
 
-    newegg_monitor = pd.DataFrame(dict)
-    
-    print(newegg_monitor.head(10))
 
-    # Write data to CSV
+# Function to read the price off one product page, '' if it shows none
+def parse_product_price(content):
+    _, meta = record_parsed('newegg_product', parse_page('newegg_product', content))
+    return meta.get('Newegg_price', '')
+
+
+# Function to scrape the listing into the CSV and history store for `date` (today unless a run passes one)
+def scrape_newegg_monitor(date=date):
+    session = make_session(pool_size=1)
+    cache = make_cache()
+
+    # Each page is written out as soon as it is parsed, and a rerun the same
+    # day carries on after the last page that was written
     csv_path = os.path.join(data_dir, f'newegg_dell_monitor_{date}.csv')
-    newegg_monitor.to_csv(csv_path, index=False)
+    columns = ['Newegg_name', 'Newegg_sku', 'Newegg_price', 'Newegg_link']
+    checkpoint = PageCheckpoint(csv_path, columns, date)
+    checkpoint.open()
+    try:
+        # Initiate and fetch the first page from Newegg
+        # It also carries the number of total product pages on the Newegg website
+        if checkpoint.last_page == 0:
+            content = fetch_page(session, page_url(1), cache=cache)
+            records, meta = extract_newegg_page(content)
+            checkpoint.write_page(1, records, page_count=meta.get('page_count', 1))
+            print('Fetching page 1')
+        page_loop = checkpoint.cursor['page_count']
+        print('Loop through this many pages: ', page_loop)
+
+        # Run this part to get the HTML info from the URL we wanted
+        # and loop it through the pages that we defined earlier
+        # Pages are still requested one at a time, but each is parsed in a worker
+        # process while the next one downloads (here instead when profiling)
+        urls = [page_url(i) for i in range(checkpoint.last_page + 1, page_loop + 1)]
+        pages = iter_parsed(session, urls, partial(parse_page, 'newegg'), workers=1,
+                            parse_workers=0 if profiling.enabled() else None, cache=cache)
+        for i, (_, parsed) in enumerate(pages, start=checkpoint.last_page + 1):
+            records, _ = record_parsed('newegg', parsed)
+            checkpoint.write_page(i, records)
+            print(f'Fetching page {i}')
+    finally:
+        session.close()
+        checkpoint.close()
+    print(f'HTTP cache: {cache.summary()}')
+
+    # Every page is in, publish the CSV and read it back as a dataframe
+    newegg_monitor = checkpoint.finish('newegg')
+
+    # Print out the number of products for easy de-bugging
+    print(len(newegg_monitor))
+    print('Below are the first 10 rows of the fetched data:')
+    print(newegg_monitor.head(10))
     print(f'Data scraped and saved to {csv_path}')
 
+    # Keep the day's listing in the price history store too
+    append_listing(newegg_monitor, 'newegg', date)
+    return newegg_monitor
+
 # Run this function
 if __name__ == '__main__':
-    scrape_newegg_monitor()
\ No newline at end of file
+    # Pass --profile to run it under cProfile and tracemalloc
+    profiling.run_script('scrape_newegg', scrape_newegg_monitor)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# This script runs the whole nightly pipeline in one long-lived Python process
+# scrape -> compare -> combine, handing the DataFrames from stage to stage instead
+# of re-reading index.csv and the daily CSVs, so interpreter start-up and the
+# pandas/numpy/lxml imports are paid once instead of once per script
+#
+# Usage: python3 pipeline.py [--skip-scrape] [--date YYYYMMDD] [--cold-start] [--no-delta] [--profile]
+
+# Import necessary libraries
+import argparse
+import datetime
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import profiling
+
+# Directory paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(script_dir, 'data')
+runs_dir = os.path.join(data_dir, 'pipeline_runs')
+index_path = os.path.join(script_dir, 'index.csv')
+
+# Third-party modules every stage script imports on its own when run cold
+SHARED_IMPORTS = ['numpy', 'pandas', 'requests', 'lxml.etree', 'dotenv']
+
+# Stage modules, in the order the nightly run needs them
+SCRAPERS = {
+    'dell': ('dell_scraper', 'scrape_dell_monitor'),
+    'newegg': ('newegg_scraper', 'scrape_newegg_monitor'),
+    'bestbuy': ('bestbuy_scraper', 'scrape_bestbuy_dell'),
+}
+COMPARE = ('comparison', 'compare_retailers')
+COMBINE = ('Product_page', 'combine_products')
+
+# Daily listing CSV for each source, used when the scrape stage is skipped
+LISTING_FILES = {
+    'dell': 'official_dell_monitor_{date}.csv',
+    'newegg': 'newegg_dell_monitor_{date}.csv',
+    'bestbuy': 'bestbuy_dell_monitor_{date}.csv',
+}
+
+
+# Keeps per-stage import and run timings for the end-of-run report
+# With profile=True every stage runs under cProfile and tracemalloc
+class StageReport:
+    def __init__(self, profile=False):
+        self.stages = []
+        self.profile = profile
+
+    # Function to import a stage's module and time it
+    def load(self, module_name, function_name):
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        import_s = time.perf_counter() - start
+        return getattr(module, function_name), import_s
+
+    # Function to run one stage, recording its timings and outcome
+    def run(self, name, module_name, function_name, **kwargs):
+        entry = {'stage': name, 'module': module_name, 'import_s': 0.0, 'run_s': 0.0, 'status': 'succeeded'}
+        self.stages.append(entry)
+        try:
+            function, entry['import_s'] = self.load(module_name, function_name)
+            start_cpu = time.process_time()
+            start = time.perf_counter()
+            try:
+                if self.profile:
+                    return profiling.profile_stage(name, function, **kwargs)
+                return function(**kwargs)
+            finally:
+                entry['run_s'] = time.perf_counter() - start
+                # process_time() counts every thread, so scrapers running side by side share it
+                entry['cpu_s'] = time.process_time() - start_cpu
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = repr(e)
+            print(f'Stage {name} failed: {e!r}')
+            return None
+        except BaseException:
+            # Ctrl-C or a scheduler's SIGINT stops the whole pipeline, not just this stage
+            entry['status'] = 'interrupted'
+            raise
+        finally:
+            metrics.record_stage(name, entry['run_s'], entry.get('cpu_s', 0.0), entry['status'] == 'succeeded',
+                                 import_s=round(entry['import_s'], 4))
+
+    def skip(self, name, reason):
+        self.stages.append({'stage': name, 'import_s': 0.0, 'run_s': 0.0, 'status': 'skipped', 'error': reason})
+        print(f'Skipping stage {name}: {reason}')
+        metrics.record_stage(name, 0.0, 0.0, False, skipped=reason)
+
+
+# Function to time the third-party imports the stage scripts share
+def time_shared_imports():
+    timings = {}
+    for name in SHARED_IMPORTS:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+# Function to measure what one cold `python3 script.py` launch pays before doing any work
+def measure_cold_start():
+    import subprocess
+    code = 'import ' + ', '.join(SHARED_IMPORTS)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=script_dir)
+    return time.perf_counter() - start
+
+
+# Function to read the daily CSVs once when we are not scraping in this process
+def load_listings(date):
+    from schema import read_csv
+    frames = {}
+    for source, pattern in LISTING_FILES.items():
+        path = os.path.join(data_dir, pattern.format(date=date))
+        if os.path.exists(path):
+            frames[source] = read_csv(path, source)
+        else:
+            print(f'File not found: {path}')
+    return frames
+
+
+def run_pipeline(date, skip_scrape=False, cold_start=False, delta=True, profile=False):
+    report = StageReport(profile)
+    metrics.registry.reset()
+    started = time.perf_counter()
+    started_cpu = time.process_time()
+    shared = time_shared_imports()
+    from schema import read_csv
+
+    # Scrape: the three sites are different hosts, so they run side by side
+    # (one at a time when profiling, so each profile only holds its own stage)
+    if skip_scrape:
+        frames = load_listings(date)
+    else:
+        with ThreadPoolExecutor(max_workers=1 if profile else len(SCRAPERS)) as pool:
+            futures = {source: pool.submit(report.run, f'scrape_{source}', *SCRAPERS[source], date=date)
+                       for source in SCRAPERS}
+            frames = {source: future.result() for source, future in futures.items()}
+        frames = {source: df for source, df in frames.items() if df is not None}
+
+    # Compare: one merge across every retailer, index.csv and Dell read once and shared
+    index = read_csv(index_path, 'index')
+    listings = {source: df for source, df in frames.items() if source != 'dell'}
+    if 'dell' not in frames or not listings:
+        report.skip('compare', 'no Dell data' if 'dell' not in frames else 'no retailer data')
+    else:
+        report.run('compare', *COMPARE, index=index, dell=frames['dell'], listings=listings, date=date,
+                   delta=delta)
+
+    # Combine: every listing straight from memory
+    missing = [source for source in SCRAPERS if source not in frames]
+    if missing:
+        report.skip('combine', f'no data for {", ".join(missing)}')
+    else:
+        report.run('combine', *COMBINE, index=index, dell=frames['dell'],
+                   bestbuy=frames['bestbuy'], newegg=frames['newegg'], date=date)
+
+    summary = {
+        'date': date,
+        'wall_s': round(time.perf_counter() - started, 3),
+        'shared_imports_s': {name: round(seconds, 3) for name, seconds in shared.items()},
+        'stages': [{k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                   for entry in report.stages],
+        'succeeded': all(entry['status'] == 'succeeded' for entry in report.stages),
+    }
+    if cold_start:
+        summary['cold_start_s'] = round(measure_cold_start(), 3)
+    metrics.record_stage('pipeline', summary['wall_s'], time.process_time() - started_cpu, summary['succeeded'])
+    summary['metrics'] = metrics.registry.flush('pipeline')
+    print_report(summary)
+    write_report(summary)
+    return summary
+
+
+# Function to print the start-up and import-time report
+def print_report(summary):
+    shared_total = sum(summary['shared_imports_s'].values())
+    print('\nPipeline report')
+    print(f'  shared imports (paid once): {shared_total:.3f}s  '
+          + ', '.join(f'{name} {seconds:.3f}s' for name, seconds in summary['shared_imports_s'].items()))
+    print(f'  {"stage":<18}{"status":<11}{"import s":>9}{"run s":>9}')
+    for entry in summary['stages']:
+        print(f'  {entry["stage"]:<18}{entry["status"]:<11}{entry["import_s"]:>9.3f}{entry["run_s"]:>9.3f}')
+    print(f'  total wall time: {summary["wall_s"]:.3f}s')
+    if summary['metrics'][0]:
+        print(f'  metrics: {summary["metrics"][0]}, {summary["metrics"][1]}')
+    if 'cold_start_s' in summary:
+        launches = sum(1 for entry in summary['stages'] if entry['status'] != 'skipped')
+        saved = summary['cold_start_s'] * max(launches - 1, 0)
+        print(f'  one cold interpreter launch + imports: {summary["cold_start_s"]:.3f}s, '
+              f'about {saved:.3f}s saved over {launches} separate scripts')
+
+
+# Function to keep the report next to the scheduler's run reports
+def write_report(summary):
+    os.makedirs(runs_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    with open(os.path.join(runs_dir, f'pipeline_py_{stamp}.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+
+def main():
+    current_time = datetime.datetime.now()
+    today = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+
+    parser = argparse.ArgumentParser(description='Run scrape -> compare -> combine in one process')
+    parser.add_argument('--date', default=today, help='date of the CSVs to write/read, YYYYMMDD')
+    parser.add_argument('--skip-scrape', action='store_true', help="reuse the day's scraped CSVs instead of scraping")
+    parser.add_argument('--cold-start', action='store_true',
+                        help='also time one cold interpreter launch to show the saving')
+    parser.add_argument('--no-delta', dest='delta', action='store_false',
+                        help='re-score every comparison row and skip the change log')
+    parser.add_argument('--profile', action='store_true',
+                        help='run every stage under cProfile and tracemalloc, keeping the dumps in data/profiles/')
+    args = parser.parse_args()
+
+    summary = run_pipeline(args.date, skip_scrape=args.skip_scrape, cold_start=args.cold_start,
+                           delta=args.delta, profile=args.profile or profiling.enabled([]))
+    sys.exit(0 if summary['succeeded'] else 1)
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# MAP policy engine
+# Whether a retailer's price is Compliant, Needs Attention or Non-Compliant is
+# decided by the rules in map_policy.csv (or MAP_POLICY) instead of fixed bands.
+# Each rule covers one Dell product at one retailer, a product everywhere, a
+# retailer for every product, or everything, from Start to End (inclusive
+# YYYYMMDD, blank for open-ended):
+#   Map_price    the advertised price floor, blank for Dell's own price that day
+#   Grace        percent below the floor that is still Compliant, e.g. a retailer's agreed tolerance
+#   Tolerance    percent below the floor that is still Needs Attention, anything lower is Non-Compliant
+# A promo window is a rule with a lower Map_price or a wider Grace for a few days.
+# Where rules overlap the most specific wins (product and retailer, product,
+# retailer, everything), then the one that started last, then the later line.
+# Rows no rule covers fall under DEFAULT_RULE, the original bands: at or above
+# Dell's price is Compliant, down to 10% below is Needs Attention.
+#
+# Each level's rules are flattened once into date segments that do not overlap,
+# so classifying any number of rows is one sorted as-of join per level and a
+# single np.select, fast enough to re-evaluate the whole price history against
+# a proposed policy.
+#
+# Usage: python3 policy.py check [--policy map_policy.csv]     validate the rules and show how they flatten
+#        python3 policy.py whatif proposed.csv [--start YYYYMMDD] [--end YYYYMMDD] [--retailer bestbuy]
+
+# Import necessary libraries
+import argparse
+import datetime
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from retailers import RETAILERS
+from schema import STATUS, STATUS_DTYPE, UNDETERMINED, read_csv
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+policy_dir = os.path.join(data_dir, 'policy')
+policy_path = os.getenv('MAP_POLICY', os.path.join(script_dir, 'map_policy.csv'))
+
+# Most specific first, the keys a rule sets at each level
+LEVELS = [['Dell_product', 'Retailer'], ['Dell_product'], ['Retailer'], []]
+# Dates are compared as YYYYMMDD integers, blank ends are open
+OPEN_START, OPEN_END = 0, 99991231
+DAY_SPAN = 10 ** 8
+DEFAULT_RULE = {'Grace': 0.0, 'Tolerance': 10.0}
+TERMS = ['Map_price', 'Grace', 'Tolerance']
+
+
+# Function to read the rules, numbered by their line in the file (rule 0 is the default)
+# Raises ValueError naming the line of a rule that cannot be applied
+def load_rules(path=None):
+    path = path or policy_path
+    default = pd.DataFrame([{'Dell_product': None, 'Retailer': None, 'Start': OPEN_START, 'End': OPEN_END,
+                             'Map_price': np.nan, **DEFAULT_RULE, 'Note': 'default', 'rule': 0}])
+    if not os.path.exists(path):
+        return default
+    rules = read_csv(path, 'policy')
+    rules = rules.reindex(columns=list(default.columns)[:-1]).assign(rule=np.arange(2, len(rules) + 2))
+    for column in ['Dell_product', 'Retailer']:
+        values = rules[column].str.strip()
+        rules[column] = values.where(values != '').astype(object)
+    for column, open_end in [('Start', OPEN_START), ('End', OPEN_END)]:
+        rules[column] = pd.to_numeric(rules[column], errors='raise').fillna(open_end).astype('int64')
+    rules['Grace'] = rules['Grace'].fillna(DEFAULT_RULE['Grace'])
+    rules['Tolerance'] = rules['Tolerance'].fillna(DEFAULT_RULE['Tolerance'])
+
+    problems = [
+        (~rules['Retailer'].isin(list(RETAILERS)) & rules['Retailer'].notna(), 'unknown retailer'),
+        (rules['Start'] > rules['End'], 'Start is after End'),
+        (rules['Map_price'] <= 0, 'Map_price must be positive'),
+        (rules['Grace'] < 0, 'Grace must not be negative'),
+        (rules['Tolerance'] < rules['Grace'], 'Tolerance must be at least Grace'),
+    ]
+    for bad, reason in problems:
+        if bad.any():
+            raise ValueError(f'{path} line {rules.loc[bad, "rule"].iloc[0]}: {reason}')
+    return pd.concat([default, rules], ignore_index=True)
+
+
+# Function to flatten one level's rules into non-overlapping date segments per key
+# Every boundary where a rule starts or ends opens a segment, given to the rule
+# in force there: the latest start among the rules covering it, then the later line
+def flatten(rules, keys):
+    rules = rules.sort_values(['Start', 'rule'], kind='stable')
+    groups = rules.groupby(keys, sort=False).indices if keys else {None: np.arange(len(rules))}
+    all_starts, all_ends = rules['Start'].to_numpy(), rules['End'].to_numpy()
+    picked, lows, highs = [], [], []
+    for positions in groups.values():
+        starts, ends = all_starts[positions], all_ends[positions]
+        bounds = np.unique(np.concatenate([starts, ends + 1]))
+        lo, hi = bounds[:-1], bounds[1:] - 1
+        covers = (starts[None, :] <= lo[:, None]) & (ends[None, :] >= lo[:, None])
+        # The last covering column is the winner, rules being in (Start, line) order
+        winner = covers.shape[1] - 1 - np.argmax(covers[:, ::-1], axis=1)
+        found = covers.any(axis=1)
+        picked.append(positions[winner[found]])
+        lows.append(lo[found])
+        highs.append(hi[found])
+    segments = rules.iloc[np.concatenate(picked)].assign(Start=np.concatenate(lows), End=np.concatenate(highs))
+    segments = segments[keys + ['Start', 'End'] + TERMS + ['rule']]
+    for key in keys:
+        segments[key] = segments[key].astype(str)
+    return segments.reset_index(drop=True)
+
+
+# Function to turn dates into YYYYMMDD integers, one per row
+# Accepts one date for every row, or a column of 'YYYYMMDD' text or datetimes
+def day_numbers(dates, rows):
+    if dates is None or np.ndim(dates) == 0:
+        return np.full(rows, int(pd.Timestamp(str(dates or datetime.date.today())).strftime('%Y%m%d')))
+    dates = pd.Series(dates)
+    if pd.api.types.is_datetime64_any_dtype(dates.dtype):
+        return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy('int64')
+    # Histories repeat a few hundred dates, convert each once
+    codes, distinct = pd.factorize(dates.astype(str))
+    return pd.to_numeric(pd.Index(distinct).str.replace('-', '')).to_numpy('int64')[codes]
+
+
+# A loaded policy, flattened once and applied to any number of rows
+# Each level's segments are sorted on one integer, their key's code then their start
+# date, so finding a row's segment is a binary search instead of a join on text
+class MapPolicy:
+    def __init__(self, rules):
+        self.rules = rules
+        self.levels = []
+        scoped = rules[['Dell_product', 'Retailer']].notna()
+        for keys in LEVELS:
+            at_level = rules[(scoped == [column in keys for column in scoped.columns]).all(axis=1)]
+            if at_level.empty:
+                continue
+            segments = flatten(at_level, keys)
+            values = {key: pd.Index(segments[key].unique()) for key in keys}
+            code = np.zeros(len(segments), dtype='int64')
+            for key in keys:
+                code = code * len(values[key]) + values[key].get_indexer(segments[key])
+            position = code * DAY_SPAN + segments['Start'].to_numpy('int64')
+            order = np.argsort(position, kind='stable')
+            self.levels.append({'keys': keys, 'segments': segments, 'values': values,
+                                'code': code[order], 'position': position[order],
+                                'end': segments['End'].to_numpy('int64')[order],
+                                'terms': {term: segments[term].to_numpy('float64')[order]
+                                          for term in TERMS + ['rule']}})
+
+    # Function to find the rule in force for every row: its floor (NaN for Dell's price), grace, tolerance and line
+    def resolve(self, df, dates=None):
+        rows = len(df)
+        days = day_numbers(dates, rows)
+        terms = {term: np.full(rows, np.nan) for term in TERMS + ['rule']}
+        settled = np.zeros(rows, dtype=bool)
+        # Each key column is factorized once, its distinct values are looked up per level
+        distinct = {key: pd.factorize(df[key]) for key in {key for level in self.levels for key in level['keys']}}
+        for level in self.levels:
+            code = np.zeros(rows, dtype='int64')
+            known = ~settled
+            for key in level['keys']:
+                codes, values = distinct[key]
+                lookup = np.append(level['values'][key].get_indexer(pd.Index(values).astype(str)), -1)
+                key_code = lookup[codes]
+                known &= key_code >= 0
+                code = code * len(level['values'][key]) + key_code
+            candidates = np.flatnonzero(known)
+            code, day = code[candidates], days[candidates]
+            # The last segment of the same key starting on or before the row's day, if it has not ended
+            at = np.searchsorted(level['position'], code * DAY_SPAN + day, side='right') - 1
+            segment = at.clip(0)
+            hit = (at >= 0) & (level['code'][segment] == code) & (level['end'][segment] >= day)
+            matched, segment = candidates[hit], segment[hit]
+            for term in terms:
+                terms[term][matched] = level['terms'][term][segment]
+            settled[matched] = True
+        terms['rule'] = np.where(settled, terms['rule'], -1).astype('int64')
+        return pd.DataFrame(terms, index=df.index)
+
+    # Function to classify every row of a comparison frame (Dell_product, Retailer, Retailer_price, Dell_price)
+    def classify(self, df, dates=None):
+        terms = self.resolve(df, dates)
+        floor = terms['Map_price'].fillna(df['Dell_price'])
+        gap = ((df['Retailer_price'] - floor) / floor * 100).to_numpy()
+        conditions = [
+            (gap >= -terms['Grace'].to_numpy()),
+            (gap >= -terms['Tolerance'].to_numpy()),
+            (gap < -terms['Tolerance'].to_numpy())
+        ]
+        # Select category codes rather than labels, millions of status strings would cost more than the rest
+        codes = np.select(conditions, [STATUS_DTYPE.categories.get_loc(status) for status in STATUS],
+                          default=STATUS_DTYPE.categories.get_loc(UNDETERMINED))
+        return pd.Categorical.from_codes(codes, dtype=STATUS_DTYPE)
+
+
+# Function to load the policy in force, or the default bands when there is no policy file
+def load_policy(path=None):
+    return MapPolicy(load_rules(path))
+
+
+# Function to re-evaluate the comparison history under a proposed policy
+# Returns every row whose status would change, with its status under the current and the proposed rules
+def whatif(proposed, start=None, end=None, retailers=None, source='auto'):
+    from price_analytics import load_history
+    history = load_history(start, end, retailers, source)
+    started = time.perf_counter()
+    current = load_policy().classify(history, history['date'])
+    new_policy = load_policy(proposed)
+    terms = new_policy.resolve(history, history['date'])
+    changed_to = new_policy.classify(history, history['date'])
+    elapsed = time.perf_counter() - started
+    print(f'Re-evaluated {len(history)} comparisons from {history["date"].nunique()} days in {elapsed:.2f}s')
+
+    moved = np.asarray(current != changed_to)
+    table = pd.crosstab([history['Retailer'], pd.Series(current, name='Current', index=history.index)],
+                        pd.Series(changed_to, name='Proposed', index=history.index), dropna=False)
+    print(table[(table.sum(axis=1) > 0)].to_string())
+    return history.loc[moved, ['date', 'Retailer', 'Dell_product', 'sku', 'Retailer_price', 'Dell_price']].assign(
+        Current=current[moved], Proposed=changed_to[moved], Rule=terms.loc[moved, 'rule'].astype(int))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the MAP policy or test a proposed one against history')
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help='validate the rules and show their flattened segments')
+    check.add_argument('--policy', default=policy_path)
+    proposal = commands.add_parser('whatif', help='re-evaluate the comparison history under a proposed policy')
+    proposal.add_argument('policy', help='the proposed policy CSV')
+    proposal.add_argument('--start')
+    proposal.add_argument('--end')
+    proposal.add_argument('--retailer', choices=list(RETAILERS))
+    proposal.add_argument('--source', choices=['auto', 'store', 'db', 'csv'], default='auto')
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        policy = load_policy(args.policy)
+        print(f'{len(policy.rules) - 1} rules in {args.policy}')
+        for level in policy.levels:
+            print(f'\n{" and ".join(level["keys"]) or "every product"}: {len(level["segments"])} segments')
+            print(level['segments'].to_string(index=False))
+        return
+
+    changes = whatif(args.policy, args.start, args.end, [args.retailer] if args.retailer else None, args.source)
+    os.makedirs(policy_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    save_path = os.path.join(policy_dir, f'whatif_{stamp}.csv')
+    changes.to_csv(save_path, index=False)
+    print(f'{len(changes)} comparisons would change status, saved to {save_path}')
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
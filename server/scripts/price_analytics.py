@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Price history analytics
+# Loads every dated comparison (from the Parquet history store, the SQLite
+# store or the dated comparison CSVs) into one long frame, one row per
+# retailer, Dell product and day, and answers the questions a single day's
+# files cannot:
+#   violation streaks    how long each product has been Non-Compliant at each retailer
+#   rolling deviation    7- and 30-day mean deviation per product and per retailer
+#   first / last seen    when each product was first and last compared at a retailer
+#   time to fix          days from a product going Non-Compliant to its next non-violating snapshot
+# Everything is computed with grouped column operations, so a year of daily
+# snapshots across thousands of products takes seconds.
+#
+# Usage: python3 price_analytics.py [--start YYYYMMDD] [--end YYYYMMDD] [--retailer bestbuy] [--source csv]
+
+# Import necessary libraries
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from retailers import RETAILERS
+from schema import read_csv
+from schema import apply as apply_schema
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+analytics_dir = os.path.join(data_dir, 'analytics')
+
+# A product at a retailer, tracked from day to day
+PRODUCT_KEY = ['Retailer', 'Dell_product']
+VIOLATION = 'Non-Compliant'
+WINDOWS = {'7d': '7D', '30d': '30D'}
+HISTORY_COLUMNS = ['date', 'Retailer', 'Dell_product', 'sku', 'Retailer_price', 'Dell_price', 'Deviation', 'Status']
+SOURCES = ['auto', 'store', 'db', 'csv']
+
+
+# Function to read comparisons from the Parquet price history store
+def _from_store(start, end, retailers):
+    from price_store import query
+    return query('comparisons', start, end, retailers=retailers).rename(columns={'retailer': 'Retailer'})
+
+
+# Function to read comparisons from the SQLite serving store
+def _from_db(start, end, retailers):
+    from price_db import comparison_history
+    return comparison_history(start, end, retailers).rename(columns={
+        'retailer': 'Retailer', 'dell_product': 'Dell_product', 'retailer_price': 'Retailer_price',
+        'dell_price': 'Dell_price', 'deviation': 'Deviation', 'status': 'Status'})
+
+
+# Function to read the dated comparison CSVs in data/
+def _from_csv(start, end, retailers):
+    frames = []
+    for retailer in retailers:
+        label = RETAILERS[retailer]
+        for path in sorted(glob.glob(os.path.join(data_dir, f'{retailer}_comparison_*.csv'))):
+            day = path[-12:-4]
+            if not day.isdigit() or (start and day < start) or (end and day > end):
+                continue
+            df = read_csv(path, 'comparison').rename(columns={f'{label}_price': 'Retailer_price'})
+            frames.append(df.assign(date=day, Retailer=retailer))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=HISTORY_COLUMNS)
+
+
+HISTORY_SOURCES = {'store': _from_store, 'db': _from_db, 'csv': _from_csv}
+
+
+# Function to load the comparison history as one long frame sorted by retailer, product and day
+# source='auto' takes the first of the Parquet store, SQLite store and dated CSVs that has any rows
+def load_history(start=None, end=None, retailers=None, source='auto'):
+    retailers = list(retailers or RETAILERS)
+    start, end = (str(d) if d else None for d in (start, end))
+    for name in (['store', 'db', 'csv'] if source == 'auto' else [source]):
+        try:
+            df = HISTORY_SOURCES[name](start, end, retailers)
+        except (OSError, ValueError) as e:
+            print(f'Unable to read comparison history from the {name}: {e}')
+            continue
+        if not df.empty:
+            break
+    return prepare(df)
+
+
+# Function to type a comparison history frame and put it in (retailer, product, day) order
+# Each (retailer, product) gets a product_id, numbered in that order, to group on
+# A product compared twice on one day keeps its first row
+def prepare(df):
+    df = apply_schema(df.reindex(columns=HISTORY_COLUMNS), 'comparison')
+    # A year of history has a few hundred distinct days, parse each once
+    codes, days = pd.factorize(df['date'].astype(str))
+    df['date'] = pd.to_datetime(pd.Index(days), format='%Y%m%d').take(codes)
+    df = df.sort_values(PRODUCT_KEY + ['date'], kind='stable')
+    df['product_id'] = df.groupby(PRODUCT_KEY, observed=True, sort=False).ngroup().to_numpy()
+    ids, dates = df['product_id'].to_numpy(), df['date'].to_numpy()
+    keep = np.ones(len(df), dtype=bool)
+    keep[1:] = (ids[1:] != ids[:-1]) | (dates[1:] != dates[:-1])
+    return df[keep].reset_index(drop=True)
+
+
+# Function to find every violation episode: a run of Non-Compliant snapshots of one product on consecutive days
+# A missing day ends the run, what happened in between is unknown, so one episode never spans a gap
+# An episode is fixed on the product's next snapshot after it, if that is not Non-Compliant (after a gap,
+# the first day it was seen fixed), and open if it runs to the product's last snapshot
+# Returns one row per episode: start, end, days, open and, once fixed, fixed_on and days_to_fix
+def violation_episodes(history):
+    ids = history['product_id'].to_numpy()
+    dates = history['date'].to_numpy()
+    violating = (history['Status'] == VIOLATION).to_numpy()
+    same_product = ids[1:] == ids[:-1]
+    next_day = same_product & (dates[1:] - dates[:-1] == np.timedelta64(1, 'D'))
+    starts = violating.copy()
+    starts[1:] &= ~(violating[:-1] & next_day)
+    ends = violating.copy()
+    ends[:-1] &= ~(violating[1:] & next_day)
+    first_rows, last_rows = np.flatnonzero(starts), np.flatnonzero(ends)
+
+    # The snapshot after an episode's last row, when it is the same product's, decides how it ended:
+    # not Non-Compliant is the day it was fixed, Non-Compliant again (after a gap) leaves it unknown
+    followed = last_rows + 1 < len(history)
+    followed[followed] = same_product[last_rows[followed]]
+    fixed = followed.copy()
+    fixed[fixed] = ~violating[last_rows[fixed] + 1]
+    fixed_on = np.full(len(last_rows), np.datetime64('NaT'), dtype=dates.dtype)
+    fixed_on[fixed] = dates[last_rows[fixed] + 1]
+
+    episodes = pd.DataFrame({
+        'product_id': ids[first_rows],
+        'Retailer': history['Retailer'].take(first_rows).to_numpy(),
+        'Dell_product': history['Dell_product'].take(first_rows).to_numpy(),
+        'start': dates[first_rows],
+        'end': dates[last_rows],
+        'snapshots': last_rows - first_rows + 1,
+        'open': ~followed,
+        'fixed_on': fixed_on,
+    })
+    episodes.insert(6, 'days', (episodes['end'] - episodes['start']).dt.days + 1)
+    episodes['days_to_fix'] = (episodes['fixed_on'] - episodes['start']).dt.days
+    return episodes
+
+
+# Function to add each product's rolling 7- and 30-day mean deviation to a prepared history
+# Windows are calendar days, so a day the product was not compared just drops out of the mean
+def rolling_deviation(history):
+    rolled = history[['product_id', 'date', 'Deviation']].groupby('product_id', sort=False)
+    for name, window in WINDOWS.items():
+        means = rolled.rolling(window, on='date')['Deviation'].mean()
+        # Products come back in the history's own order, so the values line up row for row
+        history[f'deviation_{name}'] = means.to_numpy()
+    return history
+
+
+# Function to summarise every (retailer, product): first and last seen, current and longest
+# violation streak, how often it was fixed and how fast, and its latest rolling deviation
+def product_summary(history, episodes=None):
+    episodes = violation_episodes(history) if episodes is None else episodes
+    if 'deviation_7d' not in history:
+        history = rolling_deviation(history)
+    # The history is in product order, so each product's first and last snapshot are plain positions
+    ids = history['product_id'].to_numpy()
+    first_rows = np.flatnonzero(np.diff(ids, prepend=-1) != 0)
+    last_rows = np.r_[first_rows[1:], len(history)][:len(first_rows)] - 1
+    violating = (history['Status'] == VIOLATION).to_numpy()
+    last = history.take(last_rows)
+    summary = pd.DataFrame({
+        'Retailer': last['Retailer'].array,
+        'Dell_product': last['Dell_product'].array,
+        'sku': last['sku'].array,
+        'first_seen': history['date'].to_numpy()[first_rows],
+        'last_seen': last['date'].to_numpy(),
+        'snapshots': last_rows - first_rows + 1,
+        'violation_snapshots': np.add.reduceat(violating, first_rows) if len(history) else first_rows,
+        'status': last['Status'].array,
+        'deviation': last['Deviation'].to_numpy(),
+        'deviation_7d': last['deviation_7d'].to_numpy(),
+        'deviation_30d': last['deviation_30d'].to_numpy(),
+    }, index=ids[first_rows])
+
+    by_product = episodes.groupby('product_id')
+    summary['violations'] = by_product.size()
+    summary['fixes'] = by_product['days_to_fix'].count()
+    summary['longest_streak_days'] = by_product['days'].max()
+    summary['median_days_to_fix'] = by_product['days_to_fix'].median()
+    # The current streak is the episode still open on the product's last snapshot
+    open_episodes = episodes[episodes['open']].set_index('product_id')
+    summary['current_streak_days'] = open_episodes['days']
+    summary['violating_since'] = open_episodes['start']
+    for column in ['violations', 'fixes', 'longest_streak_days', 'current_streak_days']:
+        summary[column] = summary[column].fillna(0).astype(int)
+    return summary.reset_index(drop=True)
+
+
+# Function to follow each retailer day by day: products compared, violations, mean deviation
+# and its rolling 7- and 30-day means
+def retailer_trend(history):
+    daily = history.assign(violating=history['Status'] == VIOLATION).groupby(
+        ['Retailer', 'date'], observed=True).agg(products=('Dell_product', 'size'),
+                                                 violations=('violating', 'sum'),
+                                                 mean_deviation=('Deviation', 'mean')).reset_index()
+    rolled = daily.groupby('Retailer', observed=True, sort=False)
+    for name, window in WINDOWS.items():
+        daily[f'mean_deviation_{name}'] = rolled.rolling(window, on='date')['mean_deviation'].mean().to_numpy()
+    daily['violation_rate'] = (daily['violations'] / daily['products'] * 100).round(2)
+    return daily
+
+
+# Function to sum up each retailer: products tracked, open violations and how long they have run,
+# and the median time to fix across every fixed episode
+def retailer_summary(summary, episodes):
+    latest = summary['last_seen'] == summary.groupby('Retailer', observed=True)['last_seen'].transform('max')
+    current = summary[latest]
+    fixed = episodes.dropna(subset=['days_to_fix'])
+    return pd.DataFrame({
+        'products': summary.groupby('Retailer', observed=True).size(),
+        'open_violations': (current['current_streak_days'] > 0).groupby(current['Retailer'], observed=True).sum(),
+        'median_open_streak_days': current.loc[current['current_streak_days'] > 0].groupby(
+            'Retailer', observed=True)['current_streak_days'].median(),
+        'longest_open_streak_days': current.groupby('Retailer', observed=True)['current_streak_days'].max(),
+        'fixed_episodes': fixed.groupby('Retailer', observed=True).size(),
+        'median_days_to_fix': fixed.groupby('Retailer', observed=True)['days_to_fix'].median(),
+        'deviation_7d': current.groupby('Retailer', observed=True)['deviation_7d'].mean().round(2),
+        'deviation_30d': current.groupby('Retailer', observed=True)['deviation_30d'].mean().round(2),
+    }).fillna({'open_violations': 0, 'fixed_episodes': 0}).astype({'open_violations': int, 'fixed_episodes': int})
+
+
+# Function to run every analysis over a stretch of history
+# Returns (product summary, violation episodes, retailer trend, retailer summary)
+def analyze(history):
+    history = rolling_deviation(history)
+    episodes = violation_episodes(history)
+    summary = product_summary(history, episodes)
+    return summary, episodes, retailer_trend(history), retailer_summary(summary, episodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Violation streaks, rolling deviation and time to fix')
+    parser.add_argument('--start', help='first day to include, YYYYMMDD')
+    parser.add_argument('--end', help='last day to include, YYYYMMDD')
+    parser.add_argument('--retailer', action='append', choices=list(RETAILERS))
+    parser.add_argument('--source', choices=SOURCES, default='auto', help='where to read the history from')
+    parser.add_argument('--top', type=int, default=10, help='how many of the longest open violations to list')
+    args = parser.parse_args()
+
+    history = load_history(args.start, args.end, args.retailer, args.source)
+    if history.empty:
+        raise SystemExit('No comparison history found, run comparison.py first')
+    summary, episodes, trend, retailers = analyze(history)
+
+    last = history['date'].max().strftime('%Y%m%d')
+    os.makedirs(analytics_dir, exist_ok=True)
+    outputs = {'product_summary': summary, 'violation_episodes': episodes, 'retailer_trend': trend}
+    for name, df in outputs.items():
+        save_path = os.path.join(analytics_dir, f'{name}_{last}.csv')
+        df.to_csv(save_path, index=False, date_format='%Y%m%d')
+        print(f'{name} saved to {save_path}')
+
+    print(f'\n{history["date"].nunique()} days of history, {history["date"].min():%Y%m%d} to {last}')
+    print(retailers.to_string())
+    open_now = summary[summary['current_streak_days'] > 0].nlargest(args.top, 'current_streak_days')
+    if not open_now.empty:
+        print('\nLongest open violations:')
+        print(open_now[PRODUCT_KEY + ['violating_since', 'current_streak_days', 'deviation', 'deviation_7d']]
+              .to_string(index=False))
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
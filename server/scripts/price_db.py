@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# SQLite serving store for the pricing data
+# The combine stage loads each day's products, listings and prices, and the
+# compare stage loads each day's comparison results, in one transaction per
+# day so a rerun simply replaces that day. Comparisons are indexed on
+# (date, retailer, status) and on the Dell product, so the dashboard's
+# questions are indexed lookups instead of full CSV parses.
+#
+# Usage: python3 price_db.py summary [--date YYYYMMDD]
+#        python3 price_db.py status Non-Compliant [--retailer bestbuy]
+#        python3 price_db.py below -10 [--retailer newegg]
+#        python3 price_db.py history "Dell 22 Monitor - P2222H"
+#        python3 price_db.py import                 load everything already in the price history store
+
+# Import necessary libraries
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from retailers import RETAILERS
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+db_path = os.getenv('PRICE_DB', os.path.join(data_dir, 'prices.sqlite'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    dell_product TEXT PRIMARY KEY,
+    dell_product_id TEXT,
+    dell_link TEXT
+);
+CREATE TABLE IF NOT EXISTS listings (
+    retailer TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    name TEXT,
+    link TEXT,
+    PRIMARY KEY (retailer, sku)
+);
+CREATE TABLE IF NOT EXISTS daily_prices (
+    date TEXT NOT NULL,
+    retailer TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    price REAL,
+    PRIMARY KEY (date, retailer, sku)
+);
+CREATE TABLE IF NOT EXISTS comparisons (
+    date TEXT NOT NULL,
+    retailer TEXT NOT NULL,
+    dell_product TEXT NOT NULL,
+    sku TEXT,
+    retailer_price REAL,
+    dell_price REAL,
+    price_dif REAL,
+    deviation REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS comparisons_date_retailer_status ON comparisons (date, retailer, status);
+CREATE INDEX IF NOT EXISTS comparisons_product ON comparisons (dell_product, date);
+CREATE INDEX IF NOT EXISTS daily_prices_sku ON daily_prices (retailer, sku, date);
+"""
+
+# Where each site's listing columns map to (sku, name, price, link), Dell is keyed on its product name
+LISTING_COLUMNS = {'dell': ('Dell_product', 'Dell_product', 'Dell_price', 'Dell_link')}
+for _retailer, _label in RETAILERS.items():
+    LISTING_COLUMNS[_retailer] = (f'{_label}_sku', f'{_label}_name', f'{_label}_price', f'{_label}_link')
+
+
+# Function to open the database, creating the tables and indexes on first use
+def connect(path=None):
+    path = path or db_path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Function to turn a column into plain Python values, NaN becoming NULL
+def _values(series, numeric=False):
+    if numeric:
+        series = pd.to_numeric(series, errors='coerce')
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _text(series):
+    return [None if v is None else str(v) for v in _values(series)]
+
+
+# Function to load one day's scraped listings: Dell's products and every retailer's listings and prices
+#   frames: {'dell': Dell's listing, 'bestbuy': ..., 'newegg': ...}
+def load_listings(frames, date, path=None):
+    with closing(connect(path)) as conn, conn:
+        for source, df in frames.items():
+            if df is None or source not in LISTING_COLUMNS:
+                continue
+            sku, name, price, link = (df[c] if c in df else pd.Series([None] * len(df)) for c in LISTING_COLUMNS[source])
+            if source == 'dell':
+                product_id = df['Dell_product_id'] if 'Dell_product_id' in df else pd.Series([None] * len(df))
+                conn.executemany(
+                    'INSERT INTO products (dell_product, dell_product_id, dell_link) VALUES (?, ?, ?) '
+                    'ON CONFLICT (dell_product) DO UPDATE SET dell_product_id = excluded.dell_product_id, '
+                    'dell_link = excluded.dell_link',
+                    zip(_text(name), _text(product_id), _text(link)))
+            else:
+                conn.executemany(
+                    'INSERT INTO listings (retailer, sku, name, link) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (retailer, sku) DO UPDATE SET name = excluded.name, link = excluded.link',
+                    ((source, s, n, l) for s, n, l in zip(_text(sku), _text(name), _text(link)) if s is not None))
+            conn.execute('DELETE FROM daily_prices WHERE date = ? AND retailer = ?', (date, source))
+            conn.executemany(
+                'INSERT OR REPLACE INTO daily_prices (date, retailer, sku, price) VALUES (?, ?, ?, ?)',
+                ((date, source, s, p) for s, p in zip(_text(sku), _values(price, numeric=True)) if s is not None))
+
+
+# Function to load one day's comparison results from the comparison engine's long frame
+def load_comparisons(df, date, path=None):
+    with closing(connect(path)) as conn, conn:
+        for retailer, rows in df.groupby('Retailer', sort=False, observed=True):
+            conn.execute('DELETE FROM comparisons WHERE date = ? AND retailer = ?', (date, retailer))
+            conn.executemany(
+                'INSERT INTO comparisons (date, retailer, dell_product, sku, retailer_price, dell_price, '
+                'price_dif, deviation, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                zip([date] * len(rows), [retailer] * len(rows), _text(rows['Dell_product']),
+                    _text(rows['sku']) if 'sku' in rows else [None] * len(rows),
+                    _values(rows['Retailer_price'], True), _values(rows['Dell_price'], True),
+                    _values(rows['Price_dif'], True), _values(rows['Deviation'], True), _text(rows['Status'])))
+
+
+def _query(sql, params=(), path=None):
+    with closing(connect(path)) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+# Function to find the most recent date with comparisons
+def latest_date(path=None):
+    df = _query('SELECT MAX(date) AS date FROM comparisons', path=path)
+    return df['date'].iloc[0]
+
+
+# Function to answer the dashboard's summary: per-retailer totals, compliance rate and average deviation
+def retailer_summary(date=None, path=None):
+    date = date or latest_date(path)
+    return _query(
+        "SELECT retailer, COUNT(*) AS total_products, "
+        "SUM(status = 'Compliant') AS compliant_products, "
+        "SUM(status != 'Compliant') AS total_deviated_products, "
+        "ROUND(100.0 * SUM(status = 'Compliant') / COUNT(*), 2) AS compliance_rate, "
+        "ROUND(AVG(deviation), 2) AS average_deviation "
+        "FROM comparisons WHERE date = ? GROUP BY retailer ORDER BY retailer",
+        (date,), path)
+
+
+# Function to list a day's products with a given status, worst deviation first
+def products_by_status(status, date=None, retailer=None, path=None):
+    date = date or latest_date(path)
+    retailers = [retailer] if retailer else list(RETAILERS)
+    return _query(
+        'SELECT retailer, dell_product, dell_price, retailer_price, deviation, status FROM comparisons '
+        f'WHERE date = ? AND retailer IN ({",".join("?" * len(retailers))}) AND status = ? '
+        'ORDER BY deviation',
+        (date, *retailers, status), path)
+
+
+# Function to list a day's products priced at least `threshold` percent off Dell's price (e.g. -10)
+def products_below(threshold, date=None, retailer=None, path=None):
+    date = date or latest_date(path)
+    retailers = [retailer] if retailer else list(RETAILERS)
+    return _query(
+        'SELECT retailer, dell_product, dell_price, retailer_price, deviation, status FROM comparisons '
+        f'WHERE date = ? AND retailer IN ({",".join("?" * len(retailers))}) AND deviation <= ? '
+        'ORDER BY deviation',
+        (date, *retailers, threshold), path)
+
+
+# Function to show one Dell product's comparison history across days and retailers
+def product_history(dell_product, retailer=None, path=None):
+    sql = ('SELECT date, retailer, dell_price, retailer_price, deviation, status FROM comparisons '
+           'WHERE dell_product = ?')
+    params = [dell_product]
+    if retailer:
+        sql += ' AND retailer = ?'
+        params.append(retailer)
+    return _query(sql + ' ORDER BY date, retailer', params, path)
+
+
+# Function to read every comparison between two dates (inclusive YYYYMMDD bounds), e.g. for price_analytics.py
+def comparison_history(start=None, end=None, retailers=None, path=None):
+    sql = ('SELECT date, retailer, dell_product, sku, retailer_price, dell_price, deviation, status '
+           'FROM comparisons WHERE 1 = 1')
+    params = []
+    if start:
+        sql += ' AND date >= ?'
+        params.append(str(start))
+    if end:
+        sql += ' AND date <= ?'
+        params.append(str(end))
+    if retailers:
+        sql += f' AND retailer IN ({",".join("?" * len(retailers))})'
+        params.extend(retailers)
+    return _query(sql, params, path)
+
+
+# Function to backfill the database from the Parquet price history store
+def import_history(path=None):
+    from price_store import query
+    listings = query('listings')
+    for (date, retailer), rows in listings.groupby(['date', 'retailer']):
+        sku, name, price, link = LISTING_COLUMNS[retailer]
+        frame = pd.DataFrame({sku: rows['sku'], name: rows['name'], price: rows['price'], link: rows['link']})
+        load_listings({retailer: frame}, date, path)
+    comparisons = query('comparisons').rename(columns={'retailer': 'Retailer'})
+    for date, rows in comparisons.groupby('date'):
+        load_comparisons(rows, date, path)
+    print(f'Imported {listings["date"].nunique()} days of listings and '
+          f'{comparisons["date"].nunique()} days of comparisons into {path or db_path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the SQLite pricing store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary = commands.add_parser('summary', help='per-retailer totals for a day')
+    summary.add_argument('--date')
+    status = commands.add_parser('status', help='products with a status, worst first')
+    status.add_argument('status', choices=['Compliant', 'Needs Attention', 'Non-Compliant'])
+    below = commands.add_parser('below', help='products at or below a deviation percentage')
+    below.add_argument('threshold', type=float)
+    for command in (status, below):
+        command.add_argument('--date')
+        command.add_argument('--retailer', choices=list(RETAILERS))
+    history = commands.add_parser('history', help="one Dell product's comparisons over time")
+    history.add_argument('dell_product')
+    history.add_argument('--retailer', choices=list(RETAILERS))
+    commands.add_parser('import', help='backfill from the Parquet price history store')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_history()
+        return
+    if args.command == 'summary':
+        df = retailer_summary(args.date)
+    elif args.command == 'status':
+        df = products_by_status(args.status, args.date, args.retailer)
+    elif args.command == 'below':
+        df = products_below(args.threshold, args.date, args.retailer)
+    else:
+        df = product_history(args.dell_product, args.retailer)
+    print(df.to_string(index=False))
+    print(f'{len(df)} rows')
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cross-retailer price matrix
+# The day's prices as one float array, products x sources (Dell first, then each
+# retailer), NaN where a product is not sold, with dictionaries from product name
+# and from source to row and column. Built once from index.csv and the listings,
+# it answers the cross-retailer questions with array operations over the whole
+# catalogue, and any single product or price is an O(1) lookup:
+#   lowest()      lowest price of each product and who has it
+#   spread()      highest minus lowest price across everyone selling it
+#   undercuts()   every retailer price below Dell's, by how much
+#   coverage()    how many of Dell's products each source sells
+# 'Not sold in this retailer' is only written in when the table is rendered.
+#
+# Usage: python3 price_matrix.py [--date YYYYMMDD] [--product NAME] [--top 10]
+
+# Import necessary libraries
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from retailers import RETAILERS
+from schema import read_csv
+from schema import apply as apply_schema
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+# Column prefix of every source, Dell included
+LABELS = {'dell': 'Dell', **RETAILERS}
+NOT_SOLD = 'Not sold in this retailer'
+
+
+class PriceMatrix:
+    def __init__(self, products, sources, prices):
+        self.names = np.asarray(products, dtype=object)
+        self.sources = list(sources)
+        self.prices = np.asarray(prices, dtype='float64')
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.columns = {source: column for column, source in enumerate(self.sources)}
+
+    # Function to look up one price, NaN when the source does not sell the product
+    def price(self, product, source):
+        return self.prices[self.rows[product], self.columns[source]]
+
+    # Function to pick the columns of some sources (every source by default)
+    def _select(self, sources=None):
+        if sources is None:
+            return self.prices, np.asarray(self.sources, dtype=object)
+        return self.prices[:, [self.columns[s] for s in sources]], np.asarray(sources, dtype=object)
+
+    # Function to find the lowest price of every product and the source that has it
+    # Ties go to the earlier source, so Dell wins a tie with a retailer
+    def lowest(self, sources=None):
+        prices, names = self._select(sources)
+        lowest = np.fmin.reduce(prices, axis=1, initial=np.nan)
+        at = names[np.where(np.isnan(prices), np.inf, prices).argmin(axis=1)]
+        return pd.DataFrame({'Dell_product': self.names, 'Lowest_price': lowest,
+                             'Lowest_at': np.where(np.isnan(lowest), None, at)})
+
+    # Function to work out every product's spread: highest minus lowest price among the sources selling it
+    def spread(self, sources=None):
+        prices, _ = self._select(sources)
+        lowest = np.fmin.reduce(prices, axis=1, initial=np.nan)
+        highest = np.fmax.reduce(prices, axis=1, initial=np.nan)
+        sellers = (~np.isnan(prices)).sum(axis=1)
+        return pd.DataFrame({'Dell_product': self.names, 'Lowest_price': lowest, 'Highest_price': highest,
+                             'Spread': highest - lowest, 'Sellers': sellers})
+
+    # Function to list every retailer price below Dell's, deepest undercut first
+    def undercuts(self):
+        dell = self.prices[:, self.columns['dell']]
+        retailers = [s for s in self.sources if s != 'dell']
+        prices = self.prices[:, [self.columns[r] for r in retailers]]
+        # NaN on either side compares False, so unsold products drop out here
+        rows, columns = np.nonzero(prices < dell[:, None])
+        undercut = dell[rows] - prices[rows, columns]
+        df = pd.DataFrame({'Dell_product': self.names[rows],
+                           'Retailer': np.asarray(retailers, dtype=object)[columns],
+                           'Dell_price': dell[rows], 'Retailer_price': prices[rows, columns],
+                           'Undercut': undercut, 'Undercut_pct': undercut / dell[rows] * 100})
+        return df.sort_values('Undercut_pct', ascending=False, kind='stable').reset_index(drop=True)
+
+    # Function to count how many of Dell's products each source sells
+    def coverage(self):
+        sold = (~np.isnan(self.prices)).sum(axis=0)
+        return pd.DataFrame({'Products': sold, 'Share': sold / max(len(self.names), 1)},
+                            index=pd.Index(self.sources, name='Source'))
+
+    # Function to answer everything about one product from its row alone
+    def lookup(self, product):
+        row = self.prices[self.rows[product]]
+        sold = {source: float(row[column]) for source, column in self.columns.items() if not np.isnan(row[column])}
+        dell = sold.get('dell')
+        lowest = min(sold, key=sold.get) if sold else None
+        return {
+            'Dell_product': product,
+            'prices': sold,
+            'lowest_price': sold[lowest] if lowest else None,
+            'lowest_at': lowest,
+            'spread': max(sold.values()) - min(sold.values()) if sold else None,
+            'undercuts': {source: dell - price for source, price in sold.items()
+                          if source != 'dell' and dell is not None and price < dell},
+        }
+
+    # Function to lay the matrix out as a table, one price column per source, NaN where not sold
+    def frame(self):
+        df = pd.DataFrame(self.prices, columns=[f'{LABELS[source]}_price' for source in self.sources])
+        df.insert(0, 'Dell_product', self.names)
+        return df
+
+    # Function to render the table for people, with the 'not sold' text in the empty cells
+    def render(self, df=None):
+        df = self.frame() if df is None else df
+        prices = [column for column in df.columns if column.endswith('_price')]
+        return df.astype({column: object for column in prices}).fillna({column: NOT_SOLD for column in prices})
+
+
+# Function to find where each value sits among unique `keys`, -1 where it is not there
+# A pyarrow hash lookup, pandas' get_indexer and isin go through Python objects for Arrow strings
+def positions(values, keys):
+    found = pc.index_in(pa.array(values, type=pa.string()), value_set=pa.array(keys, type=pa.string()))
+    return found.fill_null(-1).to_numpy(zero_copy_only=False)
+
+
+# Function to build the price matrix from index.csv, Dell's listing and each retailer's listing
+# Rows are the Dell products index.csv maps and Dell lists, cheapest Dell price first
+# A product listed more than once (several index rows or SKUs) keeps its lowest price at each source
+def build(index, dell, listings):
+    index = apply_schema(index, 'index')
+    dell = apply_schema(dell, 'dell')
+    listings = {r: df for r, df in listings.items() if df is not None and r in RETAILERS}
+
+    dell_prices = dell.groupby('Dell_product', sort=False)['Dell_price'].min()
+    products = index['Dell_product'].dropna().unique()
+    listed = positions(products, dell_prices.index)
+    products = products[listed >= 0]
+    sources = ['dell', *listings]
+    prices = np.full((len(products), len(sources)), np.nan)
+    prices[:, 0] = dell_prices.to_numpy('float64')[listed[listed >= 0]]
+
+    # Each index row points at its product's row, -1 when the product is not in the matrix
+    rows = positions(index['Dell_product'], products)
+    for column, (retailer, listing) in enumerate(listings.items(), start=1):
+        label = RETAILERS[retailer]
+        if f'{label}_sku' not in index.columns:
+            continue
+        listing = apply_schema(listing, retailer)
+        listed = listing.groupby(f'{label}_sku', sort=False)[f'{label}_price'].min()
+        at = positions(index[f'{label}_sku'], listed.index)
+        hit = (rows >= 0) & (at >= 0)
+        np.fmin.at(prices[:, column], rows[hit], listed.to_numpy('float64')[at[hit]])
+
+    order = np.argsort(prices[:, 0], kind='stable')
+    return PriceMatrix(np.asarray(products, dtype=object)[order], sources, prices[order])
+
+
+# Function to read a day's CSVs and build its matrix from every listing there is
+def load_matrix(date):
+    index = read_csv(os.path.join(script_dir, 'index.csv'), 'index')
+    dell = read_csv(os.path.join(data_dir, f'official_dell_monitor_{date}.csv'), 'dell')
+    listings = {}
+    for retailer in RETAILERS:
+        path = os.path.join(data_dir, f'{retailer}_dell_monitor_{date}.csv')
+        if os.path.exists(path):
+            listings[retailer] = read_csv(path, retailer)
+    return build(index, dell, listings)
+
+
+def main():
+    current_time = datetime.datetime.now()
+    today = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+    parser = argparse.ArgumentParser(description="Cross-retailer price queries over a day's listings")
+    parser.add_argument('--date', default=today)
+    parser.add_argument('--product', help='show one product (exact Dell product name)')
+    parser.add_argument('--top', type=int, default=10, help='how many of the deepest undercuts to show')
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.date)
+    if args.product:
+        if args.product not in matrix.rows:
+            print(f'{args.product} is not in the {args.date} price matrix')
+            return
+        for key, value in matrix.lookup(args.product).items():
+            print(f'{key}: {value}')
+        return
+
+    print(f'{len(matrix.names)} products x {len(matrix.sources)} sources on {args.date}\n')
+    print(matrix.coverage().to_string(formatters={'Share': '{:.0%}'.format}))
+    spread = matrix.spread()
+    print(f'\nMedian spread across sellers: {spread.loc[spread["Sellers"] > 1, "Spread"].median():.2f}')
+    undercuts = matrix.undercuts()
+    print(f'\n{len(undercuts)} retailer prices below Dell, deepest {args.top}:')
+    print(undercuts.head(args.top).to_string(index=False))
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
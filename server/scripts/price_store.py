@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Columnar price history store
+# Every scrape and comparison is appended to a Parquet dataset under
+# data/history/, partitioned by date and retailer, with typed price columns.
+# Queries push date / retailer / SKU predicates down to the partitions and
+# row groups, so reading history never means globbing and re-parsing CSVs.
+#
+# Usage: python3 price_store.py import                  load every dated CSV in data/
+#        python3 price_store.py query listings --start 20240601 --end 20240701 --retailer bestbuy --sku 17160814
+
+# Import necessary libraries
+import argparse
+import glob
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from retailers import RETAILERS
+from schema import SPECS
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+history_dir = os.path.join(data_dir, 'history')
+
+# Partition keys, dates are kept as YYYYMMDD text like the CSV file names
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('retailer', pa.string())]), flavor='hive')
+
+# Typed columns of each dataset (partition keys excluded)
+SCHEMAS = {
+    'listings': pa.schema([
+        ('sku', pa.string()),
+        ('name', pa.string()),
+        ('price', pa.float64()),
+        ('link', pa.string()),
+        ('diagonal_in', pa.float64()),
+        ('width_px', pa.uint16()),
+        ('height_px', pa.uint16()),
+        ('refresh_hz', pa.uint16()),
+        ('panel', pa.string()),
+        ('curved', pa.bool_()),
+    ]),
+    'comparisons': pa.schema([
+        ('Dell_product', pa.string()),
+        ('sku', pa.string()),
+        ('Retailer_price', pa.float64()),
+        ('Dell_price', pa.float64()),
+        ('Price_dif', pa.float64()),
+        ('Deviation', pa.float64()),
+        ('Status', pa.string()),
+    ]),
+}
+
+# Where each site's listing columns map to (sku, name, price, link)
+# Dell has no SKU of its own, products are joined on their name
+LISTING_COLUMNS = {'dell': ('Dell_product', 'Dell_product', 'Dell_price', 'Dell_link')}
+for _retailer, _label in RETAILERS.items():
+    LISTING_COLUMNS[_retailer] = (f'{_label}_sku', f'{_label}_name', f'{_label}_price', f'{_label}_link')
+
+# Dated CSVs the importer knows how to read
+LISTING_FILE = re.compile(r'^(official|\w+?)_dell_monitor_(\d{8})\.csv$')
+COMPARISON_FILE = re.compile(r'^(\w+?)_comparison_(\d{8})\.csv$')
+
+
+# Function to write one (date, retailer) partition, replacing it if it already exists
+def _write(dataset, table, date, retailer, root):
+    base_dir = os.path.join(root, dataset, f'date={date}', f'retailer={retailer}')
+    os.makedirs(base_dir, exist_ok=True)
+    ds.write_dataset(table, base_dir, format='parquet', basename_template='part-{i}.parquet',
+                     existing_data_behavior='delete_matching')
+
+
+# Function to build a typed table from a frame, missing columns become nulls
+def _to_table(df, dataset):
+    schema = SCHEMAS[dataset]
+    columns = {}
+    for field in schema:
+        if field.name not in df.columns:
+            columns[field.name] = pa.nulls(len(df), field.type)
+        elif pa.types.is_floating(field.type):
+            columns[field.name] = pa.array(pd.to_numeric(df[field.name], errors='coerce'), field.type)
+        elif pa.types.is_integer(field.type) or pa.types.is_boolean(field.type):
+            values = df[field.name].astype(object).where(df[field.name].notna(), None)
+            columns[field.name] = pa.array(values.tolist(), field.type)
+        else:
+            values = df[field.name].astype(object).where(df[field.name].notna(), None)
+            columns[field.name] = pa.array([None if v is None else str(v) for v in values], field.type)
+    return pa.table(columns, schema=schema)
+
+
+# Function to append one site's scraped listing for a date, with its spec columns when it has them
+def append_listing(df, retailer, date, root=history_dir):
+    sku, name, price, link = LISTING_COLUMNS[retailer]
+    label = 'Dell' if retailer == 'dell' else RETAILERS[retailer]
+    frame = pd.DataFrame({
+        'sku': df[sku] if sku in df else None,
+        'name': df[name] if name in df else None,
+        'price': df[price] if price in df else None,
+        'link': df[link] if link in df else None,
+        **{spec: df[f'{label}_{spec}'] for spec in SPECS if f'{label}_{spec}' in df},
+    })
+    _write('listings', _to_table(frame, 'listings'), date, retailer, root)
+
+
+# Function to append the comparison engine's long frame for a date
+def append_comparisons(df, date, root=history_dir):
+    for retailer, rows in df.groupby('Retailer', sort=False, observed=True):
+        _write('comparisons', _to_table(rows, 'comparisons'), date, retailer, root)
+
+
+# Function to read a dataset with the predicates pushed down
+#   start / end: inclusive YYYYMMDD bounds, skus / retailers: lists of values
+def query(dataset, start=None, end=None, skus=None, retailers=None, columns=None, root=history_dir):
+    path = os.path.join(root, dataset)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=(columns or SCHEMAS[dataset].names) + ['date', 'retailer'])
+    # Read with the current schema, so partitions written before a column was added read it as nulls
+    schema = pa.unify_schemas([SCHEMAS[dataset], PARTITIONING.schema])
+    data = ds.dataset(path, schema=schema, format='parquet', partitioning=PARTITIONING)
+
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field('date') >= str(start))
+    if end is not None:
+        conditions.append(ds.field('date') <= str(end))
+    if retailers:
+        conditions.append(ds.field('retailer').isin([str(r) for r in retailers]))
+    if skus:
+        skus = [str(s) for s in skus]
+        sku_filter = ds.field('sku').isin(skus)
+        # Comparisons can also be looked up by Dell product name
+        if dataset == 'comparisons':
+            sku_filter = sku_filter | ds.field('Dell_product').isin(skus)
+        conditions.append(sku_filter)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ['date', 'retailer']))
+    table = data.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
+
+
+# Function to list the dates already in a dataset, only those with a partition for `retailer` if given
+def dates(dataset, retailer=None, root=history_dir):
+    path = os.path.join(root, dataset)
+    if not os.path.isdir(path):
+        return []
+    found = [d for d in os.listdir(path) if d.startswith('date=')]
+    if retailer is not None:
+        found = [d for d in found if os.path.isdir(os.path.join(path, d, f'retailer={retailer}'))]
+    return sorted(d.split('=', 1)[1] for d in found)
+
+
+# Function to recover the SKU of each row of a legacy comparison CSV, which never had one
+# index.csv maps the Dell product to the retailer's SKUs. A product with more than one
+# is settled by the price the day's listing had for each, then equal rows and SKUs are paired
+# in order. Returns (rows with their sku, rows no SKU could be found for)
+def recover_skus(df, retailer, index, listing=None):
+    sku_column = f'{RETAILERS[retailer]}_sku'
+    if sku_column not in index.columns:
+        return df.iloc[:0].assign(sku=None), df
+    candidates = index[['Dell_product', sku_column]].dropna().drop_duplicates().rename(columns={sku_column: 'sku'})
+    rows = df.reset_index(drop=True).assign(_row=lambda d: range(len(d)))
+
+    # Products with a single SKU at this retailer need nothing else
+    single = candidates[~candidates['Dell_product'].duplicated(keep=False)]
+    found = rows.merge(single, on='Dell_product', how='inner')
+
+    if listing is not None:
+        sku, _, price, _ = LISTING_COLUMNS[retailer]
+        prices = pd.DataFrame({'sku': listing[sku], 'Retailer_price': pd.to_numeric(listing[price], errors='coerce')})
+        several = candidates[candidates['Dell_product'].duplicated(keep=False)].merge(
+            prices.drop_duplicates('sku'), on='sku', how='inner')
+        key = ['Dell_product', 'Retailer_price']
+        rest = rows[~rows['_row'].isin(found['_row'])]
+        paired = rest.assign(_n=rest.groupby(key).cumcount()).merge(
+            several.assign(_n=several.groupby(key).cumcount()), on=key + ['_n'], how='inner')
+        found = pd.concat([found, paired.drop(columns='_n')], ignore_index=True)
+
+    found = found.sort_values('_row', kind='stable')
+    missing = rows[~rows['_row'].isin(found['_row'])]
+    return found.drop(columns='_row').reset_index(drop=True), missing.drop(columns='_row')
+
+
+# One-time importer for the loose dated CSVs in data/
+# Comparison rows get their SKU back from index.csv and the day's listing, rows that
+# cannot be matched to one are left out and counted rather than stored without a sku
+def import_csv_history(source_dir=data_dir, root=history_dir, index_path=os.path.join(script_dir, 'index.csv')):
+    index = pd.read_csv(index_path, dtype=str)
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(source_dir, '*.csv'))):
+        filename = os.path.basename(path)
+        listing = LISTING_FILE.match(filename)
+        comparison = COMPARISON_FILE.match(filename)
+        if listing:
+            retailer = 'dell' if listing.group(1) == 'official' else listing.group(1)
+            if retailer not in LISTING_COLUMNS:
+                continue
+            append_listing(pd.read_csv(path, dtype=str), retailer, listing.group(2), root)
+        elif comparison and comparison.group(1) in RETAILERS:
+            retailer, date = comparison.groups()
+            df = pd.read_csv(path)
+            df = df.rename(columns={f'{RETAILERS[retailer]}_price': 'Retailer_price'})
+            df['Price_dif'] = df['Retailer_price'] - df['Dell_price']
+            if 'sku' not in df.columns:
+                listing_path = os.path.join(source_dir, f'{retailer}_dell_monitor_{date}.csv')
+                day_listing = pd.read_csv(listing_path, dtype=str) if os.path.exists(listing_path) else None
+                df, missing = recover_skus(df, retailer, index, day_listing)
+                if len(missing):
+                    print(f'{filename}: left out {len(missing)} rows with no SKU in index.csv '
+                          f'({", ".join(missing["Dell_product"].astype(str).unique()[:5])})')
+            _write('comparisons', _to_table(df, 'comparisons'), date, retailer, root)
+        else:
+            continue
+        imported += 1
+        print(f'Imported {filename}')
+    print(f'{imported} CSV files imported into {root}')
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar price history store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help='load every dated CSV in data/ into the store')
+    importer.add_argument('--source', default=data_dir)
+    reader = commands.add_parser('query', help='print rows matching the filters')
+    reader.add_argument('dataset', choices=list(SCHEMAS))
+    reader.add_argument('--start')
+    reader.add_argument('--end')
+    reader.add_argument('--sku', action='append')
+    reader.add_argument('--retailer', action='append')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_csv_history(args.source)
+    else:
+        df = query(args.dataset, args.start, args.end, args.sku, args.retailer)
+        print(df.to_string(index=False))
+        print(f'{len(df)} rows')
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
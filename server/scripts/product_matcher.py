@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cross-retailer product matcher that proposes index.csv
+# Model codes ("P2222H", "AW3423DWF") are pulled out of every Dell product and
+# retailer listing name. Candidates are only paired inside a block: listings
+# sharing a Dell model's code family (letters + 4 digits, e.g. P2422 for
+# P2422H / P2422HE), or, when a listing has no code, the same screen size.
+# Each pair is then scored in one vectorized pass on how well the codes agree
+# and how much of the Dell name appears in the listing, and every listing is
+# given to at most one Dell product, best score first.
+#
+# Usage: python3 product_matcher.py [--date YYYYMMDD] [--min-confidence 0.5] [--write-index]
+
+# Import necessary libraries
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from comparison import load_dell, load_index, load_listings, index_path
+from retailers import RETAILERS
+
+# Load environment variables
+load_dotenv()
+
+# Define the date variable
+current_time = datetime.datetime.now()
+date = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+# Dell model codes: 1-3 letters, 4 digits (size + year), then up to 4 letters
+MODEL_CODE = r'(?<![A-Z0-9])([A-Z]{1,3}\d{4}[A-Z]{0,4})(?![A-Z0-9])'
+# Screen size written like 27", 23.8", 27-inch or 27 in
+SCREEN_SIZE = r'(\d{2}(?:\.\d)?)\s*(?:"|”|\'\'|-?\s?inch|in\b)'
+
+# How much each signal counts towards the confidence
+CODE_WEIGHT = 0.7
+TEXT_WEIGHT = 0.3
+# Same code family but a different variant (P2422H vs P2422HE)
+FAMILY_SCORE = 0.5
+# Pairs that only share a screen size are capped well below a code match
+SIZE_ONLY_WEIGHT = 0.5
+# Accessories, bundles and second-hand listings that mention a monitor's code
+NOT_THE_MONITOR = ['refurbished', 'open box', 'used', 'privacy filter', 'filter', 'bundle', 'pack',
+                   'stand', 'mount', 'cable', 'adapter', 'replacement', 'screen protector', 'lcd led']
+NOT_THE_MONITOR_PENALTY = 0.5
+
+
+# Function to find every model code in a column of names, one row per (row, code)
+def model_codes(names):
+    codes = names.str.upper().str.extractall(MODEL_CODE)[0].rename('code').reset_index()
+    codes = codes.rename(columns={'level_0': 'row'}).drop(columns='match').drop_duplicates()
+    codes['family'] = codes['code'].str.extract(r'^([A-Z]{1,3}\d{4})', expand=False)
+    return codes
+
+
+# Function to read each name's screen size, rounded to whole inches
+def screen_sizes(names):
+    return pd.to_numeric(names.str.extract(SCREEN_SIZE, expand=False), errors='coerce').round()
+
+
+# Function to split names into (row, token) with one row per distinct word
+def name_tokens(names):
+    tokens = names.str.lower().str.findall(r'[a-z0-9]+').explode().dropna()
+    return tokens.rename('token').rename_axis('row').reset_index().drop_duplicates()
+
+
+# Function to build every candidate (dell_row, listing_row) pair inside its block
+def candidate_pairs(dell_codes, dell_sizes, listing_codes, listing_sizes):
+    by_code = dell_codes.merge(listing_codes, on='family', suffixes=('_dell', '_listing'))
+    by_code = pd.DataFrame({
+        'dell_row': by_code['row_dell'],
+        'listing_row': by_code['row_listing'],
+        'code_score': np.where(by_code['code_dell'] == by_code['code_listing'], 1.0, FAMILY_SCORE),
+    })
+    by_code = by_code.groupby(['dell_row', 'listing_row'], as_index=False)['code_score'].max()
+
+    # Listings without any code fall back to the Dell products of the same size
+    uncoded = listing_sizes[~listing_sizes.index.isin(listing_codes['row'])].dropna()
+    by_size = pd.DataFrame({'dell_row': dell_sizes.index, 'size': dell_sizes.to_numpy()}).dropna().merge(
+        pd.DataFrame({'listing_row': uncoded.index, 'size': uncoded.to_numpy()}), on='size')
+    by_size = by_size[['dell_row', 'listing_row']].assign(code_score=np.nan)
+    return pd.concat([by_code, by_size], ignore_index=True)
+
+
+# Function to score candidate pairs: code agreement plus how much of the Dell name the listing contains
+def score_pairs(pairs, dell_names, listing_names):
+    dell_tokens = name_tokens(dell_names).rename(columns={'row': 'dell_row'})
+    listing_tokens = name_tokens(listing_names).rename(columns={'row': 'listing_row'})
+    shared = pairs[['dell_row', 'listing_row']].merge(dell_tokens, on='dell_row').merge(
+        listing_tokens, on=['listing_row', 'token'])
+    shared = shared.groupby(['dell_row', 'listing_row']).size().rename('shared').reset_index()
+    pairs = pairs.merge(shared, how='left', on=['dell_row', 'listing_row'])
+    dell_counts = dell_tokens.groupby('dell_row').size()
+    text_score = pairs['shared'].fillna(0) / pairs['dell_row'].map(dell_counts).to_numpy()
+
+    confidence = np.where(pairs['code_score'].notna(),
+                          CODE_WEIGHT * pairs['code_score'] + TEXT_WEIGHT * text_score,
+                          SIZE_ONLY_WEIGHT * text_score)
+    lowered = listing_names.str.lower()
+    suspect = np.zeros(len(listing_names), dtype=bool)
+    for keyword in NOT_THE_MONITOR:
+        suspect |= lowered.str.contains(keyword, regex=False).to_numpy()
+    confidence = np.where(suspect[pairs['listing_row'].to_numpy()], confidence * NOT_THE_MONITOR_PENALTY,
+                          confidence)
+    return pairs.assign(text_score=text_score, confidence=confidence.round(4))
+
+
+# Function to keep the best pairs so each listing and each Dell product is used once
+def assign(pairs):
+    pairs = pairs.sort_values(['confidence', 'dell_row', 'listing_row'], ascending=[False, True, True],
+                              kind='stable')
+    pairs = pairs.drop_duplicates('listing_row').drop_duplicates('dell_row')
+    return pairs
+
+
+# Function to match one retailer's listing against Dell's products
+# Returns (Dell_product, sku, name, confidence) for the best pair of each Dell product
+def match_retailer(dell, listing, retailer):
+    label = RETAILERS[retailer]
+    dell_names = dell['Dell_product'].astype(str).reset_index(drop=True)
+    listing = listing.reset_index(drop=True)
+    listing_names = listing[f'{label}_name'].astype(str)
+
+    dell_codes = model_codes(dell_names)
+    # A Dell name's size is the first two digits of its model code
+    dell_sizes = pd.to_numeric(dell_codes.drop_duplicates('row').set_index('row')['family']
+                               .str.extract(r'(\d{2})', expand=False), errors='coerce').reindex(dell_names.index)
+    # A listing's size is its parsed spec column when it has one, otherwise read from its name
+    if f'{label}_diagonal_in' in listing:
+        listing_sizes = listing[f'{label}_diagonal_in'].astype(float).round()
+    else:
+        listing_sizes = screen_sizes(listing_names)
+    pairs = candidate_pairs(dell_codes, dell_sizes, model_codes(listing_names), listing_sizes)
+    if pairs.empty:
+        return pd.DataFrame(columns=['Dell_product', 'sku', 'name', 'confidence', 'candidates'])
+    pairs = score_pairs(pairs, dell_names, listing_names)
+    candidates = pairs.groupby('dell_row').size()
+    best = assign(pairs)
+    return pd.DataFrame({
+        'Dell_product': dell_names.to_numpy()[best['dell_row']],
+        'sku': listing[f'{label}_sku'].astype(str).to_numpy()[best['listing_row']],
+        'name': listing_names.to_numpy()[best['listing_row']],
+        'confidence': best['confidence'].to_numpy(),
+        'candidates': best['dell_row'].map(candidates).to_numpy(),
+    })
+
+
+# Function to propose a full index: every Dell product with its best SKU at each retailer
+# Existing index.csv entries are kept (confidence 1, source "manual") unless keep_existing is False
+def propose_index(dell, listings, index=None, min_confidence=0.5, keep_existing=True):
+    proposal = pd.DataFrame({'Dell_product': dell['Dell_product'].astype(str).drop_duplicates().to_numpy()})
+    for retailer, listing in listings.items():
+        label = RETAILERS[retailer]
+        matches = match_retailer(dell, listing, retailer)
+        matches = matches[matches['confidence'] >= min_confidence]
+        matches = matches.rename(columns={'sku': f'{label}_sku', 'name': f'{label}_name',
+                                          'confidence': f'{label}_confidence',
+                                          'candidates': f'{label}_candidates'})
+        matches[f'{label}_source'] = 'matched'
+        proposal = proposal.merge(matches, how='left', on='Dell_product')
+
+    if keep_existing and index is not None:
+        manual = index.set_index('Dell_product')
+        for retailer in RETAILERS:
+            column = f'{RETAILERS[retailer]}_sku'
+            if column not in manual.columns:
+                continue
+            known = proposal['Dell_product'].map(manual[column].dropna()[~manual[column].dropna().index.duplicated()])
+            if column not in proposal.columns:
+                proposal[column] = None
+            label = RETAILERS[retailer]
+            for extra in ['_confidence', '_source']:
+                if f'{label}{extra}' not in proposal.columns:
+                    proposal[f'{label}{extra}'] = None
+            has_manual = known.notna()
+            proposal.loc[has_manual, column] = known[has_manual]
+            proposal.loc[has_manual, f'{label}_confidence'] = 1.0
+            proposal.loc[has_manual, f'{label}_source'] = 'manual'
+    return proposal
+
+
+# Function to print how much of each retailer the proposal covers compared with index.csv
+def coverage(proposal, index, listings):
+    for retailer, listing in listings.items():
+        label = RETAILERS[retailer]
+        column = f'{label}_sku'
+        listed = set(listing[column].astype(str))
+        old = index[column].dropna().astype(str).isin(listed).sum() if column in index else 0
+        new = proposal[column].dropna().astype(str).isin(listed).sum() if column in proposal else 0
+        matched = (proposal.get(f'{label}_source') == 'matched').sum()
+        print(f'{label}: {len(listing)} listings, index.csv maps {old}, proposal maps {new} '
+              f'({matched} found by the matcher)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Propose index.csv by matching retailer listings to Dell products')
+    parser.add_argument('--date', default=date, help='date of the scraped CSVs, YYYYMMDD')
+    parser.add_argument('--min-confidence', type=float, default=0.5)
+    parser.add_argument('--ignore-existing', dest='keep_existing', action='store_false',
+                        help='do not keep the hand-made index.csv entries')
+    parser.add_argument('--write-index', action='store_true',
+                        help='also overwrite index.csv with the proposed SKUs')
+    args = parser.parse_args()
+
+    index = load_index()
+    dell = load_dell(args.date)
+    listings = load_listings(args.date)
+    proposal = propose_index(dell, listings, index, args.min_confidence, args.keep_existing)
+
+    save_path = os.path.join(data_dir, f'index_proposed_{args.date}.csv')
+    proposal.to_csv(save_path, index=False)
+    print(f'Proposed index saved to {save_path}')
+    coverage(proposal, index, listings)
+
+    if args.write_index:
+        columns = ['Dell_product'] + [f'{label}_sku' for label in RETAILERS.values()]
+        proposal.reindex(columns=columns).to_csv(index_path, index=False)
+        print(f'index.csv updated at {index_path}')
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Product search over the combined product table
+# Product names are split into tokens ("Dell 27 Monitor - P2722H" -> dell, 27,
+# monitor, p2722h) and indexed once: an inverted index from token to rows, a
+# sorted vocabulary for prefix lookup and a trigram index over the vocabulary
+# for partial model codes ("722" finds p2722h) and typos ("s3222dmg").
+# Matches are ranked exact > prefix > partial > fuzzy.
+#
+# Usage: python3 product_search.py "P2722H" [--date YYYYMMDD] [--limit 10] [--no-fuzzy]
+
+# Import necessary libraries
+import argparse
+import bisect
+import datetime
+import glob
+import json
+import os
+import pickle
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Define the date variable
+current_time = datetime.datetime.now()
+date = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+# How much each kind of token match is worth
+EXACT = 1.0
+PREFIX = 0.8
+PARTIAL = 0.6
+FUZZY = 0.5
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+
+# Function to split a product name or query into lower-case tokens
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+# Function to list a token's trigrams
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+# Function to count the edits between two tokens, giving up once past `limit`
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# Inverted index over one column of a frame
+class ProductIndex:
+    def __init__(self, df, column='Dell_product'):
+        self.df = df.reset_index(drop=True)
+        self.column = column
+        names = self.df[column].astype(str).tolist()
+        self.lengths = np.array([len(name) for name in names])
+        postings = {}
+        for row, name in enumerate(names):
+            for token in set(tokenize(name)):
+                postings.setdefault(token, []).append(row)
+        self.postings = {token: np.array(rows, dtype=np.int32) for token, rows in postings.items()}
+        self.vocabulary = sorted(self.postings)
+        self.grams = {}
+        for token in self.vocabulary:
+            for gram in trigrams(token):
+                self.grams.setdefault(gram, []).append(token)
+
+    # Tokens that start with `prefix`, from the sorted vocabulary
+    def prefixed(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + '\uffff')
+        return self.vocabulary[start:end]
+
+    # Tokens that contain `part` anywhere, through the trigram index
+    def containing(self, part):
+        grams = sorted(trigrams(part), key=lambda g: len(self.grams.get(g, ())))
+        if not grams:
+            return []
+        candidates = set(self.grams.get(grams[0], ()))
+        for gram in grams[1:]:
+            candidates &= set(self.grams.get(gram, ()))
+            if not candidates:
+                break
+        return [token for token in candidates if part in token]
+
+    # Tokens within one edit (two for longer tokens) of `token`
+    def similar(self, token):
+        limit = 1 if len(token) <= 5 else 2
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        # Each edit can break at most three trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        matches = []
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            distance = edit_distance(token, candidate, limit)
+            if 0 < distance <= limit:
+                matches.append((candidate, 1 - distance / max(len(token), len(candidate))))
+        return matches
+
+    # Function to score every row matching one query token, best match per row wins
+    def match_token(self, token, fuzzy=True):
+        weights = np.zeros(len(self.lengths))
+
+        def add(matched, weight):
+            rows = self.postings.get(matched)
+            if rows is not None:
+                weights[rows] = np.maximum(weights[rows], weight)
+
+        add(token, EXACT)
+        # A single letter or digit would prefix-match most of the vocabulary
+        if len(token) >= 2:
+            for matched in self.prefixed(token):
+                if matched != token:
+                    add(matched, PREFIX)
+        if len(token) >= 3:
+            for matched in self.containing(token):
+                add(matched, PARTIAL)
+        if fuzzy and not weights.any() and len(token) >= 4:
+            for matched, similarity in self.similar(token):
+                add(matched, FUZZY * similarity)
+        return weights
+
+    # Function to rank rows for a query, rows matching more of its tokens first
+    def search(self, query, limit=10, fuzzy=True):
+        tokens = tokenize(query)
+        scores = np.zeros(len(self.lengths))
+        matched = np.zeros(len(self.lengths), dtype=np.int32)
+        for token in tokens:
+            weights = self.match_token(token, fuzzy)
+            scores += weights / len(tokens)
+            matched += weights > 0
+        rows = np.flatnonzero(matched)
+        # Most tokens matched, then best score, then the shortest (most specific) name
+        order = np.lexsort((rows, self.lengths[rows], -scores[rows], -matched[rows]))
+        if limit:
+            order = order[:limit]
+        ranked = rows[order]
+        results = self.df.iloc[ranked].copy()
+        results['score'] = scores[ranked].round(4)
+        return results
+
+
+# Function to build the index for a product table
+def build_index(df, column='Dell_product'):
+    return ProductIndex(df, column)
+
+
+# Function to save a day's index next to its combined CSV
+def save_index(index, date=date):
+    path = os.path.join(data_dir, f'search_index_{date}.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+# Function to load a day's index, building it from the combined CSV if it was never saved
+# Without a date the most recent combined table is used
+def load_index(date=None):
+    if date is None:
+        files = sorted(glob.glob(os.path.join(data_dir, 'combined_product_data_*.csv')))
+        if not files:
+            raise FileNotFoundError(f'No combined product data in {data_dir}, run Product_page.py first')
+        date = files[-1][-12:-4]
+    path = os.path.join(data_dir, f'search_index_{date}.pkl')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    df = pd.read_csv(os.path.join(data_dir, f'combined_product_data_{date}.csv'))
+    return build_index(df)
+
+
+# Function to search and return plain records, e.g. for the CLI or the server
+def search(query, limit=10, fuzzy=True, date=None, index=None):
+    if index is None:
+        index = load_index(date)
+    results = index.search(query, limit, fuzzy)
+    return json.loads(results.to_json(orient='records'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the combined product table')
+    parser.add_argument('query')
+    parser.add_argument('--date', help='date of the combined table, YYYYMMDD (default: most recent)')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--no-fuzzy', dest='fuzzy', action='store_false', help='skip typo-tolerant matching')
+    args = parser.parse_args()
+
+    results = search(args.query, args.limit, args.fuzzy, args.date)
+    print(json.dumps({'query': args.query, 'count': len(results), 'results': results}, indent=2))
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Opt-in profiling for the pipeline scripts
+# Run any stage script with --profile (or PROFILE=on in .env) and its main
+# function is run under cProfile and tracemalloc. Everything is kept in
+# data/profiles/YYYYMMDD/:
+#   {stage}_{HHMMSS}.prof        cProfile stats, open with pstats or snakeviz
+#   {stage}_{HHMMSS}_alloc.txt   the lines that allocated the most memory in the stage
+#   {stage}_{HHMMSS}.txt         the hot-spot summary below
+# The summary lists the functions with the most own time next to their time
+# in the previous profile of the same stage, so a slow night can be pinned on
+# a function instead of guessed at.
+#
+# Usage: python3 dell_scraper.py --profile
+#        python3 pipeline.py --profile            profiles every stage, one at a time
+#        python3 profiling.py compare_bestbuy     show the last summary again
+
+# Import necessary libraries
+import argparse
+import cProfile
+import datetime
+import glob
+import os
+import pstats
+import sys
+import tracemalloc
+
+import metrics
+
+# Directory paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+profiles_dir = os.getenv('PROFILE_DIR', os.path.join(script_dir, 'data', 'profiles'))
+
+# How many functions and allocation sites each summary lists
+TOP = 15
+
+# Allocations made by the profilers themselves are not the stage's
+ALLOCATION_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+# Function to tell whether this run should be profiled
+def enabled(argv=None):
+    return '--profile' in (sys.argv if argv is None else argv) or os.getenv('PROFILE', 'off') == 'on'
+
+
+# Function to find the newest earlier profile of a stage, None if this is the first
+def previous_profile(stage, current=None):
+    # compare_*.prof would also match compare_bestbuy_*.prof, so check the stamp is all that follows
+    paths = sorted(p for p in glob.glob(os.path.join(profiles_dir, '*', f'{stage}_*.prof'))
+                   if os.path.basename(p)[len(stage) + 1:-len('.prof')].isdigit())
+    if current is not None:
+        paths = [p for p in paths if p < current]
+    return paths[-1] if paths else None
+
+
+# Function to total a profile's own time, cumulative time and calls per function
+# Functions are keyed on (file name, function name) so an edit that moves a
+# function's line number still lines up with the previous profile
+def function_times(path):
+    totals = {}
+    for (filename, line, name), (_, calls, own, cumulative, _) in pstats.Stats(path).stats.items():
+        key = (os.path.basename(filename), name)
+        own_s, cumulative_s, count = totals.get(key, (0.0, 0.0, 0))
+        totals[key] = (own_s + own, max(cumulative_s, cumulative), count + calls)
+    return totals
+
+
+# Function to write the hot-spot summary of a profile, against the previous one when there is one
+def hot_spots(path, previous=None, top=TOP):
+    current = function_times(path)
+    before = function_times(previous) if previous else {}
+    total = sum(own for own, _, _ in current.values())
+    lines = [f'Hot spots in {os.path.basename(path)}: {total:.3f}s of own time']
+    if previous:
+        lines[0] += f', {sum(own for own, _, _ in before.values()):.3f}s in {os.path.basename(previous)}'
+    lines.append(f'  {"own s":>8}{"cum s":>9}{"calls":>10}{"prev own s":>12}{"change":>9}  function')
+    for key, (own, cumulative, calls) in sorted(current.items(), key=lambda item: -item[1][0])[:top]:
+        if key in before:
+            prev = f'{before[key][0]:.3f}'
+            change = f'{own - before[key][0]:+.3f}'
+        else:
+            prev, change = '-', 'new' if previous else ''
+        where = 'built-in' if key[0] == '~' else key[0]
+        lines.append(f'  {own:>8.3f}{cumulative:>9.3f}{calls:>10}{prev:>12}{change:>9}  {key[1]} ({where})')
+    return '\n'.join(lines)
+
+
+# Function to describe where a stage allocated its memory
+def allocation_report(before, after, peak, top=TOP):
+    before = before.filter_traces(ALLOCATION_FILTERS)
+    after = after.filter_traces(ALLOCATION_FILTERS)
+    lines = [f'Peak traced memory: {peak / 1024 / 1024:.1f} MB, largest allocations still held at the end:',
+             f'  {"size KB":>10}{"change KB":>11}{"blocks":>9}  line']
+    for stat in after.compare_to(before, 'lineno')[:top]:
+        frame = stat.traceback[0]
+        lines.append(f'  {stat.size / 1024:>10.1f}{stat.size_diff / 1024:>+11.1f}{stat.count:>9}  '
+                     f'{frame.filename}:{frame.lineno}')
+    return '\n'.join(lines)
+
+
+# Function to run one stage under cProfile and tracemalloc and keep what they found
+def profile_stage(stage, function, *args, **kwargs):
+    now = datetime.datetime.now()
+    directory = os.path.join(profiles_dir, now.strftime('%Y%m%d'))
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f'{stage}_{now.strftime("%H%M%S")}')
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+        profiler.dump_stats(f'{base}.prof')
+        allocations = allocation_report(before, after, peak)
+        with open(f'{base}_alloc.txt', 'w') as f:
+            f.write(allocations + '\n')
+        summary = hot_spots(f'{base}.prof', previous_profile(stage, f'{base}.prof'))
+        with open(f'{base}.txt', 'w') as f:
+            f.write(summary + '\n\n' + allocations + '\n')
+        metrics.event('profile', stage=stage, path=f'{base}.prof', peak_traced_mb=round(peak / 1024 / 1024, 1))
+        print(f'\n{summary}\n{allocations}\nProfile saved to {base}.prof')
+
+
+# Function to run a stage script's main function, profiled when asked for
+def run_script(stage, function, *args, **kwargs):
+    with metrics.stage(stage):
+        if enabled():
+            return profile_stage(stage, function, *args, **kwargs)
+        return function(*args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the hot-spot summary of the latest profile of a stage')
+    parser.add_argument('stage', help='e.g. scrape_dell, compare_bestbuy, combine')
+    parser.add_argument('--top', type=int, default=TOP)
+    args = parser.parse_args()
+
+    latest = previous_profile(args.stage)
+    if latest is None:
+        raise SystemExit(f'No profiles of {args.stage} in {profiles_dir}')
+    print(hot_spots(latest, previous_profile(args.stage, latest), args.top))
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
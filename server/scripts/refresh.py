@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Intra-day price refresh for the listings most likely to be out of line
+# The nightly pipeline checks every price once, at midnight. In between, this
+# ranks every (retailer, SKU) in the day's comparison and re-checks only the
+# top of the ranking, one product page or API entry per SKU, within a request
+# budget per host:
+#   priority = status weight                    Non-Compliant 3, Needs Attention 2, Compliant 0
+#            + volatility / VOLATILITY_SCALE    std of the product's deviation over the last VOLATILITY_DAYS days
+#            + hours since last check / STALE_HOURS
+# Only SKUs scoring at least REFRESH_MIN_PRIORITY are queued, so a steady
+# compliant listing waits for the nightly scrape. Refreshed prices go straight
+# back through the comparison engine (only rows whose prices moved are
+# re-scored) and, when anything changed, the day's comparison CSVs, serving
+# artifacts and stores are republished. Each run's changes are appended to
+# data/refresh/refresh_changes_{date}.csv.
+#
+# Usage: python3 refresh.py [--date YYYYMMDD] [--budget 10] [--dry-run] [--profile]
+
+# Import necessary libraries
+import argparse
+import datetime
+import heapq
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+
+import bestbuy_scraper
+import comparison
+import metrics
+import newegg_scraper
+import profiling
+from fetcher import RateLimiter, fetch_page, iter_ordered, make_session
+from price_analytics import PRODUCT_KEY, load_history
+from retailers import RETAILERS
+from schema import UNDETERMINED, to_price
+from schema import apply as apply_schema
+from serving import write_json
+
+# Load environment variables
+load_dotenv()
+
+# Prepare the variables
+current_time = datetime.datetime.now()
+date = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+refresh_dir = os.path.join(data_dir, 'refresh')
+state_path = os.path.join(refresh_dir, 'state.json')
+
+# Requests each host may get per run, and the lowest priority worth a request
+REFRESH_BUDGET = int(os.getenv('REFRESH_BUDGET', '10'))
+MIN_PRIORITY = float(os.getenv('REFRESH_MIN_PRIORITY', '1'))
+
+# How the priority is built, see the top of this file
+STATUS_WEIGHT = {'Non-Compliant': 3.0, 'Needs Attention': 2.0, UNDETERMINED: 1.0, 'Compliant': 0.0}
+VOLATILITY_DAYS = 14
+VOLATILITY_SCALE = 5.0
+STALE_HOURS = 12.0
+
+# How to re-check one listing at each retailer that has a scraper
+#   url:     builds the request from the listing row (its SKU, or its saved link)
+#   price:   reads the price out of the response
+#   workers / rate: concurrency and requests per second, the same as the retailer's scraper
+REFRESHERS = {
+    'bestbuy': {
+        'url': lambda row: bestbuy_scraper.product_url(row['Bestbuy_sku']),
+        'price': bestbuy_scraper.parse_product_price,
+        'workers': bestbuy_scraper.fetch_workers,
+        'rate': bestbuy_scraper.rate_limit,
+    },
+    'newegg': {
+        'url': lambda row: newegg_scraper.product_url(row['Newegg_link']),
+        'price': newegg_scraper.parse_product_price,
+        'workers': 1,
+        'rate': 0,
+    },
+}
+
+REFRESHED_COLUMNS = ['Retailer', 'sku', 'Retailer_price', 'Checked_at']
+
+
+# Function to load when each (retailer, SKU) was last checked, as {'retailer/sku': epoch seconds}
+def load_state(path=state_path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('checked', {})
+
+
+def save_state(checked, path=state_path):
+    write_json(path, {'checked': checked})
+
+
+# Function to read the prices earlier refreshes found today, one row per (retailer, SKU)
+def load_refreshed(date=date):
+    path = os.path.join(refresh_dir, f'refreshed_prices_{date}.csv')
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=REFRESHED_COLUMNS)
+    return pd.read_csv(path, dtype={'Retailer': str, 'sku': str, 'Checked_at': str})
+
+
+def save_refreshed(refreshed, date=date):
+    path = os.path.join(refresh_dir, f'refreshed_prices_{date}.csv')
+    os.makedirs(refresh_dir, exist_ok=True)
+    refreshed.to_csv(path, index=False)
+
+
+# Function to put refreshed prices into the day's listings, returning new listing frames
+def apply_prices(listings, refreshed):
+    patched = dict(listings)
+    for retailer, rows in refreshed.groupby('Retailer'):
+        if retailer not in listings:
+            continue
+        label = RETAILERS[retailer]
+        listing = listings[retailer].copy()
+        prices = dict(zip(rows['sku'].astype(str), to_price(rows['Retailer_price'])))
+        found = listing[f'{label}_sku'].map(prices)
+        listing[f'{label}_price'] = found.where(listing[f'{label}_sku'].isin(prices), listing[f'{label}_price'])
+        patched[retailer] = apply_schema(listing, retailer)
+    return patched
+
+
+# Function to measure how much each product's deviation has moved at each retailer lately
+# Returns the standard deviation of Deviation per (Retailer, Dell_product), in percentage points
+def volatility(date=date, retailers=None, days=VOLATILITY_DAYS):
+    start = (datetime.datetime.strptime(date, '%Y%m%d') - datetime.timedelta(days=days)).strftime('%Y%m%d')
+    history = load_history(start, date, retailers)
+    if history.empty:
+        return pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], []], names=PRODUCT_KEY))
+    return history.groupby(PRODUCT_KEY, observed=True)['Deviation'].std().fillna(0)
+
+
+# Function to score every (retailer, SKU) in a comparison, highest priority first
+#   checked: {'retailer/sku': epoch seconds of the last check}
+#   scraped: {retailer: epoch seconds the day's listing was scraped}, for SKUs never refreshed
+def priorities(df, spread, checked, scraped, now=None):
+    now = time.time() if now is None else now
+    rows = df[['Retailer', 'Dell_product', 'sku', 'Status']].copy()
+    products = pd.MultiIndex.from_frame(rows[PRODUCT_KEY].astype(object))
+    rows['volatility'] = spread.reindex(products).fillna(0).to_numpy()
+    keys = rows['Retailer'].astype(str) + '/' + rows['sku'].astype(str)
+    last = keys.map(checked).astype(float)
+    last = last.fillna(rows['Retailer'].astype(str).map(scraped).astype(float)).fillna(now)
+    rows['hours'] = ((now - last) / 3600).clip(lower=0)
+    rows['priority'] = (rows['Status'].astype(str).map(STATUS_WEIGHT).fillna(0).to_numpy()
+                        + rows['volatility'] / VOLATILITY_SCALE
+                        + rows['hours'] / STALE_HOURS)
+    # A SKU listed against several Dell products is checked once, at its highest priority
+    rows = rows.sort_values('priority', ascending=False, kind='stable')
+    return rows.drop_duplicates(['Retailer', 'sku']).reset_index(drop=True)
+
+
+# Function to pick what to re-check: pop the priority queue until every host's budget is spent
+#   urls: {(retailer, sku): request URL}, SKUs without one are skipped
+# Returns [(retailer, sku, url)] in priority order
+def pick(ranked, urls, budget=REFRESH_BUDGET, min_priority=MIN_PRIORITY):
+    queue = [(-priority, retailer, sku)
+             for retailer, sku, priority in zip(ranked['Retailer'].astype(str), ranked['sku'].astype(str),
+                                                ranked['priority'])
+             if priority >= min_priority and (retailer, sku) in urls]
+    heapq.heapify(queue)
+    spent = {}
+    picked = []
+    while queue:
+        _, retailer, sku = heapq.heappop(queue)
+        url = urls[(retailer, sku)]
+        host = urlsplit(url).netloc
+        if spent.get(host, 0) >= budget:
+            continue
+        spent[host] = spent.get(host, 0) + 1
+        picked.append((retailer, sku, url))
+    return picked
+
+
+# Function to build the request URL of every SKU a retailer's refresher knows how to re-check
+def product_urls(listings):
+    urls = {}
+    for retailer, listing in listings.items():
+        refresher = REFRESHERS.get(retailer)
+        if refresher is None:
+            continue
+        label = RETAILERS[retailer]
+        for row in listing.drop_duplicates(f'{label}_sku').to_dict(orient='records'):
+            if pd.isna(row[f'{label}_sku']):
+                continue
+            try:
+                urls[(retailer, str(row[f'{label}_sku']))] = refresher['url'](row)
+            except (KeyError, TypeError, AttributeError):
+                continue
+    return urls
+
+
+# Function to re-check the picked SKUs, each retailer with its scraper's concurrency and rate limit
+# Responses are never served from the scrape cache, the point is a fresh price
+# Returns the new prices as refreshed rows; SKUs that failed keep their old price
+def fetch_prices(picked):
+    found = []
+    checked_at = datetime.datetime.now().isoformat(timespec='seconds')
+    for retailer in dict.fromkeys(r for r, _, _ in picked):
+        refresher = REFRESHERS[retailer]
+        items = [(sku, url) for r, sku, url in picked if r == retailer]
+        session = make_session(pool_size=refresher['workers'])
+        limiter = RateLimiter(refresher['rate'], burst=refresher['workers'])
+
+        def check(item):
+            try:
+                return refresher['price'](fetch_page(session, item[1], limiter))
+            except (requests.RequestException, ValueError) as e:
+                print(f'Unable to re-check {retailer} {item[0]}: {e}')
+                return None
+
+        try:
+            for (sku, _), price in iter_ordered(check, items, refresher['workers']):
+                metrics.inc('spectra_refresh_checks_total', retailer=retailer,
+                            outcome='failed' if price is None else 'checked')
+                if price is not None:
+                    found.append({'Retailer': retailer, 'sku': sku, 'Retailer_price': price,
+                                  'Checked_at': checked_at})
+        finally:
+            session.close()
+    return pd.DataFrame(found, columns=REFRESHED_COLUMNS)
+
+
+# Function to append this run's changes to the day's intra-day change log
+def log_changes(changes, date=date):
+    path = os.path.join(refresh_dir, f'refresh_changes_{date}.csv')
+    os.makedirs(refresh_dir, exist_ok=True)
+    stamped = changes.assign(Checked_at=datetime.datetime.now().isoformat(timespec='seconds'))
+    stamped.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    return path
+
+
+# Function to run one refresh: rank, re-check the top within budget, re-compare and republish
+def refresh(date=date, budget=REFRESH_BUDGET, dry_run=False):
+    started = time.perf_counter()
+    dell_path = os.path.join(data_dir, f'official_dell_monitor_{date}.csv')
+    listings = comparison.load_listings(date)
+    if not os.path.exists(dell_path) or not listings:
+        print(f'No listings for {date} yet, nothing to refresh until the nightly scrape has run')
+        return None
+    index, dell = comparison.load_index(), comparison.load_dell(date)
+    scraped = {retailer: os.path.getmtime(os.path.join(data_dir, f'{retailer}_dell_monitor_{date}.csv'))
+               for retailer in listings}
+
+    # The day's comparison as it stands, with whatever earlier refreshes found
+    refreshed = load_refreshed(date)
+    listings = apply_prices(listings, refreshed)
+    current = comparison.compare_all(index, dell, listings, date=date)
+
+    checked = load_state()
+    ranked = priorities(current, volatility(date, list(listings)), checked, scraped)
+    picked = pick(ranked, product_urls(listings), budget)
+    queued = int((ranked['priority'] >= MIN_PRIORITY).sum())
+    print(f'{queued} of {len(ranked)} listed SKUs are due a re-check, '
+          f'checking {len(picked)} within {budget} requests per host')
+    if dry_run:
+        top = ranked[ranked['priority'] >= MIN_PRIORITY].head(max(len(picked), 1))
+        print(top[['Retailer', 'sku', 'Status', 'volatility', 'hours', 'priority']].round(2).to_string(index=False))
+        return None
+
+    found = fetch_prices(picked)
+    now = time.time()
+    checked.update({f'{r}/{s}': now for r, s, _ in picked})
+    save_state(checked)
+    if found.empty:
+        print('No prices could be re-checked')
+        return None
+
+    # Feed the new prices back through the comparison, only rows whose prices moved are re-scored
+    refreshed = pd.concat([refreshed, found], ignore_index=True).drop_duplicates(['Retailer', 'sku'], keep='last')
+    save_refreshed(refreshed, date)
+    listings = apply_prices(listings, found)
+    df = comparison.compare_all(index, dell, listings, previous=current, date=date)
+    changes = comparison.change_log(df, current)
+    metrics.event('refresh', checked=len(found), requested=len(picked), changed=len(changes))
+
+    if changes.empty:
+        print(f'Re-checked {len(found)} prices in {time.perf_counter() - started:.1f}s, nothing changed')
+        return df
+    comparison.publish(df, dell, date)
+    counts = changes['Change'].value_counts()
+    print(f'Re-checked {len(found)} prices in {time.perf_counter() - started:.1f}s: '
+          + ', '.join(f'{counts.get(c, 0)} {c}' for c in ['repriced', 'status_flip']))
+    print(f'Change log appended to {log_changes(changes, date)}')
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-check the highest-priority prices between nightly runs')
+    parser.add_argument('--date', default=date, help="date of the day's listings, YYYYMMDD")
+    parser.add_argument('--budget', type=int, default=REFRESH_BUDGET, help='requests per host in this run')
+    parser.add_argument('--dry-run', action='store_true', help='print the queue without fetching anything')
+    parser.add_argument('--profile', action='store_true', help='run under cProfile and tracemalloc')
+    args = parser.parse_args()
+    profiling.run_script('refresh', refresh, date=args.date, budget=args.budget, dry_run=args.dry_run)
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Every retailer we can compare, keyed by the prefix of its daily files
+# The label is the column prefix used in index.csv and the listing CSV
+# (e.g. Bestbuy_sku / Bestbuy_price), CCE has SKUs in index.csv but no scraper yet
+RETAILERS = {
+    'bestbuy': 'Bestbuy',
+    'newegg': 'Newegg',
+    'cce': 'CCE',
+}
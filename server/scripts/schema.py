@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Typed in-memory schema for every price table
+# Every reader goes through here, so the same column has the same dtype
+# wherever it was loaded or scraped:
+#   names, SKUs, links   Arrow-backed strings, a fraction of the size of Python str objects.
+#                        SKUs are read as text so '0JC-0004-00SN9' and '15611205' never turn into floats
+#   prices               float64, parsed from '$1,299.99' style text at read time. float32
+#                        cannot hold cents exactly (1899.99 becomes 1899.9899902), which would
+#                        flip statuses on the -10% line and mark every row as repriced
+#   Retailer, Status     categoricals with fixed categories, one byte per row
+#   specs                the typed columns specs.py derives from Dell's spec bullets and the
+#                        retailers' names: inches, pixels, Hz, panel type and curved
+#
+# Usage: python3 schema.py [--date YYYYMMDD]     print bytes per row of the day's tables
+
+# Import necessary libraries
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from retailers import RETAILERS
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+TEXT = pd.StringDtype('pyarrow')
+PRICE = np.dtype('float64')
+
+# Status categories from best to worst, in the order of the Status dtype (Undetermined last)
+STATUS = ['Compliant', 'Needs Attention', 'Non-Compliant']
+UNDETERMINED = 'Undetermined'
+STATUS_DTYPE = pd.CategoricalDtype(STATUS + [UNDETERMINED])
+# Sorted, so sorting on Retailer still orders retailers alphabetically
+RETAILER_DTYPE = pd.CategoricalDtype(sorted(RETAILERS))
+CHANGE_DTYPE = pd.CategoricalDtype(['new', 'removed', 'repriced', 'status_flip'])
+PANEL_DTYPE = pd.CategoricalDtype(['IPS', 'VA', 'TN', 'OLED'])
+
+# Typed spec columns specs.py adds to every listing, prefixed like the rest of it (Dell_diagonal_in, ...)
+SPECS = {'diagonal_in': PRICE, 'width_px': pd.UInt16Dtype(), 'height_px': pd.UInt16Dtype(),
+         'refresh_hz': pd.UInt16Dtype(), 'panel': PANEL_DTYPE, 'curved': pd.BooleanDtype()}
+
+
+# Function to name one source's spec columns
+def spec_columns(label):
+    return {f'{label}_{spec}': dtype for spec, dtype in SPECS.items()}
+
+
+# Column dtypes of every dataset, one listing per source
+DATASETS = {
+    'index': {'Dell_product': TEXT, **{f'{label}_sku': TEXT for label in RETAILERS.values()}},
+    'dell': {'Dell_product': TEXT, 'Dell_product_id': TEXT, 'Dell_price': PRICE, 'Dell_specs': TEXT,
+             'Dell_link': TEXT, **spec_columns('Dell')},
+    **{retailer: {f'{label}_name': TEXT, f'{label}_sku': TEXT, f'{label}_price': PRICE, f'{label}_link': TEXT,
+                  **spec_columns(label)}
+       for retailer, label in RETAILERS.items()},
+    'specs': SPECS,
+    'comparison': {'Dell_product': TEXT, 'Retailer': RETAILER_DTYPE, 'sku': TEXT, 'Retailer_price': PRICE,
+                   'Dell_price': PRICE, 'Price_dif': PRICE, 'Deviation': PRICE, 'Status': STATUS_DTYPE},
+    'policy': {'Dell_product': TEXT, 'Retailer': TEXT, 'Start': TEXT, 'End': TEXT, 'Map_price': PRICE,
+               'Grace': PRICE, 'Tolerance': PRICE, 'Note': TEXT},
+    'alert_rules': {'Name': TEXT, 'Kind': TEXT, 'Threshold': PRICE, 'Retailer': TEXT, 'Cooldown_hours': PRICE},
+    'changes': {'Retailer': RETAILER_DTYPE, 'Dell_product': TEXT, 'Change': CHANGE_DTYPE, 'Old_price': PRICE,
+                'New_price': PRICE, 'Old_status': STATUS_DTYPE, 'New_status': STATUS_DTYPE, 'Dell_price': PRICE},
+}
+
+
+# Function to turn scraped prices ('$1,299.99', '1299.99', 1299.99, 'N/A') into numbers, NaN if not a price
+def to_price(values):
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype(PRICE)
+    text = values.astype(TEXT).str.replace(r'[$,\s]', '', regex=True)
+    return pd.to_numeric(text, errors='coerce').astype(PRICE)
+
+
+# Function to cast a frame to a dataset's dtypes, columns the schema does not know are left alone
+def apply(df, dataset):
+    casts = {}
+    for column, dtype in DATASETS[dataset].items():
+        if column not in df.columns:
+            continue
+        if dtype == PRICE:
+            casts[column] = to_price(df[column]).to_numpy()
+        elif df[column].dtype != dtype:
+            values = df[column]
+            if dtype == TEXT and pd.api.types.is_float_dtype(values.dtype):
+                # A numeric SKU column with gaps was read as floats, 15611205.0 is SKU 15611205
+                values = values.astype('Int64')
+            casts[column] = values.astype(dtype)
+    return df.assign(**casts) if casts else df
+
+
+# Function to read one dataset's CSV straight into its dtypes
+# Prices are read as text and parsed, so a stray '$' or ',' never turns the column into strings
+def read_csv(path, dataset, **kwargs):
+    types = DATASETS[dataset]
+    columns = pd.read_csv(path, nrows=0).columns
+    dtype = {column: TEXT if types[column] == PRICE else types[column] for column in columns if column in types}
+    return apply(pd.read_csv(path, dtype=dtype, **kwargs), dataset)
+
+
+# Function to measure a frame's memory in bytes per row, strings counted in full
+def bytes_per_row(df):
+    return df.memory_usage(deep=True, index=False).sum() / max(len(df), 1)
+
+
+def main():
+    current_time = datetime.datetime.now()
+    today = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+    parser = argparse.ArgumentParser(description="Show bytes per row of the day's tables, before and after typing")
+    parser.add_argument('--date', default=today)
+    args = parser.parse_args()
+
+    files = {'index': os.path.join(script_dir, 'index.csv'),
+             'dell': os.path.join(data_dir, f'official_dell_monitor_{args.date}.csv')}
+    for retailer in RETAILERS:
+        files[retailer] = os.path.join(data_dir, f'{retailer}_dell_monitor_{args.date}.csv')
+    print(f'{"table":<10}{"rows":>8}{"inferred B/row":>16}{"typed B/row":>13}')
+    for dataset, path in files.items():
+        if os.path.exists(path):
+            inferred, typed = pd.read_csv(path), read_csv(path, dataset)
+            print(f'{dataset:<10}{len(typed):>8}{bytes_per_row(inferred):>16.0f}{bytes_per_row(typed):>13.0f}')
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Serving artifacts for the Express routes
+# After each comparison the dashboard's numbers are computed once here and
+# written as small JSON files under data/serving/{date}/: per-retailer summary
+# metrics with the top offenders, the pre-sorted product lists and Dell's
+# listing. data/latest.json points at the current set and is swapped in
+# atomically, so a request only reads that manifest and never scans data/.
+# A run that compares only some retailers (the single-retailer Compare_*
+# scripts) merges them into the day's summary and manifest under a file lock,
+# so runs in parallel keep each other's retailers.
+
+# Import necessary libraries
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+# File locks are POSIX only, elsewhere merges simply run unlocked
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from retailers import RETAILERS
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+# How many offending products each retailer's summary lists
+TOP_OFFENDERS = 5
+# How many days of artifacts are kept next to the current one
+KEEP_DAYS = int(os.getenv('SERVING_KEEP_DAYS', '7'))
+
+COMPLIANT = 'Compliant'
+
+
+# Function to write a file so readers only ever see the old or the new version
+# The temporary file has a unique name, so two processes writing one path never share it
+def write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# Holds an exclusive lock on `path`.lock, for read-merge-write updates shared between processes
+@contextmanager
+def locked(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Function to read a JSON file, None when it is missing or unreadable
+def read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, payload):
+    write_atomic(path, json.dumps(payload, separators=(',', ':')))
+
+
+# Function to turn a frame into the records csvtojson would give for its CSV
+# Every value is the CSV text, so the client sees exactly what it did before
+def csv_records(frame):
+    text = frame.to_csv(index=False)
+    return pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False).to_dict(orient='records')
+
+
+# Function to compute one retailer's dashboard metrics from its comparison rows
+def retailer_metrics(rows, records):
+    total = len(rows)
+    compliant = int((rows['Status'] == COMPLIANT).sum())
+    offending = rows['Status'] != COMPLIANT
+    # Rows are already sorted by Deviation, so the first offenders are the worst
+    top = [record for record, flag in zip(records, offending) if flag][:TOP_OFFENDERS]
+    return {
+        'totalProducts': total,
+        'compliantProducts': compliant,
+        'complianceRate': f'{compliant / total * 100 if total else 0:.2f}',
+        'averageDeviation': f'{rows["Deviation"].mean() if total else 0:.2f}',
+        'totalDeviatedProducts': int(offending.sum()),
+        'totalPriceChanges': int((rows['Price_dif'] != 0).sum()),
+        'totalOffendingProducts': int((rows['Price_dif'] < 0).sum()),
+        'topOffendingProducts': top,
+    }
+
+
+# Function to write the day's artifacts and point latest.json at them
+#   df: the long comparison frame, sorted by retailer then deviation
+#   layouts: {retailer: that retailer's rows in its comparison CSV layout}
+#   dell: Dell's listing for the day
+# Retailers not in df keep what an earlier run that day published for them
+def write_artifacts(df, layouts, dell, date, root=data_dir):
+    base = os.path.join(root, 'serving', date)
+    relative = lambda name: os.path.relpath(os.path.join(base, name), root).replace(os.sep, '/')  # noqa: E731
+
+    # Each retailer's product list is its own file, nothing to merge
+    products, summaries = {}, {}
+    for retailer, rows in df.groupby('Retailer', sort=False, observed=True):
+        records = csv_records(layouts[retailer])
+        write_json(os.path.join(base, f'{retailer}_products.json'), records)
+        products[retailer] = relative(f'{retailer}_products.json')
+        summaries[retailer] = {'name': RETAILERS[retailer], **retailer_metrics(rows, records)}
+    write_json(os.path.join(base, 'dell.json'), csv_records(dell))
+
+    latest_path = os.path.join(root, 'latest.json')
+    with locked(latest_path):
+        summary = read_json(os.path.join(base, 'summary.json')) or {}
+        summary = {'date': date, 'retailers': {**summary.get('retailers', {}), **summaries}}
+        summary['totalOffenders'] = sum(m['totalDeviatedProducts'] for m in summary['retailers'].values())
+        write_json(os.path.join(base, 'summary.json'), summary)
+
+        # A manifest for another day starts over, that day's files are not this one's
+        current = read_json(latest_path) or {}
+        published = current.get('products', {}) if current.get('date') == date else {}
+        manifest = {
+            'date': date,
+            'generatedAt': datetime.datetime.now().isoformat(timespec='seconds'),
+            'summary': relative('summary.json'),
+            'dell': relative('dell.json'),
+            'products': {**published, **products},
+        }
+        # Swapping the manifest last publishes the whole set at once
+        manifest['version'] = f'{date}-{datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")}'
+        write_json(latest_path, manifest)
+    prune(os.path.join(root, 'serving'), keep=date)
+    print(f'Serving artifacts saved to {base}')
+    return manifest
+
+
+# Function to drop old artifact directories, never the one just published
+def prune(directory, keep, days=KEEP_DAYS):
+    dates = sorted(d for d in os.listdir(directory) if d.isdigit())
+    for old in dates[:-days] if days > 0 else []:
+        if old != keep:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Spec normalization for every listing
+# Dell's spec bullets and the retailers' product names carry the same facts as
+# free text ('27"', 'QHD 2560 x 1440 at 165 Hz', 'IPS', 'Curved'). They are
+# turned into typed columns once, when a scrape is published, and saved with
+# the listing, prefixed like its other columns (Dell_diagonal_in, Newegg_panel),
+# so filtering or matching by spec is a column predicate:
+#   diagonal_in            screen diagonal in inches, 23.8
+#   width_px, height_px    native resolution, from 'W x H' or a name like QHD or 4K UHD
+#   refresh_hz             highest refresh rate quoted
+#   panel                  IPS, VA, TN or OLED
+#   curved                 True when the specs or the name say curved
+# The patterns are compiled once and each distinct text is parsed once, over the
+# whole column at a time, so bullets repeated across a catalogue cost one parse.
+#
+# Usage: python3 specs.py [--date YYYYMMDD]     add the spec columns to that day's listing CSVs
+
+# Import necessary libraries
+import argparse
+import ast
+import datetime
+import os
+import re
+
+import pandas as pd
+
+from retailers import RETAILERS
+from schema import SPECS, read_csv, spec_columns
+from schema import apply as apply_schema
+
+# Directory paths
+script_dir = os.path.dirname(__file__)
+data_dir = os.path.join(script_dir, 'data')
+
+# Screen size written like 27", 23.8", 21.45", 27-inch or 27 in
+SIZE = re.compile(r'(?<![\d.])(\d{2}(?:\.\d{1,2})?)\s*(?:"|”|\'\'|-?\s?inch|in\b)', re.IGNORECASE)
+# Dell's own names (and retailers copying them) give the size as a bare number:
+# "Dell UltraSharp 32 4K ...", "Alienware 27 ..."
+BARE_SIZE = re.compile(r'^(?:Dell|Alienware)(?:\s+[A-Za-z]+)*\s+(\d{2}(?:\.\d)?)(?=\s)')
+RESOLUTION = re.compile(r'(?<!\d)(\d{3,4})\s*[x×]\s*(\d{3,4})(?!\d)', re.IGNORECASE)
+NAMED_RESOLUTION = re.compile(r'\b(8K|5K|4K|UHD|2160p|UWQHD|WQHD|QHD|1440p|WUXGA|FHD|Full HD|1080p)\b',
+                              re.IGNORECASE)
+REFRESH = re.compile(r'(?<![\d.])(\d{2,3})\s*Hz\b', re.IGNORECASE)
+PANEL = re.compile(r'\b(QD-OLED|OLED|IPS|VA|TN|(?i:in-plane switching|twisted nematic))\b')
+CURVED = re.compile(r'\bcurved\b', re.IGNORECASE)
+# Dell's connectivity bullets quote what each input supports ("... up to FHD 1920 x 1080 100Hz"),
+# which is not the panel's resolution or refresh rate
+PORT_LIST = re.compile(r'HDCP|USB')
+
+NAMED_RESOLUTIONS = {
+    '8K': (7680, 4320), '5K': (5120, 2880), '4K': (3840, 2160), 'UHD': (3840, 2160), '2160P': (3840, 2160),
+    'UWQHD': (3440, 1440), 'WQHD': (2560, 1440), 'QHD': (2560, 1440), '1440P': (2560, 1440),
+    'WUXGA': (1920, 1200), 'FHD': (1920, 1080), 'FULL HD': (1920, 1080), '1080P': (1920, 1080),
+}
+PANELS = {'QD-OLED': 'OLED', 'OLED': 'OLED', 'IPS': 'IPS', 'VA': 'VA', 'TN': 'TN',
+          'IN-PLANE SWITCHING': 'IPS', 'TWISTED NEMATIC': 'TN'}
+
+
+# Function to parse distinct texts into spec columns, one row per text, every pattern run over the column
+def _parse_distinct(texts):
+    texts = pd.Series(texts, dtype=object).astype(str).reset_index(drop=True)
+    explicit = texts.str.extract(RESOLUTION).apply(pd.to_numeric)
+    size = texts.str.extract(SIZE, expand=False).fillna(texts.str.extract(BARE_SIZE, expand=False))
+    named = texts.str.extract(NAMED_RESOLUTION, expand=False).str.upper()
+    refresh = texts.str.extractall(REFRESH)[0].astype(int).groupby(level=0).max()
+    return pd.DataFrame({
+        'diagonal_in': pd.to_numeric(size, errors='coerce'),
+        'width_px': explicit[0].fillna(named.map({k: v[0] for k, v in NAMED_RESOLUTIONS.items()})),
+        'height_px': explicit[1].fillna(named.map({k: v[1] for k, v in NAMED_RESOLUTIONS.items()})),
+        'refresh_hz': refresh.reindex(texts.index),
+        'panel': texts.str.extract(PANEL, expand=False).str.upper().map(PANELS),
+        'curved': texts.str.contains(CURVED),
+    })
+
+
+# Function to parse a column of free text into the typed specs, aligned with the column
+# Each distinct text is parsed once however many rows repeat it
+def parse(texts):
+    texts = pd.Series(texts)
+    codes, distinct = pd.factorize(texts.fillna('').astype(str))
+    parsed = _parse_distinct(distinct).take(codes)
+    parsed.index = texts.index
+    return apply_schema(parsed, 'specs')[list(SPECS)]
+
+
+# Function to read Dell_specs back into lists, whether they are lists or the text to_csv made of them
+def spec_lists(values):
+    codes, distinct = pd.factorize(pd.Series(values).astype(object).where(pd.notna(values), '[]').astype(str))
+    lists = []
+    for text in distinct:
+        try:
+            items = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            items = [text]
+        lists.append([str(item) for item in items] if isinstance(items, (list, tuple)) else [str(items)])
+    return pd.Series([lists[code] for code in codes], index=pd.Series(values).index, dtype=object)
+
+
+# Function to derive Dell's spec columns from its spec bullets, falling back on the product name
+# Each column takes the first bullet that has it, in Dell's order (size, then resolution and refresh rate, ...)
+def dell_specs(df):
+    bullets = spec_lists(df['Dell_specs']).explode().dropna()
+    bullets = bullets[~bullets.str.contains(PORT_LIST)]
+    from_bullets = parse(bullets).groupby(level=0).agg(
+        {spec: ('max' if spec == 'curved' else 'first') for spec in SPECS}).reindex(df.index)
+    from_name = parse(df['Dell_product'])
+    specs = from_bullets.astype(object).combine_first(from_name.astype(object))
+    # curved is never missing, a bullet that does not say curved should not hide a name that does
+    specs['curved'] = from_bullets['curved'].astype('boolean').fillna(False) | from_name['curved'].fillna(False)
+    return apply_schema(specs, 'specs')[list(SPECS)]
+
+
+# Function to add the typed spec columns to a listing frame, replacing any already there
+def add_specs(df, dataset):
+    if dataset == 'dell':
+        specs, label = dell_specs(df), 'Dell'
+    else:
+        specs, label = parse(df[f'{RETAILERS[dataset]}_name']), RETAILERS[dataset]
+    return df.assign(**{f'{label}_{spec}': specs[spec].to_numpy() for spec in SPECS})
+
+
+# Function to write a listing CSV with its spec columns added and read it back typed
+# The scraped columns are copied through as text, exactly as they were written
+def write_specs(source, dataset, path=None):
+    path = path or source
+    raw = pd.read_csv(source, dtype=str, keep_default_na=False)
+    columns = list(spec_columns('Dell' if dataset == 'dell' else RETAILERS[dataset]))
+    specs = add_specs(raw.replace('', None), dataset)[columns]
+    tmp = f'{path}.tmp'
+    raw.assign(**{column: specs[column] for column in columns}).to_csv(tmp, index=False, lineterminator='\n')
+    os.replace(tmp, path)
+    return read_csv(path, dataset)
+
+
+def main():
+    current_time = datetime.datetime.now()
+    today = str(current_time.year) + str(current_time.month).zfill(2) + str(current_time.day).zfill(2)
+    parser = argparse.ArgumentParser(description="Add typed spec columns to a day's listing CSVs")
+    parser.add_argument('--date', default=today)
+    args = parser.parse_args()
+
+    files = {'dell': os.path.join(data_dir, f'official_dell_monitor_{args.date}.csv')}
+    for retailer in RETAILERS:
+        files[retailer] = os.path.join(data_dir, f'{retailer}_dell_monitor_{args.date}.csv')
+    # Share of each listing's rows each spec was found for (curved counts the rows that are)
+    print(f'{"listing":<10}{"rows":>6}' + ''.join(f'{spec:>13}' for spec in SPECS))
+    for dataset, path in files.items():
+        if not os.path.exists(path):
+            continue
+        df = write_specs(path, dataset)
+        columns = df[list(spec_columns('Dell' if dataset == 'dell' else RETAILERS[dataset]))]
+        found = [column.fillna(False).mean() if column.dtype == 'boolean' else column.notna().mean()
+                 for _, column in columns.items()]
+        print(f'{dataset:<10}{len(df):>6}' + ''.join(f'{share:>13.0%}' for share in found))
+
+
+# Run this function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+const fs = require('fs');
+const path = require('path');
+
+// Precomputed serving artifacts written by scripts/serving.py after each comparison
+// scripts/data/latest.json names the current set; it is swapped in atomically,
+// so reading it is the only per-request file work. Artifacts are parsed once
+// per manifest version and kept in memory until the next run publishes.
+const DATA_DIR = path.resolve(__dirname, 'scripts/data');
+const MANIFEST = path.join(DATA_DIR, 'latest.json');
+
+let cache = { version: null, artifacts: {} };
+
+// Function to read the current manifest, null until the compare stage has published one
+function readManifest() {
+  try {
+    return JSON.parse(fs.readFileSync(MANIFEST, 'utf8'));
+  } catch (error) {
+    return null;
+  }
+}
+
+// Function to load one artifact named by the manifest, e.g. 'summary' or ['products', 'bestbuy']
+// Returns null when the manifest does not name it or it cannot be read
+function readArtifact(manifest, key) {
+  const keys = Array.isArray(key) ? key : [key];
+  const relativePath = keys.reduce((value, k) => (value ? value[k] : undefined), manifest);
+  if (!relativePath) {
+    return null;
+  }
+  if (cache.version !== manifest.version) {
+    cache = { version: manifest.version, artifacts: {} };
+  }
+  if (!(relativePath in cache.artifacts)) {
+    try {
+      cache.artifacts[relativePath] = JSON.parse(fs.readFileSync(path.join(DATA_DIR, relativePath), 'utf8'));
+    } catch (error) {
+      // Missing or half-pruned artifacts read as unpublished, callers fall back to the CSVs
+      return null;
+    }
+  }
+  return cache.artifacts[relativePath];
+}
+
+module.exports = { readManifest, readArtifact };